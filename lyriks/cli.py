@@ -1,22 +1,109 @@
-import json
 import os
 import platform
-import shutil
 import subprocess
 import sys
 from pathlib import Path
 
 import click
-import questionary
-from questionary import Style
 
-from .core import gemini, video_generator_mp, video_generator_ps2
-
-questionary_style = Style([("pointer", "fg:cyan bold")])
+from .core import separators, targets
+from .core.registry import ALIGNERS, GENERATORS
 
 system = platform.system()
 
 
+class GeneratorList(click.ParamType):
+    # one generator or several separated by commas, e.g. "ps2,srt,vtt"
+    name = "generator"
+
+    def get_metavar(self, param, ctx=None):
+        return f"[{'|'.join(GENERATORS.names())}][,...]"
+
+    def convert(self, value, param, ctx):
+        names = [name.strip() for name in value.split(",") if name.strip()]
+        unknown = [name for name in names if name not in GENERATORS]
+        if not names or unknown:
+            self.fail(
+                f"{', '.join(unknown) or repr(value)} is not a generator "
+                f"(choose from {', '.join(GENERATORS.names())})",
+                param,
+                ctx,
+            )
+        return ",".join(names)
+
+
+class OutputTarget(click.ParamType):
+    # a profile name or WIDTHxHEIGHT[@FPS], with optional key=value overrides
+    name = "target"
+
+    def get_metavar(self, param, ctx=None):
+        return f"[{'|'.join(targets.PROFILES)}|WxH[@FPS]][,key=value...]"
+
+    def convert(self, value, param, ctx):
+        if isinstance(value, dict):
+            return value
+        try:
+            return targets.parse_target(value)
+        except ValueError as e:
+            self.fail(str(e), param, ctx)
+
+
+class SeparatorSpec(click.ParamType):
+    # a Demucs model, with optional key=value settings
+    name = "separator"
+
+    def get_metavar(self, param, ctx=None):
+        return "MODEL[,key=value...]"
+
+    def convert(self, value, param, ctx):
+        if isinstance(value, dict):
+            return value
+        try:
+            return separators.parse_separator(value)
+        except ValueError as e:
+            self.fail(str(e), param, ctx)
+
+
+SEPARATOR_HELP = (
+    f"Demucs model that separates the vocals ({', '.join(separators.MODELS)}), "
+    "with optional settings: segment (seconds), overlap, shifts, and stems "
+    "(vocals: two-stem fast path, all: every source). Default: htdemucs"
+)
+
+TARGET_HELP = (
+    "Render this output profile instead of a single video; repeat for several. "
+    "All targets come from one ffmpeg run and are saved as <output>_<name>.mp4 "
+    "(ps2 only). Overrides: name, fps, crf, align (top|middle|bottom), "
+    "font_scale, margin"
+)
+
+
+def _check_targets(ctx, param, value):
+    try:
+        targets.check_names(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e), ctx, param)
+    return list(value) or None
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _parse_size(ctx, param, value):
+    if value is None:
+        return None
+    from .core.cache import parse_size
+
+    try:
+        return parse_size(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e), ctx, param)
+
+
 @click.group()
 @click.version_option()
 def main():
@@ -35,17 +122,27 @@ def main():
     default=None,
 )
 @click.option(
-    "--generator", "-g", help="Which generator to use to create the video", default=None
+    "--generator",
+    "-g",
+    help="Which generator to use to create the video (several can be combined, e.g. ps2,srt,vtt)",
+    default=None,
+    type=GeneratorList(),
 )
 @click.option(
     "--no-gemini",
     help="Use this if you don't want Gemini to improve the output of Whisper",
     is_flag=True,
 )
+@click.option(
+    "--aligner",
+    help="How to align the lyrics to the Whisper transcript: gemini (online) or local (offline, deterministic)",
+    default="gemini",
+    type=click.Choice(ALIGNERS.names()),
+)
 @click.option(
     "--background",
     "-b",
-    help="Optional background video file for the video (must be a video the same length or longer than the audio).",
+    help="Optional background video file for the video (looped if shorter than the audio).",
     default=None,
     type=click.Path(exists=True, path_type=Path),
 )
@@ -55,6 +152,89 @@ def main():
     help="Use this if you want the video to not have vocals.",
     is_flag=True,
 )
+@click.option(
+    "--no-cache",
+    help="Don't read or write the on-disk stem, alignment and background caches",
+    is_flag=True,
+)
+@click.option(
+    "--refresh-alignment",
+    help="Ask Gemini again even if the alignment is cached (the cache is updated)",
+    is_flag=True,
+)
+@click.option(
+    "--separator",
+    help=SEPARATOR_HELP,
+    default=None,
+    type=SeparatorSpec(),
+)
+@click.option(
+    "--max-memory",
+    help="Separate vocals in windows so memory stays within this budget (e.g. 4G)",
+    default=None,
+    callback=_parse_size,
+)
+@click.option(
+    "--in-memory",
+    help="Pass audio between processing stages in memory instead of temporary WAV files",
+    is_flag=True,
+)
+@click.option(
+    "--per-region",
+    help="Transcribe every voice region on its own instead of the audio with silence removed",
+    is_flag=True,
+)
+@click.option(
+    "--transcribe-workers",
+    help="Regions transcribed in parallel with --per-region (default: based on the CPU count, 1 on GPU)",
+    default=None,
+    type=click.IntRange(min=1),
+)
+@click.option(
+    "--keep-stems",
+    help="Also save the separated vocals and instrumental next to the output",
+    is_flag=True,
+)
+@click.option(
+    "--render-jobs",
+    help="Render the ps2 video in this many parallel segments",
+    default=1,
+    type=click.IntRange(min=1),
+)
+@click.option(
+    "--still-frames",
+    help="Without a background, only encode frames when the lyrics change (variable frame rate)",
+    is_flag=True,
+)
+@click.option(
+    "--report-savings",
+    help="With --still-frames, also render a constant frame rate reference and compare",
+    is_flag=True,
+)
+@click.option(
+    "--target",
+    "output_targets",
+    help=TARGET_HELP,
+    multiple=True,
+    type=OutputTarget(),
+    callback=_check_targets,
+)
+@click.option(
+    "--resume",
+    help="Continue an interrupted run from its last completed stage",
+    is_flag=True,
+)
+@click.option(
+    "--work-dir",
+    help="Where intermediate results are kept until the video is done (default: <output>.work)",
+    default=None,
+    type=click.Path(path_type=Path),
+)
+@click.option(
+    "--profile",
+    help="Record wall time, CPU time, peak memory and I/O per stage to <output>.trace.json (Chrome trace / Perfetto) and print a summary",
+    is_flag=True,
+)
 def generate(
     audio_file,
     lyrics_file,
@@ -63,8 +243,24 @@ def generate(
     device,
     generator,
     no_gemini,
+    aligner,
     background,
     karaoke,
+    no_cache,
+    refresh_alignment,
+    separator,
+    max_memory,
+    in_memory,
+    per_region,
+    transcribe_workers,
+    keep_stems,
+    render_jobs,
+    still_frames,
+    report_savings,
+    output_targets,
+    resume,
+    work_dir,
+    profile,
 ):
     if system == "Darwin":
         click.secho(
@@ -77,16 +273,24 @@ def generate(
             fg="yellow",
         )
 
-    import io
-    from contextlib import redirect_stderr, redirect_stdout
-
-    from .core import audio_processor
+    from .core import pipeline, profiler
+    from .core.cache import AlignmentCache, BackgroundCache, StemCache
+    from .core.workdir import WorkDir, default_path
 
     try:
         audio_name = Path(audio_file).stem
         is_interactive = sys.stdin.isatty()
+        if is_interactive:
+            import questionary
+            from questionary import Style
+
+            questionary_style = Style([("pointer", "fg:cyan bold")])
 
-        if not no_gemini and not os.environ.get("GEMINI_API_KEY"):
+        if (
+            not no_gemini
+            and aligner == "gemini"
+            and not os.environ.get("GEMINI_API_KEY")
+        ):
             click.secho("GEMINI_API_KEY environment variable not set.", fg="red")
             sys.exit(1)
 
@@ -141,12 +345,8 @@ def generate(
         if not generator:
             if is_interactive:
                 generator_choices = [
-                    {
-                        "name": "pysubs2 + ffmpeg (fast, good quality)",
-                        "value": "ps2",
-                    },
-                    {"name": "Moviepy (slow, low quality, legacy)", "value": "mp"},
-                    {"name": "Only save transcript (for debugging)", "value": "ts"},
+                    {"name": GENERATORS.description(name), "value": name}
+                    for name in GENERATORS.names()
                 ]
                 generator = questionary.select(
                     "Select the video generator backend:",
@@ -165,7 +365,7 @@ def generate(
             if use_background:
                 while True:
                     background_str = questionary.path(
-                        "Select a background video file (must match or exceed song length):"
+                        "Select a background video file (looped if shorter than the song):"
                     ).ask()
                     if not background_str:
                         click.secho(
@@ -194,7 +394,7 @@ def generate(
                     background = background_path
                     break
 
-        if not no_gemini and is_interactive:
+        if not no_gemini and aligner == "gemini" and is_interactive:
             enable_gemini = questionary.confirm(
                 "Enable Gemini improvements for Whisper output?"
             ).ask()
@@ -209,112 +409,111 @@ def generate(
             click.secho("One or more required arguments are missing.", fg="red")
             sys.exit(1)
 
+        try:
+            job_dir = WorkDir(work_dir or default_path(output), resume=resume)
+        except ValueError as e:
+            click.secho(str(e), fg="red")
+            sys.exit(1)
+        if resume and job_dir.completed():
+            click.secho(f"Resuming after: {', '.join(job_dir.completed())}", fg="blue")
+
+        if profile:
+            profiler.enable()
+
+        # torch, Whisper and Demucs are only imported once all questions are answered
+        with profiler.stage("import models"):
+            from .core import audio_processor
+
         AudioProcessor = audio_processor.AudioProcessor(
-            audio_file, lyrics_file, model_size, device
+            audio_file,
+            lyrics_file,
+            model_size,
+            device,
+            stem_cache=None if no_cache else StemCache(),
+            max_memory=max_memory,
+            separator=separator,
+            in_memory=in_memory,
+            temp_dir=job_dir.path,
+            per_region=per_region,
+            transcribe_workers=transcribe_workers,
         )
 
-        # process audio
-        for i in range(3):
-            stdout_buffer = io.StringIO()
-            stderr_buffer = io.StringIO()
-
-            click.secho("Processing audio...", fg="blue")
-            with redirect_stdout(stdout_buffer), redirect_stderr(stderr_buffer):
-                vocals_path, music_path = AudioProcessor.isolate_vocals()
-                silent_parts, no_silence_file = AudioProcessor.remove_silence()
-                transcript, words = AudioProcessor.transcribe()
-
-            stdout_output = stdout_buffer.getvalue()
-            stderr_output = stderr_buffer.getvalue()
-
-            if stdout_output.strip():
-                click.secho(stdout_output.strip(), fg="white")
-            if stderr_output.strip():
-                click.secho(stderr_output.strip(), fg="white")
-
-            if (
-                "Got start time outside of audio boundary" in stdout_output
-                or "Got start time outside of audio boundary" in stderr_output
-            ):
-                click.secho(
-                    f"Warning: Retrying transcription process ({str(i + 1)}/3).",
-                    fg="yellow",
-                )
-            else:
-                break
-
-        click.secho(f"Vocals path: {str(vocals_path)}", fg="blue")
-        click.secho(f"Instrumental path: {str(music_path)}", fg="blue")
-        click.secho(f"No-silence audio: {str(no_silence_file)}", fg="blue")
-
-        words = AudioProcessor.map_words_to_original()
-        if not no_gemini:
-            gemini_output = gemini.generate(words, AudioProcessor.lyrics)
-            if gemini_output:
-                words = gemini_output
-                click.secho("Gemini succeeded.", fg="green")
-            else:
-                click.secho(
-                    "Gemini failed, using original lyrics. See above for details.",
-                    fg="yellow",
-                )
-
-        if os.path.exists(vocals_path):
-            os.remove(vocals_path)
-        if os.path.exists(no_silence_file):
+        vocals_path, music_path, no_silence_file = pipeline.process_audio(
+            AudioProcessor, work_dir=job_dir, keep_stems=keep_stems
+        )
+
+        if vocals_path:
+            click.secho(f"Vocals path: {str(vocals_path)}", fg="blue")
+        if music_path:
+            click.secho(f"Instrumental path: {str(music_path)}", fg="blue")
+        if no_silence_file:
+            click.secho(f"No-silence audio: {str(no_silence_file)}", fg="blue")
+        if keep_stems:
+            for path in AudioProcessor.save_stems(output):
+                click.secho(f"Saved stem: {path}", fg="blue")
+
+        words = pipeline.align(
+            AudioProcessor,
+            no_gemini=no_gemini,
+            aligner=aligner,
+            cache=None if no_cache else AlignmentCache(),
+            refresh=refresh_alignment,
+            work_dir=job_dir,
+        )
+
+        if no_silence_file and os.path.exists(no_silence_file):
             os.remove(no_silence_file)
 
         temp_dir = AudioProcessor.temp_dir
-        success = False
+        # only files this run wrote (or rewrote) are reported
+        candidates = pipeline.output_files(generator, output, output_targets)
+        before = {path: _mtime(path) for path in candidates}
+        success = pipeline.render(
+            words,
+            generator,
+            output,
+            (audio_file if not karaoke else AudioProcessor.save_instrumental()),
+            temp_dir,
+            background=background,
+            work_dir=job_dir,
+            background_cache=None if no_cache else BackgroundCache(),
+            render_jobs=render_jobs,
+            silent_parts=AudioProcessor.silent_parts,
+            still_frames=still_frames,
+            report_savings=report_savings,
+            targets=output_targets,
+        )
 
-        # generate video
-        if generator == "mp":
-            VideoGenerator = video_generator_mp.VideoGenerator(
-                (audio_file if not karaoke else music_path), clip_path=background
-            )
-            for segment in words:
-                VideoGenerator.add_text(
-                    segment["text"], segment["start"], segment["end"]
-                )
-            VideoGenerator.render_video(output_file_name=output, temp_dir=temp_dir)
-            click.secho("Video created using MoviePy.", fg="green")
-            success = True
-        elif generator == "ps2":
-            VideoGenerator = video_generator_ps2.VideoGenerator()
-            for segment in words:
-                VideoGenerator.add_words(segment)
-            VideoGenerator.save(temp_dir)
-            VideoGenerator.render_video(
-                output_file_name=output,
-                audio_file=(audio_file if not karaoke else music_path),
-                background_path=background,
-            )
-            click.secho("Video created using pysubs2 + ffmpeg.", fg="green")
-            success = True
-        elif generator == "ts":
-            click.secho("Only saving transcript.", fg="green")
-            with open(output + ".json", "w") as file:
-                json.dump(words, file, indent=2)
-            success = True
-        else:
-            click.secho("Unknown video generator selected.", fg="red")
-            success = False
+        if profile:
+            profiler.disable().report(f"{output}.trace.json")
 
         if success:
             click.secho("Processing completed successfully!", fg="green")
+            # cleanup
+            job_dir.remove()
         else:
             click.secho("One or more errors occurred during processing.", fg="red")
+            click.secho(
+                f"Intermediate results are kept in {job_dir.path}, "
+                "run again with --resume to continue.",
+                fg="yellow",
+            )
 
-        # cleanup
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
-
-        click.secho(f"Video saved to {output}.mp4", fg="green")
+        written = [
+            path
+            for path in candidates
+            if _mtime(path) is not None and _mtime(path) != before[path]
+        ]
+        videos = [path for path in written if path.endswith(".mp4")]
+        for path in written:
+            kind = "Video" if path in videos else "Output"
+            # after an error a file may be incomplete
+            click.secho(f"{kind} saved to {path}", fg="green" if success else "yellow")
 
-        if is_interactive:
-            open_video = questionary.confirm("Open the video now?").ask()
+        if is_interactive and success and videos:
+            video_path = videos[0]
+            open_video = questionary.confirm(f"Open {video_path} now?").ask()
             if open_video:
-                video_path = f"{output}.mp4"
                 try:
                     if system == "Darwin":
                         subprocess.Popen(
@@ -349,8 +548,521 @@ def generate(
 
         click.secho(f"An unexpected error occurred: {e}", fg="red")
         click.secho(traceback.format_exc(), fg="red")
+        click.secho(
+            "Run again with --resume to continue from the last completed stage.",
+            fg="yellow",
+        )
         sys.exit(1)
 
 
+@main.command()
+@click.argument("manifest", type=click.Path(exists=True, path_type=Path))
+@click.option("--model_size", "-m", help="Set the Whisper model size", default="small")
+@click.option(
+    "--device",
+    "-d",
+    help="Which device to use for Whisper model inference",
+    default="cpu",
+)
+@click.option(
+    "--generator",
+    "-g",
+    help="Default generator for entries that don't set one",
+    default="ps2",
+    type=GeneratorList(),
+)
+@click.option(
+    "--no-gemini",
+    help="Use this if you don't want Gemini to improve the output of Whisper",
+    is_flag=True,
+)
+@click.option(
+    "--aligner",
+    help="How to align the lyrics to the Whisper transcript: gemini (online) or local (offline, deterministic)",
+    default="gemini",
+    type=click.Choice(ALIGNERS.names()),
+)
+@click.option(
+    "--report",
+    "-r",
+    help="Where to write the per-job status report (JSON)",
+    default=None,
+    type=click.Path(path_type=Path),
+)
+@click.option(
+    "--no-cache",
+    help="Don't read or write the on-disk stem, alignment and background caches",
+    is_flag=True,
+)
+@click.option(
+    "--refresh-alignment",
+    help="Ask Gemini again even if the alignment is cached (the cache is updated)",
+    is_flag=True,
+)
+@click.option(
+    "--separator",
+    help=SEPARATOR_HELP,
+    default=None,
+    type=SeparatorSpec(),
+)
+@click.option(
+    "--max-memory",
+    help="Separate vocals in windows so memory stays within this budget (e.g. 4G)",
+    default=None,
+    callback=_parse_size,
+)
+@click.option(
+    "--in-memory",
+    help="Pass audio between processing stages in memory instead of temporary WAV files",
+    is_flag=True,
+)
+@click.option(
+    "--per-region",
+    help="Transcribe every voice region on its own instead of the audio with silence removed",
+    is_flag=True,
+)
+@click.option(
+    "--transcribe-workers",
+    help="Regions transcribed in parallel with --per-region (default: based on the CPU count, 1 on GPU)",
+    default=None,
+    type=click.IntRange(min=1),
+)
+@click.option(
+    "--keep-stems",
+    help="Also save the separated vocals and instrumental next to the output",
+    is_flag=True,
+)
+@click.option(
+    "--render-jobs",
+    help="Render the ps2 video in this many parallel segments",
+    default=1,
+    type=click.IntRange(min=1),
+)
+@click.option(
+    "--still-frames",
+    help="Without a background, only encode frames when the lyrics change (variable frame rate)",
+    is_flag=True,
+)
+@click.option(
+    "--target",
+    "output_targets",
+    help=TARGET_HELP,
+    multiple=True,
+    type=OutputTarget(),
+    callback=_check_targets,
+)
+@click.option(
+    "--resume",
+    help="Skip jobs the report lists as done and continue failed ones from their last completed stage",
+    is_flag=True,
+)
+@click.option(
+    "--max-models",
+    help="Keep at most this many models loaded, evicting the least recently used",
+    default=None,
+    type=click.IntRange(min=1),
+)
+@click.option(
+    "--max-model-memory",
+    help="Keep at most this much model memory loaded (e.g. 6G)",
+    default=None,
+    callback=_parse_size,
+)
+@click.option(
+    "--profile",
+    help="Record wall time, CPU time, peak memory and I/O per stage and job to a Chrome trace next to the report and print a summary",
+    is_flag=True,
+)
+def batch(
+    manifest,
+    model_size,
+    device,
+    generator,
+    no_gemini,
+    aligner,
+    report,
+    no_cache,
+    refresh_alignment,
+    separator,
+    max_memory,
+    in_memory,
+    per_region,
+    transcribe_workers,
+    keep_stems,
+    render_jobs,
+    still_frames,
+    output_targets,
+    resume,
+    max_models,
+    max_model_memory,
+    profile,
+):
+    """Generate videos for every entry of a CSV/JSON manifest."""
+    from .core import batch as batch_runner
+    from .core import profiler
+    from .core.cache import AlignmentCache, BackgroundCache, StemCache
+
+    try:
+        jobs = batch_runner.load_manifest(manifest)
+    except (ValueError, KeyError, OSError) as e:
+        click.secho(f"Error reading manifest: {e}", fg="red")
+        sys.exit(1)
+
+    if not jobs:
+        click.secho("Manifest contains no jobs.", fg="yellow")
+        sys.exit(0)
+
+    if not no_gemini and aligner == "gemini" and not os.environ.get("GEMINI_API_KEY"):
+        click.secho("GEMINI_API_KEY environment variable not set.", fg="red")
+        sys.exit(1)
+
+    if report is None:
+        report = manifest.with_name(manifest.stem + "_report.json")
+    if profile:
+        profiler.enable()
+
+    result = batch_runner.run_batch(
+        jobs,
+        model_size,
+        device,
+        report,
+        generator=generator,
+        no_gemini=no_gemini,
+        aligner=aligner,
+        keep_stems=keep_stems,
+        render_options={
+            "render_jobs": render_jobs,
+            "still_frames": still_frames,
+            "targets": output_targets,
+            "background_cache": None if no_cache else BackgroundCache(),
+        },
+        align_options={
+            "cache": None if no_cache else AlignmentCache(),
+            "refresh": refresh_alignment,
+        },
+        resume=resume,
+        max_models=max_models,
+        max_model_memory=max_model_memory,
+        stem_cache=None if no_cache else StemCache(),
+        max_memory=max_memory,
+        separator=separator,
+        in_memory=in_memory,
+        per_region=per_region,
+        transcribe_workers=transcribe_workers,
+    )
+    _print_model_stats(result["models"])
+    if profile:
+        profiler.disable().report(report.with_name(report.stem + ".trace.json"))
+    click.secho(f"Report saved to {report}", fg="blue")
+    if any(job["status"] != "ok" for job in result["jobs"]):
+        sys.exit(1)
+
+
+@main.command()
+@click.option("--host", help="Address to listen on", default="127.0.0.1")
+@click.option("--port", "-p", help="Port to listen on", default=8766, type=int)
+@click.option(
+    "--socket",
+    "socket_path",
+    help="Listen on this Unix socket instead of a TCP port",
+    default=None,
+    type=click.Path(path_type=Path),
+)
+@click.option("--model_size", "-m", help="Set the Whisper model size", default="small")
+@click.option(
+    "--device",
+    "-d",
+    help="Which device to use for Whisper model inference",
+    default="cpu",
+)
+@click.option(
+    "--generator",
+    "-g",
+    help="Default generator for jobs that don't set one",
+    default="ps2",
+    type=GeneratorList(),
+)
+@click.option(
+    "--no-gemini",
+    help="Use this if you don't want Gemini to improve the output of Whisper",
+    is_flag=True,
+)
+@click.option(
+    "--aligner",
+    help="Default aligner for jobs that don't set one",
+    default="gemini",
+    type=click.Choice(ALIGNERS.names()),
+)
+@click.option(
+    "--queue-size",
+    help="How many jobs may wait before new ones are rejected",
+    default=16,
+    type=click.IntRange(min=1),
+)
+@click.option(
+    "--max-finished-jobs",
+    help="How many finished jobs are remembered for status and result requests",
+    default=1000,
+    type=click.IntRange(min=1),
+)
+@click.option(
+    "--ml-workers",
+    help="Jobs separated and transcribed at the same time (each loads its own models)",
+    default=1,
+    type=click.IntRange(min=1),
+)
+@click.option(
+    "--render-workers",
+    help="Jobs rendered at the same time",
+    default=1,
+    type=click.IntRange(min=1),
+)
+@click.option(
+    "--render-jobs",
+    help="Render every ps2 video in this many parallel segments",
+    default=1,
+    type=click.IntRange(min=1),
+)
+@click.option(
+    "--output-dir",
+    help="Where jobs without an output path are written",
+    default="lyriks_jobs",
+    type=click.Path(path_type=Path),
+)
+@click.option(
+    "--no-cache",
+    help="Don't read or write the on-disk stem, alignment and background caches",
+    is_flag=True,
+)
+@click.option(
+    "--separator",
+    help=SEPARATOR_HELP,
+    default=None,
+    type=SeparatorSpec(),
+)
+@click.option(
+    "--max-models",
+    help="Keep at most this many models loaded per ML worker, evicting the least recently used",
+    default=None,
+    type=click.IntRange(min=1),
+)
+@click.option(
+    "--max-model-memory",
+    help="Keep at most this much model memory loaded per ML worker (e.g. 6G)",
+    default=None,
+    callback=_parse_size,
+)
+def serve(
+    host,
+    port,
+    socket_path,
+    model_size,
+    device,
+    generator,
+    no_gemini,
+    aligner,
+    queue_size,
+    max_finished_jobs,
+    ml_workers,
+    render_workers,
+    render_jobs,
+    output_dir,
+    no_cache,
+    separator,
+    max_models,
+    max_model_memory,
+):
+    """Keep the models loaded and take jobs over a local HTTP API."""
+    import signal
+    import threading
+
+    from .core import batch as batch_runner
+    from .core import server
+    from .core.audio_processor import load_models
+    from .core.cache import AlignmentCache, BackgroundCache, StemCache
+    from .core.models import ModelRegistry
+
+    if not no_gemini and aligner == "gemini" and not os.environ.get("GEMINI_API_KEY"):
+        click.secho("GEMINI_API_KEY environment variable not set.", fg="red")
+        sys.exit(1)
+
+    # every ML worker has its own models; jobs may ask for other model sizes,
+    # which are loaded next to the default ones and evicted when unused
+    registries = [
+        ModelRegistry(max_models, max_model_memory) for _ in range(ml_workers)
+    ]
+    click.secho(f"Loading models for {ml_workers} worker(s)...", fg="blue")
+    for registry in registries:
+        load_models(model_size, device, registry, separator)
+    stem_cache = None if no_cache else StemCache()
+    background_cache = None if no_cache else BackgroundCache()
+    align_options = {"cache": None if no_cache else AlignmentCache()}
+
+    def analyze(job, worker):
+        return batch_runner.analyze_job(
+            job,
+            model_size,
+            device,
+            no_gemini=no_gemini,
+            aligner=aligner,
+            align_options=align_options,
+            model_registry=registries[worker],
+            stem_cache=stem_cache,
+            separator=separator,
+        )
+
+    def render(job, state, on_progress):
+        processor, work_dir, words = state
+        batch_runner.render_job(
+            job,
+            processor,
+            work_dir,
+            words,
+            generator,
+            render_options={
+                "render_jobs": render_jobs,
+                "on_progress": on_progress,
+                "background_cache": background_cache,
+            },
+        )
+
+    job_server = server.JobServer(
+        analyze,
+        render,
+        queue_size=queue_size,
+        ml_workers=ml_workers,
+        render_workers=render_workers,
+        output_dir=output_dir,
+        max_finished=max_finished_jobs,
+        stats=lambda: {"models": [registry.stats() for registry in registries]},
+    )
+    http_server = server.make_http_server(job_server, host, port, socket_path)
+
+    def stop(signum, frame):
+        # finish the running jobs first, status requests keep working meanwhile
+        click.secho("Shutting down after the running jobs...", fg="yellow")
+
+        def drain():
+            job_server.shutdown()
+            http_server.shutdown()
+
+        threading.Thread(target=drain, daemon=True).start()
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    job_server.start()
+    address = socket_path or f"http://{host}:{http_server.server_address[1]}"
+    click.secho(f"Lyriks server listening on {address}", fg="green")
+    try:
+        http_server.serve_forever()
+    finally:
+        http_server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+    click.secho("Server stopped.", fg="green")
+
+
+@main.command("bench-separator")
+@click.argument("audio_file", type=click.Path(exists=True, path_type=Path))
+@click.option(
+    "--separator",
+    "-s",
+    "separator_list",
+    help="Separator to measure; repeat to compare several (default: a few htdemucs, htdemucs_ft and mdx_extra_q settings). The first one is the reference for the vocals SDR",
+    multiple=True,
+    type=SeparatorSpec(),
+)
+@click.option("--device", "-d", help="Which device to separate on", default="cpu")
+@click.option(
+    "--duration",
+    help="Only separate the first this many seconds of the file",
+    default=None,
+    type=click.FloatRange(min=1),
+)
+@click.option(
+    "--report",
+    "-r",
+    help="Also save the results as JSON",
+    default=None,
+    type=click.Path(path_type=Path),
+)
+def bench_separator(audio_file, separator_list, device, duration, report):
+    """
+    Compare vocal separators on a file: real-time factor, peak memory and how
+    close their vocals come to the first separator's (SDR in dB).
+    """
+    from .core import separation
+
+    separator_list = list(separator_list) or [
+        separators.parse_separator(spec) for spec in separators.BENCHMARK
+    ]
+    results = separation.benchmark_separators(
+        audio_file, separator_list, device, duration
+    )
+    click.secho(separation.benchmark_table(results), fg="white")
+    click.secho(
+        "RTF: separation time / audio duration (lower is faster). Every "
+        "separator runs in its own process, so peak RSS includes its model.",
+        fg="blue",
+    )
+    if report:
+        separation.save_benchmark(results, report)
+        click.secho(f"Report saved to {report}", fg="blue")
+
+
+def _print_model_stats(stats):
+    for model in stats["models"]:
+        copy = f" (copy {model['copy']})" if model.get("copy") else ""
+        click.secho(
+            f"{model['kind']} '{model['name']}'{copy} on {model['device']}: "
+            f"{model['loads']} load(s) in {model['load_seconds']:.1f}s, "
+            f"{model['hits']} reuse(s), {model['evictions']} eviction(s), "
+            f"{model['memory'] / 1024**2:.0f} MB",
+            fg="blue",
+        )
+
+
+@main.group()
+def cache():
+    """Manage the on-disk stem, alignment and background caches."""
+    pass
+
+
+def _caches():
+    from .core.cache import AlignmentCache, BackgroundCache, StemCache
+
+    return [StemCache(), AlignmentCache(), BackgroundCache()]
+
+
+@cache.command()
+@click.option(
+    "--max-size",
+    help="Evict least recently used entries until each cache is below this size (e.g. 5G)",
+    default=None,
+    callback=_parse_size,
+)
+def prune(max_size):
+    """Evict expired entries and least recently used entries above the size cap."""
+    for disk_cache in _caches():
+        removed, freed = disk_cache.prune(max_size=max_size)
+        click.secho(
+            f"Removed {removed} entries ({freed / 1024**2:.1f} MB), "
+            f"{disk_cache.size() / 1024**2:.1f} MB left in {disk_cache.directory}",
+            fg="green",
+        )
+
+
+@cache.command()
+def clear():
+    """Remove every cached entry."""
+    for disk_cache in _caches():
+        removed, freed = disk_cache.clear()
+        click.secho(
+            f"Removed {removed} entries ({freed / 1024**2:.1f} MB) from {disk_cache.directory}.",
+            fg="green",
+        )
+
+
 if __name__ == "__main__":
     main()
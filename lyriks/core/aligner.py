@@ -0,0 +1,264 @@
+"""
+Offline, deterministic alternative to the Gemini aligner.
+
+The lyrics are tokenized and aligned to the Whisper words with a banded edit
+distance whose substitution cost is a fuzzy/phonetic token distance. Matched
+lyric words take the timing of their Whisper word, the others are interpolated
+between their matched neighbours. The output uses the same segment/word schema
+as gemini.generate.
+"""
+
+import re
+import unicodedata
+
+GAP_COST = 1.0
+# above GAP_COST so unrelated words don't shift matches, below two gaps so a
+# misheard word still takes the place of the lyric word
+MISMATCH_COST = 1.5
+PHONETIC_COST = 0.25
+BAND = 40
+MIN_WORD_DURATION = 0.1
+HEADER_PATTERN = re.compile(r"^\s*[\[(].*[\])]\s*$")  # [Chorus], (Verse 2), ...
+
+PHONETIC_RULES = [
+    (re.compile(r"ph"), "f"),
+    (re.compile(r"ck|q|c(?=[aou])|c$"), "k"),
+    (re.compile(r"c"), "s"),
+    (re.compile(r"z"), "s"),
+    (re.compile(r"gh"), ""),
+    (re.compile(r"(?<=.)[aeiouyhw]"), ""),
+    (re.compile(r"(.)\1+"), r"\1"),
+]
+
+
+def normalize(word):
+    # lowercase, accents and punctuation removed
+    word = unicodedata.normalize("NFKD", word.lower())
+    return "".join(c for c in word if c.isalnum())
+
+
+def phonetic_key(word):
+    key = word
+    for pattern, replacement in PHONETIC_RULES:
+        key = pattern.sub(replacement, key)
+    return key
+
+
+def _bigrams(word):
+    return {word[i : i + 2] for i in range(len(word) - 1)} or {word}
+
+
+class _Token:
+    __slots__ = ("text", "key", "phonetic", "bigrams")
+
+    def __init__(self, text):
+        self.text = text
+        self.key = normalize(text)
+        self.phonetic = phonetic_key(self.key)
+        self.bigrams = _bigrams(self.key)
+
+
+def token_cost(a, b, cache):
+    # 0 for equal words, low for words that sound alike, up to MISMATCH_COST
+    if a.key == b.key:
+        return 0.0
+    pair = (a.key, b.key)
+    cost = cache.get(pair)
+    if cost is None:
+        if a.phonetic and a.phonetic == b.phonetic:
+            cost = PHONETIC_COST
+        else:
+            common = len(a.bigrams & b.bigrams)
+            dice = 2 * common / (len(a.bigrams) + len(b.bigrams))
+            cost = 0.35 + (MISMATCH_COST - 0.35) * (1.0 - dice)
+        cache[pair] = cost
+    return cost
+
+
+def tokenize_lyrics(lyrics):
+    # one list of tokens per lyric line; empty lines and section headers skipped
+    lines = []
+    for line in lyrics.splitlines():
+        if not line.strip() or HEADER_PATTERN.match(line):
+            continue
+        tokens = [_Token(word) for word in line.split() if normalize(word)]
+        if tokens:
+            lines.append((line.strip(), tokens))
+    return lines
+
+
+def flatten_transcript(segments):
+    words = []
+    for segment in segments:
+        for word in segment["words"]:
+            if isinstance(word, dict):
+                start, end, text = word["start"], word["end"], word["word"]
+            else:
+                start, end, text = word[0], word[1], word[2]
+            if normalize(text):
+                words.append((float(start), float(end), _Token(text)))
+    return words
+
+
+def banded_alignment(lyric_tokens, transcript_tokens, band=BAND):
+    """
+    Edit-distance alignment restricted to a band that follows the cheapest
+    cell of the previous row, so the cost is O(len(lyrics) * band) no matter
+    how far the transcript drifts. Returns, for every lyric token, the index of
+    the transcript token it was matched to, or None.
+    """
+    n, m = len(lyric_tokens), len(transcript_tokens)
+    if not n or not m:
+        return [None] * n
+
+    cache = {}
+    inf = float("inf")
+    rows, ranges, moves = [], [], []
+
+    # row 0: only transcript tokens skipped so far
+    lo, hi = 0, min(m, band)
+    rows.append([j * GAP_COST for j in range(lo, hi + 1)])
+    ranges.append((lo, hi))
+    moves.append(bytes(hi - lo + 1))
+    best_j = 0
+
+    for i in range(1, n + 1):
+        prev, (prev_lo, prev_hi) = rows[-1], ranges[-1]
+        lo = max(prev_lo, best_j + 1 - band)
+        hi = min(m, best_j + 1 + band)
+        row = [inf] * (hi - lo + 1)
+        move = bytearray(hi - lo + 1)
+        token = lyric_tokens[i - 1]
+        for j in range(lo, hi + 1):
+            best, how = inf, 0
+            # lyric word missing from the transcript
+            if j <= prev_hi:
+                best, how = prev[j - prev_lo] + GAP_COST, 1
+            if j > lo:
+                # extra transcript word
+                cost = row[j - 1 - lo] + GAP_COST
+                if cost < best:
+                    best, how = cost, 2
+            if prev_lo < j <= prev_hi + 1:
+                cost = prev[j - 1 - prev_lo] + token_cost(
+                    token, transcript_tokens[j - 1], cache
+                )
+                if cost <= best:
+                    best, how = cost, 3
+            row[j - lo] = best
+            move[j - lo] = how
+        best_j = lo + min(range(len(row)), key=row.__getitem__)
+        rows.append(row)
+        ranges.append((lo, hi))
+        moves.append(move)
+
+    # backtrack from the cheapest end point in the last row
+    matches = [None] * n
+    lo, hi = ranges[n]
+    last = rows[n]
+    j = lo + min(range(len(last)), key=lambda k: (last[k] + (m - lo - k) * GAP_COST))
+    i = n
+    while i > 0:
+        lo, _ = ranges[i]
+        how = moves[i][j - lo]
+        if how == 3:
+            matches[i - 1] = j - 1
+            i, j = i - 1, j - 1
+        elif how == 2:
+            j -= 1
+        else:
+            i -= 1
+    return matches
+
+
+def _interpolate(times):
+    """
+    Fills None entries of a list of (start, end) pairs from their matched
+    neighbours. Gaps that are too short get the previous word's span shared.
+    """
+    n = len(times)
+    i = 0
+    while i < n:
+        if times[i] is not None:
+            i += 1
+            continue
+        run_end = i
+        while run_end < n and times[run_end] is None:
+            run_end += 1
+        count = run_end - i
+        left = times[i - 1][1] if i > 0 else None
+        right = times[run_end][0] if run_end < n else None
+        if left is None and right is None:
+            left, right = 0.0, MIN_WORD_DURATION * count
+        elif left is None:
+            left = max(0.0, right - 0.3 * count)
+        elif right is None:
+            right = left + 0.3 * count
+
+        first = i
+        if right - left < MIN_WORD_DURATION * count:
+            # no room: share a neighbouring word's time with the missing ones
+            if i > 0:
+                first = i - 1
+                left = times[i - 1][0]
+                count += 1
+            elif run_end < n:
+                right = times[run_end][1]
+                count += 1
+        right = max(right, left + MIN_WORD_DURATION * count)
+        step = (right - left) / count
+        for k in range(count):
+            times[first + k] = (left + k * step, left + (k + 1) * step)
+        i = run_end
+    return times
+
+
+def align(whisper_transcript, lyrics, **options):
+    """
+    Aligns the lyrics to the Whisper words (as returned by
+    AudioProcessor.map_words_to_original) and returns one segment per lyric
+    line: {"text", "words": [{"start", "end", "word"}], "start", "end"}.
+    options (e.g. the Gemini cache) are accepted for the aligner registry and
+    ignored, the local alignment is cheap enough to redo.
+    """
+    lines = tokenize_lyrics(lyrics)
+    transcript = flatten_transcript(whisper_transcript)
+    lyric_tokens = [token for _, tokens in lines for token in tokens]
+    if not lyric_tokens or not transcript:
+        return False
+
+    matches = banded_alignment(lyric_tokens, [word[2] for word in transcript])
+    times = [
+        None if match is None else (transcript[match][0], transcript[match][1])
+        for match in matches
+    ]
+    # keep timing monotonic where the alignment matched out of order words
+    last_start = 0.0
+    for k, span in enumerate(times):
+        if span is None:
+            continue
+        if span[0] < last_start:
+            times[k] = None
+        else:
+            last_start = span[0]
+    times = _interpolate(times)
+
+    segments = []
+    position = 0
+    for text, tokens in lines:
+        words = []
+        for token in tokens:
+            start, end = times[position]
+            words.append(
+                {
+                    "start": round(start, 2),
+                    "end": round(max(end, start), 2),
+                    "word": token.text,
+                }
+            )
+            position += 1
+        start, end = words[0]["start"], words[-1]["end"]
+        if end <= start:
+            end = round(start + MIN_WORD_DURATION, 2)
+        segments.append({"text": text, "words": words, "start": start, "end": end})
+    return segments
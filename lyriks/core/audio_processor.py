@@ -1,22 +1,92 @@
+import os
+import queue
+import shutil
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import click
 import numpy as np
-import soundfile as sf
 import torch
+import torchaudio
 import whisper_timestamped as whisper
-from demucs.apply import apply_model
 from demucs.audio import AudioFile
-from demucs.pretrained import get_model
 from iso639 import Lang
 from langdetect import detect
 from langdetect.lang_detect_exception import LangDetectException
+from whisper.audio import SAMPLE_RATE as WHISPER_SAMPLE_RATE
+
+from . import models, profiler, separation, separators, silence
+from .timeline import map_segments
+
+DEMUCS_MODEL = separators.DEFAULT["model"]
+# every pretrained Demucs model works at 44.1 kHz; knowing it up front lets a
+# stem cache hit skip loading the model
+DEMUCS_SAMPLERATE = 44100
+
+
+def load_models(model_size="small", device="cpu", registry=None, separator=None):
+    registry = registry or models.default_registry()
+    separator = separator or separators.DEFAULT
+    return (
+        registry.get("whisper", model_size, device),
+        registry.get("demucs", separator["model"], device),
+    )
+
+
+def resample_for_whisper(audio, samplerate):
+    # mono float32 at Whisper's sample rate, resampled exactly once
+    audio = silence.to_mono(np.asarray(audio, dtype=np.float32))
+    if samplerate != WHISPER_SAMPLE_RATE:
+        audio = torchaudio.functional.resample(
+            torch.from_numpy(np.ascontiguousarray(audio)),
+            samplerate,
+            WHISPER_SAMPLE_RATE,
+        ).numpy()
+    return audio
+
+
+def _collect_words(segments, offset=0.0):
+    # Whisper segments as {"start", "end", "text", "words": [(start, end, word)]}
+    words = []
+    for segment in segments:
+        words.append(
+            {
+                "start": round(float(segment["start"]) + offset, 2),
+                "end": round(float(segment["end"]) + offset, 2),
+                "text": segment["text"],
+                "words": [
+                    (
+                        float(word["start"]) + offset,
+                        float(word["end"]) + offset,
+                        word["text"],
+                    )
+                    for word in segment["words"]
+                ],
+            }
+        )
+    return words
 
 
 class AudioProcessor:
     def __init__(
-        self, audio_file: Path, lyrics_file: Path, model_size="small", device="cpu"
+        self,
+        audio_file: Path,
+        lyrics_file: Path,
+        model_size="small",
+        device="cpu",
+        model=None,
+        demucs_model=None,
+        stem_cache=None,
+        max_memory=None,
+        in_memory=False,
+        temp_dir=None,
+        per_region=False,
+        region_length=30.0,
+        transcribe_workers=None,
+        model_registry=None,
+        dtype=None,
+        separator=None,
     ):
         if isinstance(audio_file, bytes):
             audio_file = audio_file.decode()
@@ -36,22 +106,76 @@ class AudioProcessor:
 
         self.device = device
         self.model_size = model_size
+        # which Demucs model separates the vocals and how (see separators.py);
+        # its label keys the stem cache and the work dir
+        self.separator = separator or separators.DEFAULT
+        self.separation_model = separators.label(self.separator)
         self.vocals_file = None
-        self.temp_dir = Path(tempfile.mkdtemp())
+        self.instrumental_file = None
+        self.no_silence_file = None
+        self.vocals = None
+        self.instrumental = None
+        self.no_silence_audio = None
+        # keep stems in memory and only write files when asked to
+        self.in_memory = in_memory
+        self.stem_cache = stem_cache
+        self.max_memory = max_memory
+        # transcribe every voice region on its own instead of the glued audio
+        self.per_region = per_region
+        self.region_length = region_length
+        self.transcribe_workers = transcribe_workers
+        if temp_dir is None:
+            self.temp_dir = Path(tempfile.mkdtemp())
+        else:
+            # e.g. a persistent work dir, so intermediate files survive a crash
+            self.temp_dir = Path(temp_dir)
+            self.temp_dir.mkdir(parents=True, exist_ok=True)
+
+        # models come from a shared registry and are loaded on first use, so
+        # resumed jobs or jobs with cached stems never load what they don't need
+        self.model_registry = model_registry
+        # e.g. "float16" for Whisper on a GPU; Demucs always runs in float32
+        self.dtype = dtype
+        self._model = model
+        self._demucs_model = demucs_model
+
+    def _registry(self):
+        if self.model_registry is None:
+            self.model_registry = models.default_registry()
+        return self.model_registry
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = self._registry().get(
+                "whisper", self.model_size, self.device, self.dtype
+            )
+        return self._model
 
-        try:
-            self.model = whisper.load_model(self.model_size, device=self.device)
-            self.demucs_model = get_model("htdemucs").to(self.device)
-            self.demucs_model.eval()
-        except Exception as e:
-            click.secho(f"Error loading AI models: {e}", fg="red")
-            raise
+    @property
+    def demucs_model(self):
+        if self._demucs_model is None:
+            self._demucs_model = self._registry().get(
+                "demucs", self.separator["model"], self.device
+            )
+        return self._demucs_model
 
+    @profiler.profiled("transcription")
     def transcribe(self):
+        if self.per_region:
+            return self.transcribe_regions()
+
         # check which audios exist and choose one
-        if hasattr(self, "no_silence_file") and self.no_silence_file:
+        audio = None
+        if self.no_silence_audio is not None:
+            audio = self.no_silence_audio
+            self.used_silence_removed = True
+        elif self.no_silence_file:
             audio_path = self.no_silence_file
             self.used_silence_removed = True
+        elif self.in_memory and self.vocals is not None:
+            audio = resample_for_whisper(self.vocals, self.stem_samplerate)
+            self.used_silence_removed = False
         elif self.vocals_file:
             audio_path = self.vocals_file
             self.used_silence_removed = False
@@ -60,67 +184,186 @@ class AudioProcessor:
             self.used_silence_removed = False
 
         try:
-            audio = whisper.load_audio(audio_path)
+            if audio is None:
+                with profiler.stage("decode"):
+                    audio = whisper.load_audio(audio_path)
             self.transcript = whisper.transcribe(self.model, audio, self.language)
         except Exception as e:
             click.secho(f"Error during transcription: {e}", fg="red")
             raise
 
-        self.words = []
-        for segment in self.transcript["segments"]:
-            segment_words = []
-            for word in segment["words"]:
-                segment_words.append(
-                    (float(word["start"]), float(word["end"]), word["text"])
+        self.words = _collect_words(self.transcript["segments"])
+        return self.transcript, self.words
+
+    def _region_workers(self, count):
+        if self.transcribe_workers:
+            workers = self.transcribe_workers
+        elif self.device == "cpu":
+            workers = min(4, max(1, (os.cpu_count() or 1) // 4))
+        else:
+            # one GPU is already kept busy by a single job
+            workers = 1
+        workers = min(workers, count)
+        if workers > 1:
+            # every worker holds its own copy of the model and all of them have
+            # to fit within the registry's limits at once
+            registry = self._registry()
+            if registry.max_models is not None:
+                workers = min(workers, registry.max_models)
+            memory = models.model_memory(self.model)
+            if registry.max_memory is not None and memory:
+                workers = min(workers, registry.max_memory // memory)
+        return max(1, workers)
+
+    def transcribe_regions(self):
+        """
+        Transcribes every merged voice region as an independent job and offsets
+        its timestamps straight into the original timeline, so
+        map_words_to_original has nothing left to do.
+        """
+        source, samplerate = self._silence_source()
+        if samplerate is None:
+            _, samplerate = silence.source_info(source)
+        regions = silence.merge_regions(
+            self.non_silent_parts, self.region_length, self.total_duration
+        )
+        workers = self._region_workers(len(regions))
+
+        # whisper_timestamped hooks into the model while transcribing, so every
+        # worker gets its own copy; they come from the registry, which keeps
+        # them for the next song and counts them towards its limits
+        idle = queue.Queue()
+        idle.put(self.model)
+        for index in range(1, workers):
+            idle.put(
+                self._registry().get(
+                    "whisper", self.model_size, self.device, self.dtype, copy=index
                 )
-            self.words.append(
-                {
-                    "start": round(float(segment["start"]), 2),
-                    "end": round(float(segment["end"]), 2),
-                    "text": segment["text"],
-                    "words": segment_words,
-                }
             )
 
+        def run(region):
+            start, end = region
+            audio = resample_for_whisper(
+                silence.extract_regions(source, samplerate, [region]), samplerate
+            )
+            model = idle.get()
+            try:
+                result = whisper.transcribe(model, audio, self.language)
+            finally:
+                idle.put(model)
+            return _collect_words(result["segments"], offset=start)
+
+        threads = torch.get_num_threads()
+        try:
+            if workers > 1:
+                torch.set_num_threads(max(1, threads // workers))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(run, regions))
+        except Exception as e:
+            click.secho(f"Error during transcription: {e}", fg="red")
+            raise
+        finally:
+            torch.set_num_threads(threads)
+
+        self.words = [segment for words in results for segment in words]
+        self.transcript = {"segments": self.words}
+        self.used_silence_removed = False
         return self.transcript, self.words
 
+    @profiler.profiled("separation")
     def isolate_vocals(self):
         try:
-            wav = AudioFile(Path(self.audio_file)).read(
-                streams=0,
-                samplerate=self.demucs_model.samplerate,
-                channels=self.demucs_model.audio_channels,
-            )
-            wav = wav.float().unsqueeze(0).to(self.device)
-
-            with torch.no_grad():
-                sources = apply_model(self.demucs_model, wav, device=self.device)[0]
-
-            vocals_idx = self.demucs_model.sources.index("vocals")
-            vocals = sources[vocals_idx].detach().cpu().numpy().T
-
-            instrumental = (
-                sum(
-                    sources[i]
-                    for i in range(len(self.demucs_model.sources))
-                    if i != vocals_idx
+            if self._demucs_model is not None:
+                samplerate = self._demucs_model.samplerate
+            else:
+                samplerate = DEMUCS_SAMPLERATE
+            cache_key = None
+            cached = None
+            if self.stem_cache is not None:
+                cache_key = self.stem_cache.key(
+                    self.audio_file, self.separation_model, samplerate
                 )
-                .detach()
-                .cpu()
-                .numpy()
-                .T
-            )
+                cached = self.stem_cache.get(cache_key)
 
             self.vocals_file = str(self.temp_dir / "vocals.wav")
             self.instrumental_file = str(self.temp_dir / "music_only.wav")
-            sf.write(self.vocals_file, vocals, self.demucs_model.samplerate)
-            sf.write(self.instrumental_file, instrumental, self.demucs_model.samplerate)
+            self.stem_samplerate = samplerate
+            metadata = dict(
+                audio_file=self.audio_file,
+                model=self.separation_model,
+                samplerate=samplerate,
+            )
+
+            on_disk = False
+            if cached is not None:
+                click.secho("Using cached stems.", fg="blue")
+                self.vocals, self.instrumental = cached
+            elif self.max_memory:
+                # bounded memory: stems go straight to disk window by window
+                separation.separate_streaming(
+                    self.demucs_model,
+                    self.audio_file,
+                    self.vocals_file,
+                    self.instrumental_file,
+                    device=self.device,
+                    max_memory=self.max_memory,
+                    separator=self.separator,
+                )
+                on_disk = True
+                self.vocals, self.instrumental = None, None
+                if self.stem_cache is not None:
+                    self.stem_cache.put_files(
+                        cache_key, self.vocals_file, self.instrumental_file, **metadata
+                    )
+                    cached = self.stem_cache.get(cache_key)
+                    if cached is not None:
+                        self.vocals, self.instrumental = cached
+            else:
+                self.vocals, self.instrumental = self._separate()
+                if self.stem_cache is not None:
+                    self.stem_cache.put(
+                        cache_key, self.vocals, self.instrumental, **metadata
+                    )
+
+            if self.in_memory and not on_disk:
+                # later stages take the arrays, files are written on demand
+                self.vocals_file = None
+                self.instrumental_file = None
+            elif not on_disk:
+                separation.write_wav(self.vocals_file, self.vocals, samplerate)
+                separation.write_wav(
+                    self.instrumental_file, self.instrumental, samplerate
+                )
 
             return self.vocals_file, self.instrumental_file
         except Exception as e:
             click.secho(f"Error isolating vocals: {e}", fg="red")
             raise
 
+    def _separate(self):
+        demucs_model = self.demucs_model
+        with profiler.stage("decode"):
+            wav = AudioFile(Path(self.audio_file)).read(
+                streams=0,
+                samplerate=demucs_model.samplerate,
+                channels=demucs_model.audio_channels,
+            )
+        wav = wav.float().unsqueeze(0).to(self.device)
+
+        vocals, instrumental = separation.separate(
+            demucs_model, wav, self.separator, self.device
+        )
+        return vocals.cpu().numpy().T, instrumental.cpu().numpy().T
+
+    def _silence_source(self):
+        if self.vocals is not None:
+            # stems are already in memory (or memory-mapped from the cache)
+            return self.vocals, self.stem_samplerate
+        elif self.vocals_file:
+            return self.vocals_file, None
+        return self.audio_file, None
+
+    @profiler.profiled("vad")
     def remove_silence(
         self,
         frame_length=2048,
@@ -128,146 +371,112 @@ class AudioProcessor:
         silence_thresh=0.02,
         min_non_silence_sec=0.2,
     ):
-        if hasattr(self, "vocals_file") and self.vocals_file:
-            audio_file = self.vocals_file
-        else:
-            audio_file = self.audio_file
+        source, samplerate = self._silence_source()
 
         try:
-            audio_data, sr = sf.read(audio_file)
+            non_silent_parts, self.total_duration, sr = silence.detect_non_silent(
+                source,
+                samplerate,
+                frame_length=frame_length,
+                hop_length=hop_length,
+                silence_thresh=silence_thresh,
+                min_non_silence_sec=min_non_silence_sec,
+            )
         except Exception as e:
             click.secho(f"Error reading audio file for silence removal: {e}", fg="red")
             raise
 
-        if len(audio_data.shape) > 1:
-            audio_data = audio_data.mean(axis=1)
-        self.total_duration = len(audio_data) / sr
-
-        energies = []
-        for i in range(0, len(audio_data) - frame_length, hop_length):
-            frame = audio_data[i : i + frame_length]
-            energy = np.sqrt(np.mean(frame**2))
-            energies.append(energy)
-        energies = np.array(energies)
-
-        non_silent = energies > silence_thresh
-        non_silent_indices = np.where(non_silent)[0]
-
-        if not len(non_silent_indices):
+        if non_silent_parts is None:
             click.secho("Warning: Audio appears to be completely silent.", fg="yellow")
-            self.non_silent_parts = []
-            self.silent_parts = [(0.0, self.total_duration)]
-            self.no_silence_file = None
-            return self.silent_parts, self.no_silence_file
+            non_silent_parts = []
+        # per-region transcription reads the regions straight from the vocals
+        self._apply_regions(non_silent_parts, source, sr, not self.per_region)
+        return self.silent_parts, self.no_silence_file
 
-        self.non_silent_parts = []
-        if len(non_silent_indices) > 0:
-            start = non_silent_indices[0]
-            for i in range(1, len(non_silent_indices)):
-                if non_silent_indices[i] != non_silent_indices[i - 1] + 1:
-                    end = non_silent_indices[i - 1]
-                    start_time = start * hop_length / sr
-                    end_time = (end * hop_length + frame_length) / sr
-                    if end_time - start_time >= min_non_silence_sec:
-                        self.non_silent_parts.append((start_time, end_time))
-                    start = non_silent_indices[i]
-            end = non_silent_indices[-1]
-            start_time = start * hop_length / sr
-            end_time = (end * hop_length + frame_length) / sr
-            if end_time - start_time >= min_non_silence_sec:
-                self.non_silent_parts.append((start_time, end_time))
-
-        self.silent_parts = []
-        prev_end = 0.0
-        for start_time, end_time in self.non_silent_parts:
-            if start_time > prev_end:
-                self.silent_parts.append(
-                    (float(round(prev_end, 2)), float(round(start_time, 2)))
-                )
-            prev_end = end_time
-        if prev_end < self.total_duration:
-            self.silent_parts.append(
-                (float(round(prev_end, 2)), float(round(self.total_duration, 2)))
-            )
+    def _apply_regions(self, non_silent_parts, source, samplerate, build_audio=True):
+        self.non_silent_parts = non_silent_parts
+        self.silent_parts = (
+            silence.silent_gaps(self.non_silent_parts, self.total_duration)
+            if non_silent_parts
+            else [(0.0, self.total_duration)]
+        )
 
         # save audio without silence
-        extracted = []
-        for start_time, end_time in self.non_silent_parts:
-            start_sample = int(start_time * sr)
-            end_sample = int(end_time * sr)
-            extracted.append(audio_data[start_sample:end_sample])
-        if extracted:
-            result = np.concatenate(extracted)
+        self.no_silence_file = None
+        self.no_silence_audio = None
+        if not build_audio:
+            return
+        if self.non_silent_parts and self.in_memory:
+            self.no_silence_audio = resample_for_whisper(
+                silence.extract_regions(source, samplerate, self.non_silent_parts),
+                samplerate,
+            )
+        elif self.non_silent_parts:
             self.no_silence_file = str(self.temp_dir / "no_silence.wav")
-            sf.write(self.no_silence_file, result, sr)
+            silence.write_regions(
+                source, samplerate, self.non_silent_parts, self.no_silence_file
+            )
 
+    def restore_stems(self, vocals_file, instrumental_file):
+        # picks up stems written by an earlier run instead of separating again
+        self.vocals_file = str(vocals_file)
+        self.instrumental_file = str(instrumental_file)
+        self.vocals, self.instrumental = None, None
+        _, self.stem_samplerate = silence.source_info(self.vocals_file)
+        return self.vocals_file, self.instrumental_file
+
+    def restore_regions(self, non_silent_parts, total_duration, build_audio=True):
+        # takes previously detected regions; the silence-removed audio is only
+        # rebuilt if it is going to be transcribed
+        self.total_duration = total_duration
+        non_silent_parts = [tuple(part) for part in non_silent_parts]
+        if not build_audio or self.per_region:
+            self._apply_regions(non_silent_parts, None, None, build_audio=False)
+            return self.silent_parts, self.no_silence_file
+        source, samplerate = self._silence_source()
+        if samplerate is None:
+            _, samplerate = silence.source_info(source)
+        self._apply_regions(non_silent_parts, source, samplerate)
         return self.silent_parts, self.no_silence_file
 
+    def restore_transcript(self, words, used_silence_removed):
+        self.words = words
+        self.used_silence_removed = used_silence_removed
+        return self.words
+
+    def save_instrumental(self, path=None):
+        # writes the instrumental if it only exists in memory so far
+        if path is None and self.instrumental_file:
+            return self.instrumental_file
+        if self.instrumental is None:
+            raise RuntimeError("Run isolate_vocals() before saving the instrumental.")
+        path = str(path or self.temp_dir / "music_only.wav")
+        separation.write_wav(path, self.instrumental, self.stem_samplerate)
+        if self.instrumental_file is None:
+            self.instrumental_file = path
+        return path
+
+    def save_stems(self, prefix):
+        # keeps copies of both stems as <prefix>_vocals.wav and <prefix>_instrumental.wav
+        vocals_path = f"{prefix}_vocals.wav"
+        if self.vocals is not None:
+            separation.write_wav(vocals_path, self.vocals, self.stem_samplerate)
+        elif self.vocals_file:
+            shutil.copyfile(self.vocals_file, vocals_path)
+        else:
+            raise RuntimeError("Run isolate_vocals() before saving the stems.")
+        instrumental_path = f"{prefix}_instrumental.wav"
+        if self.instrumental is not None:
+            self.save_instrumental(instrumental_path)
+        else:
+            shutil.copyfile(self.instrumental_file, instrumental_path)
+        return vocals_path, instrumental_path
+
+    @profiler.profiled("mapping")
     def map_words_to_original(self):
         # only run function if silence has been removed
         if not hasattr(self, "used_silence_removed") or not self.used_silence_removed:
             return self.words
 
-        mapping = []
-        new_time = 0.0
-        for orig_start, orig_end in self.non_silent_parts:
-            duration = orig_end - orig_start
-            mapping.append((orig_start, orig_end, new_time, new_time + duration))
-            new_time += duration
-
-        self.mapped_words = []
-        for segment in self.words:
-            mapped_segment = {"text": segment["text"], "words": []}
-
-            # map segment start time
-            segment_start = segment["start"]
-            mapped_segment_start = None
-            for orig_start, orig_end, new_start, new_end in mapping:
-                if new_start <= segment_start < new_end:
-                    offset = segment_start - new_start
-                    mapped_segment_start = orig_start + offset
-                    break
-
-            # map segment end time
-            segment_end = segment["end"]
-            mapped_segment_end = None
-            for orig_start, orig_end, new_start, new_end in mapping:
-                if new_start <= segment_end < new_end:
-                    offset = segment_end - new_start
-                    mapped_segment_end = orig_start + offset
-                    break
-
-            if mapped_segment_start is not None:
-                mapped_segment["start"] = round(float(mapped_segment_start), 2)
-            else:
-                mapped_segment["start"] = segment["start"]  # Fallback
-
-            if mapped_segment_end is not None:
-                mapped_segment["end"] = round(float(mapped_segment_end), 2)
-            else:
-                mapped_segment["end"] = segment["end"]  # Fallback
-
-            # map each word in the segment
-            for word_start, word_end, word in segment["words"]:
-                for orig_start, orig_end, new_start, new_end in mapping:
-                    if new_start <= word_start < new_end:
-                        offset = word_start - new_start
-                        orig_word_start = orig_start + offset
-                        offset_end = word_end - new_start
-                        orig_word_end = orig_start + offset_end
-                        mapped_segment["words"].append(
-                            (
-                                round(float(orig_word_start), 2),
-                                round(float(orig_word_end), 2),
-                                word,
-                            )
-                        )
-                        break
-
-            if (
-                not mapped_segment["words"] == []
-                and mapped_segment["end"] > mapped_segment["start"]
-            ):
-                self.mapped_words.append(mapped_segment)
-
+        self.mapped_words = map_segments(self.words, self.non_silent_parts)
         return self.mapped_words
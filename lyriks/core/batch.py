@@ -0,0 +1,250 @@
+import csv
+import json
+import os
+import time
+import traceback
+from pathlib import Path
+
+import click
+
+from . import pipeline, profiler
+from .workdir import WorkDir, default_path
+
+TRUE_VALUES = ("1", "true", "yes", "y", "on")
+
+
+def _as_bool(value):
+    if isinstance(value, bool):
+        return value
+    if value is None:
+        return False
+    return str(value).strip().lower() in TRUE_VALUES
+
+
+def load_manifest(manifest_path):
+    """
+    Reads a batch manifest (CSV with a header row, or a JSON list of objects).
+
+    Every entry needs an "audio" and a "lyrics" column. "output", "generator",
+    "background", "karaoke", "no_gemini", "aligner" and "model_size" are
+    optional per-entry overrides.
+    Relative paths are resolved against the manifest's directory.
+    """
+    manifest_path = Path(manifest_path)
+    if manifest_path.suffix.lower() == ".json":
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+        if isinstance(entries, dict):
+            entries = entries.get("jobs", [])
+    else:
+        with open(manifest_path, "r", encoding="utf-8", newline="") as f:
+            entries = list(csv.DictReader(f))
+
+    base_dir = manifest_path.parent
+    return [parse_entry(entry, base_dir, index) for index, entry in enumerate(entries)]
+
+
+def parse_entry(entry, base_dir, index=0):
+    # turns one manifest entry (or API request) into a job
+    entry = {k.strip(): v for k, v in entry.items() if k is not None}
+    if not entry.get("audio") or not entry.get("lyrics"):
+        raise ValueError(
+            f"Manifest entry {index + 1} needs an 'audio' and a 'lyrics' field."
+        )
+    base_dir = Path(base_dir)
+    audio = base_dir / Path(entry["audio"])
+    lyrics = base_dir / Path(entry["lyrics"])
+    output = entry.get("output") or audio.stem
+    background = entry.get("background") or None
+    return {
+        "audio": audio,
+        "lyrics": lyrics,
+        "output": str(base_dir / output),
+        "generator": entry.get("generator") or None,
+        "background": base_dir / Path(background) if background else None,
+        "karaoke": _as_bool(entry.get("karaoke")),
+        "no_gemini": _as_bool(entry.get("no_gemini")),
+        "aligner": entry.get("aligner") or None,
+        "model_size": entry.get("model_size") or None,
+    }
+
+
+def analyze_job(
+    job,
+    model_size,
+    device,
+    no_gemini=False,
+    keep_stems=False,
+    aligner="gemini",
+    align_options=None,
+    resume=False,
+    **processor_kwargs,
+):
+    # the ML half of a job: separation, transcription and alignment
+    from .audio_processor import AudioProcessor
+
+    work_dir = WorkDir(default_path(job["output"]), resume=resume)
+    processor = AudioProcessor(
+        job["audio"],
+        job["lyrics"],
+        job.get("model_size") or model_size,
+        device,
+        temp_dir=work_dir.path,
+        **processor_kwargs,
+    )
+    pipeline.process_audio(processor, work_dir=work_dir, keep_stems=keep_stems)
+    if keep_stems:
+        processor.save_stems(job["output"])
+    words = pipeline.align(
+        processor,
+        no_gemini=no_gemini or job["no_gemini"],
+        aligner=job.get("aligner") or aligner,
+        work_dir=work_dir,
+        **(align_options or {}),
+    )
+    return processor, work_dir, words
+
+
+def render_job(job, processor, work_dir, words, generator="ps2", render_options=None):
+    success = pipeline.render(
+        words,
+        job["generator"] or generator,
+        job["output"],
+        processor.save_instrumental() if job["karaoke"] else job["audio"],
+        processor.temp_dir,
+        background=job["background"],
+        work_dir=work_dir,
+        silent_parts=processor.silent_parts,
+        **(render_options or {}),
+    )
+    if not success:
+        raise RuntimeError("Rendering failed.")
+    # failed jobs keep their work dir, so they can be resumed
+    work_dir.remove()
+
+
+def run_job(
+    job,
+    model_size,
+    device,
+    generator,
+    no_gemini,
+    keep_stems=False,
+    render_options=None,
+    aligner="gemini",
+    align_options=None,
+    resume=False,
+    **processor_kwargs,
+):
+    processor, work_dir, words = analyze_job(
+        job,
+        model_size,
+        device,
+        no_gemini=no_gemini,
+        keep_stems=keep_stems,
+        aligner=aligner,
+        align_options=align_options,
+        resume=resume,
+        **processor_kwargs,
+    )
+    render_job(job, processor, work_dir, words, generator, render_options)
+
+
+def write_report(report_path, report):
+    tmp_path = str(report_path) + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp_path, report_path)
+
+
+def run_batch(
+    jobs,
+    model_size,
+    device,
+    report_path,
+    generator="ps2",
+    no_gemini=False,
+    aligner="gemini",
+    keep_stems=False,
+    render_options=None,
+    align_options=None,
+    resume=False,
+    max_models=None,
+    max_model_memory=None,
+    **processor_kwargs,
+):
+    from .models import ModelRegistry, default_registry
+
+    finished = set()
+    if resume and os.path.exists(report_path):
+        # jobs that succeeded in the previous run are skipped
+        with open(report_path, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+        finished = {
+            job["output"] for job in previous.get("jobs", []) if job["status"] == "ok"
+        }
+
+    # models are loaded when a job first needs them and shared between jobs
+    if max_models is None and max_model_memory is None:
+        model_registry = default_registry()
+    else:
+        model_registry = ModelRegistry(max_models, max_model_memory)
+
+    report = {
+        "model_size": model_size,
+        "device": device,
+        "jobs": [],
+        # set up front, a resumed batch may have no job left to run
+        "models": model_registry.stats(),
+    }
+    for index, job in enumerate(jobs):
+        click.secho(
+            f"[{index + 1}/{len(jobs)}] {job['audio']} -> {job['output']}", fg="blue"
+        )
+        status = {
+            "audio": str(job["audio"]),
+            "lyrics": str(job["lyrics"]),
+            "output": job["output"],
+            "status": "ok",
+            "error": None,
+        }
+        if job["output"] in finished:
+            click.secho("Already done, skipping.", fg="blue")
+            status["duration"] = 0.0
+            report["jobs"].append(status)
+            write_report(report_path, report)
+            continue
+        start_time = time.time()
+        try:
+            with profiler.stage("job", output=job["output"]):
+                run_job(
+                    job,
+                    model_size,
+                    device,
+                    generator,
+                    no_gemini,
+                    keep_stems=keep_stems,
+                    render_options=render_options,
+                    aligner=aligner,
+                    align_options=align_options,
+                    resume=resume,
+                    model_registry=model_registry,
+                    **processor_kwargs,
+                )
+        except Exception as e:
+            status["status"] = "failed"
+            status["error"] = f"{type(e).__name__}: {e}"
+            status["traceback"] = traceback.format_exc()
+            click.secho(f"Job failed: {e}", fg="red")
+        status["duration"] = round(time.time() - start_time, 2)
+        report["jobs"].append(status)
+        report["models"] = model_registry.stats()
+        # rewrite after every job so an interrupted run still leaves a report
+        write_report(report_path, report)
+
+    failed = sum(1 for job in report["jobs"] if job["status"] != "ok")
+    click.secho(
+        f"Batch finished: {len(jobs) - failed} succeeded, {failed} failed.",
+        fg="green" if not failed else "yellow",
+    )
+    return report
@@ -0,0 +1,327 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import click
+import numpy as np
+import soundfile as sf
+
+DEFAULT_MAX_SIZE = 10 * 1024**3  # 10 GB
+DEFAULT_ALIGNMENT_MAX_SIZE = 100 * 1024**2  # 100 MB
+DEFAULT_ALIGNMENT_MAX_AGE = 30 * 24 * 3600  # 30 days
+
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+
+
+def parse_size(value):
+    # accepts plain byte counts or values like "500M", "10G", "1.5T"
+    if isinstance(value, (int, float)):
+        return int(value)
+    text = str(value).strip().upper().removesuffix("B")
+    unit = text[-1:] if text[-1:] in SIZE_UNITS else ""
+    number = text[: len(text) - len(unit)]
+    try:
+        return int(float(number) * SIZE_UNITS[unit])
+    except ValueError:
+        raise ValueError(f"Invalid size: {value}")
+
+
+def cache_root():
+    if os.environ.get("LYRIKS_CACHE_DIR"):
+        return Path(os.environ["LYRIKS_CACHE_DIR"])
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "lyriks"
+
+
+def file_hash(path, chunk_size=1024 * 1024):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def key_hash(*parts):
+    sha = hashlib.sha256()
+    for part in parts:
+        sha.update(str(part).encode("utf-8"))
+        sha.update(b"\0")
+    return sha.hexdigest()
+
+
+def _dir_size(path):
+    return sum(f.stat().st_size for f in Path(path).rglob("*") if f.is_file())
+
+
+class DiskCache:
+    """
+    Directory-per-entry cache with LRU eviction.
+
+    Every entry is a folder named after its key. The folder's mtime is bumped on
+    every hit and eviction removes the entries with the oldest mtime first until
+    the cache fits into max_size bytes.
+    """
+
+    name = "default"
+    default_max_size = DEFAULT_MAX_SIZE
+    max_size_env = "LYRIKS_CACHE_MAX_SIZE"
+
+    def __init__(self, directory=None, max_size=None):
+        self.directory = Path(directory) if directory else cache_root() / self.name
+        if max_size is None:
+            max_size = os.environ.get(self.max_size_env, self.default_max_size)
+        self.max_size = parse_size(max_size)
+
+    def entry_path(self, key):
+        return self.directory / key
+
+    def lookup(self, key):
+        path = self.entry_path(key)
+        if not path.is_dir():
+            return None
+        now = time.time()
+        os.utime(path, (now, now))
+        return path
+
+    def store(self, key, write):
+        """
+        Calls write(folder) on a temporary folder and moves it into place, so
+        readers never see half-written entries.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        final_path = self.entry_path(key)
+        # unique per call, so threads storing the same key don't share it
+        tmp_path = Path(tempfile.mkdtemp(dir=self.directory, prefix=f".{key}.tmp-"))
+        try:
+            write(tmp_path)
+            try:
+                os.rename(tmp_path, final_path)
+            except OSError:
+                # another writer got there first
+                if not final_path.is_dir():
+                    raise
+                shutil.rmtree(tmp_path)
+        except BaseException:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+        self.prune()
+        return final_path
+
+    def entries(self):
+        if not self.directory.is_dir():
+            return []
+        entries = []
+        for path in self.directory.iterdir():
+            if path.is_dir() and not path.name.startswith("."):
+                entries.append((path.stat().st_mtime, _dir_size(path), path))
+        return sorted(entries)
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def prune(self, max_size=None):
+        max_size = self.max_size if max_size is None else parse_size(max_size)
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed, freed = 0, 0
+        for _, size, path in entries:
+            if total <= max_size:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            removed += 1
+            freed += size
+        return removed, freed
+
+    def clear(self):
+        return self.prune(max_size=0)
+
+
+class StemCache(DiskCache):
+    """
+    Stores Demucs vocals/instrumental stems as .npy files, keyed by the audio
+    content hash, the separation model and the sample rate. Hits are returned
+    as read-only memory maps.
+    """
+
+    name = "stems"
+
+    def key(self, audio_file, model_name, samplerate):
+        return key_hash(file_hash(audio_file), model_name, samplerate)
+
+    def get(self, key):
+        path = self.lookup(key)
+        if path is None:
+            return None
+        try:
+            vocals = np.load(path / "vocals.npy", mmap_mode="r")
+            instrumental = np.load(path / "instrumental.npy", mmap_mode="r")
+        except (OSError, ValueError) as e:
+            click.secho(f"Ignoring broken stem cache entry {key}: {e}", fg="yellow")
+            shutil.rmtree(path, ignore_errors=True)
+            return None
+        return vocals, instrumental
+
+    def put(self, key, vocals, instrumental, **metadata):
+        def write(folder):
+            np.save(folder / "vocals.npy", np.ascontiguousarray(vocals, np.float32))
+            np.save(
+                folder / "instrumental.npy",
+                np.ascontiguousarray(instrumental, np.float32),
+            )
+            with open(folder / "meta.json", "w") as f:
+                json.dump(metadata, f)
+
+        return self.store(key, write)
+
+    def put_files(self, key, vocals_file, instrumental_file, **metadata):
+        # converts block by block so long stems never have to fit in memory
+        def convert(source, target, block_frames=1024 * 1024):
+            info = sf.info(str(source))
+            array = np.lib.format.open_memmap(
+                target, mode="w+", dtype=np.float32, shape=(info.frames, info.channels)
+            )
+            position = 0
+            for block in sf.blocks(
+                str(source), blocksize=block_frames, dtype="float32", always_2d=True
+            ):
+                array[position : position + len(block)] = block
+                position += len(block)
+            array.flush()
+            del array
+
+        def write(folder):
+            convert(vocals_file, folder / "vocals.npy")
+            convert(instrumental_file, folder / "instrumental.npy")
+            with open(folder / "meta.json", "w") as f:
+                json.dump(metadata, f)
+
+        return self.store(key, write)
+
+
+class AlignmentCache(DiskCache):
+    """
+    Stores parsed Gemini alignments as JSON, keyed by the model, the prompt
+    version and the prompt's transcript and lyrics. Entries older than max_age
+    seconds are treated as missing and removed on prune.
+    """
+
+    name = "alignments"
+    default_max_size = DEFAULT_ALIGNMENT_MAX_SIZE
+    # not LYRIKS_CACHE_MAX_SIZE, a limit sized for stems would swallow this one
+    max_size_env = "LYRIKS_ALIGNMENT_MAX_SIZE"
+
+    def __init__(self, directory=None, max_size=None, max_age=None):
+        super().__init__(directory, max_size)
+        if max_age is None:
+            max_age = os.environ.get(
+                "LYRIKS_ALIGNMENT_MAX_AGE", DEFAULT_ALIGNMENT_MAX_AGE
+            )
+        self.max_age = float(max_age)
+
+    def key(self, model_name, prompt_version, transcript, lyrics, window=""):
+        return key_hash(
+            model_name,
+            prompt_version,
+            json.dumps(transcript, sort_keys=True, ensure_ascii=False),
+            lyrics,
+            window,
+        )
+
+    def _expired(self, created):
+        return self.max_age > 0 and time.time() - created > self.max_age
+
+    def get(self, key):
+        path = self.lookup(key)
+        if path is None:
+            return None
+        try:
+            with open(path / "alignment.json", "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            created, segments = entry["created"], entry["segments"]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            click.secho(
+                f"Ignoring broken alignment cache entry {key}: {e}", fg="yellow"
+            )
+            shutil.rmtree(path, ignore_errors=True)
+            return None
+        if self._expired(created):
+            shutil.rmtree(path, ignore_errors=True)
+            return None
+        return segments
+
+    def put(self, key, segments, **metadata):
+        # replaces the entry, e.g. after a refresh
+        shutil.rmtree(self.entry_path(key), ignore_errors=True)
+
+        def write(folder):
+            with open(folder / "alignment.json", "w", encoding="utf-8") as f:
+                json.dump(
+                    {"created": time.time(), "segments": segments, **metadata},
+                    f,
+                    ensure_ascii=False,
+                )
+
+        return self.store(key, write)
+
+    def prune(self, max_size=None):
+        # expired entries go first, then the size cap applies as usual
+        removed, freed = 0, 0
+        for _, size, path in self.entries():
+            try:
+                with open(path / "alignment.json", "r", encoding="utf-8") as f:
+                    expired = self._expired(json.load(f)["created"])
+            except (OSError, ValueError, KeyError, TypeError):
+                expired = True
+            if expired:
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+                freed += size
+        more_removed, more_freed = super().prune(max_size)
+        return removed + more_removed, freed + more_freed
+
+
+class BackgroundCache(DiskCache):
+    """
+    Stores background videos pre-scaled and re-encoded to a render's size and
+    frame rate, keyed by the source's content hash and those settings. Renders
+    read the proxy instead of decoding the full-resolution source every time.
+    """
+
+    name = "backgrounds"
+    filename = "background.mp4"
+
+    def __init__(self, directory=None, max_size=None):
+        super().__init__(directory, max_size)
+        # hashing a long 4K source is slow, so it is hashed once per process
+        # for as long as its size and mtime stay the same
+        self._hashes = {}
+
+    def source_hash(self, video_file):
+        stat = os.stat(video_file)
+        source = (str(Path(video_file).resolve()), stat.st_size, stat.st_mtime_ns)
+        if source not in self._hashes:
+            self._hashes[source] = file_hash(video_file)
+        return self._hashes[source]
+
+    def key(self, video_file, size, fps, settings=""):
+        return key_hash(self.source_hash(video_file), size, fps, settings)
+
+    def get(self, key):
+        path = self.lookup(key)
+        if path is None or not (path / self.filename).is_file():
+            return None
+        return path / self.filename
+
+    def put(self, key, encode, **metadata):
+        # encode(target) writes the proxy video to target
+        def write(folder):
+            encode(folder / self.filename)
+            with open(folder / "meta.json", "w") as f:
+                json.dump(metadata, f)
+
+        return self.store(key, write) / self.filename
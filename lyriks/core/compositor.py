@@ -0,0 +1,175 @@
+"""
+NumPy frame compositor for the MoviePy generator.
+
+Every distinct line of text is rasterized once into a tightly cropped RGBA
+sprite (cached by text, font, size, color and wrap width), so repeated lines
+such as choruses cost nothing after their first appearance. Frames are built
+by blitting only the sprites that are on screen at that time onto the
+background, instead of blending a full-frame layer per line.
+"""
+
+import functools
+import math
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+
+@functools.lru_cache(maxsize=32)
+def load_font(font_path, font_size):
+    return ImageFont.truetype(font_path, font_size)
+
+
+def wrap_text(text, font, max_width=None):
+    # greedy word wrap, like MoviePy's "caption" method
+    if max_width is None:
+        return [text]
+    lines, line = [], ""
+    for word in text.split(" "):
+        candidate = f"{line} {word}" if line else word
+        if line and font.getlength(candidate) > max_width:
+            lines.append(line)
+            line = word
+        else:
+            line = candidate
+    lines.append(line)
+    return lines
+
+
+class Sprite:
+    """
+    A rasterized text block. premultiplied holds color * alpha and inverse
+    holds 255 - alpha (both uint16), so blitting is one multiply-add.
+    offset is the position of the cropped pixels inside the uncropped block of
+    block_size, which is what gets centered or placed.
+    """
+
+    def __init__(self, rgba, offset, block_size):
+        alpha = rgba[:, :, 3:4].astype(np.uint16)
+        self.premultiplied = rgba[:, :, :3].astype(np.uint16) * alpha
+        self.inverse = 255 - alpha
+        self.offset = offset
+        self.block_size = block_size
+
+    @property
+    def size(self):
+        return self.inverse.shape[1], self.inverse.shape[0]
+
+
+class SpriteCache:
+    def __init__(self):
+        self.sprites = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, text, font_path, font_size, color="white", max_width=None):
+        key = (text, font_path, font_size, color, max_width)
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            self.misses += 1
+            sprite = self.sprites[key] = rasterize(
+                text, font_path, font_size, color, max_width
+            )
+        else:
+            self.hits += 1
+        return sprite
+
+
+def rasterize(text, font_path, font_size, color="white", max_width=None):
+    font = load_font(font_path, font_size)
+    lines = wrap_text(text, font, max_width)
+    ascent, descent = font.getmetrics()
+    line_height = ascent + descent
+    width = max(1, math.ceil(max(font.getlength(line) for line in lines)))
+    height = line_height * len(lines)
+
+    image = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    for index, line in enumerate(lines):
+        x = (width - font.getlength(line)) / 2
+        draw.text((x, index * line_height), line, font=font, fill=color)
+
+    bbox = image.getchannel("A").getbbox() or (0, 0, 1, 1)
+    rgba = np.asarray(image.crop(bbox))
+    return Sprite(rgba, (bbox[0], bbox[1]), (width, height))
+
+
+class Compositor:
+    """
+    Builds frames of the given size from a background (a frame function, or a
+    solid color) and timed sprites. make_frame(t) is a MoviePy frame function.
+    """
+
+    def __init__(self, size, background=(0, 0, 0)):
+        self.width, self.height = size
+        if callable(background):
+            self.background = background
+            self.solid = None
+        else:
+            self.background = None
+            self.solid = np.empty((self.height, self.width, 3), np.uint8)
+            self.solid[:] = background
+        self.sprites = SpriteCache()
+        self.items = []
+        self.times = []
+        self._intervals = None
+
+    def add(self, sprite, start, end, position="center"):
+        # position: "center" or the (x, y) of the block's top left corner
+        if position == "center":
+            block_width, block_height = sprite.block_size
+            position = (
+                (self.width - block_width) // 2,
+                (self.height - block_height) // 2,
+            )
+        x = int(round(position[0])) + sprite.offset[0]
+        y = int(round(position[1])) + sprite.offset[1]
+        self.items.append((sprite, x, y))
+        self.times.append((start, end))
+        self._intervals = None
+
+    def add_text(
+        self,
+        text,
+        start,
+        end,
+        font_path,
+        font_size,
+        color="white",
+        position="center",
+        max_width=None,
+    ):
+        sprite = self.sprites.get(text, font_path, font_size, color, max_width)
+        self.add(sprite, start, end, position)
+        return sprite
+
+    def active(self, t):
+        # indices of the sprites on screen at t, in the order they were added
+        if self._intervals is None:
+            self._intervals = np.array(self.times, np.float64).reshape(-1, 2)
+        starts, ends = self._intervals[:, 0], self._intervals[:, 1]
+        return np.flatnonzero((starts <= t) & (ends > t))
+
+    def make_frame(self, t):
+        if self.background is not None:
+            frame = np.array(self.background(t), dtype=np.uint8)
+        else:
+            frame = self.solid.copy()
+        for index in self.active(t):
+            self.blit(frame, *self.items[index])
+        return frame
+
+    @staticmethod
+    def blit(frame, sprite, x, y):
+        width, height = sprite.size
+        # clip the sprite to the frame
+        left, top = max(x, 0), max(y, 0)
+        right = min(x + width, frame.shape[1])
+        bottom = min(y + height, frame.shape[0])
+        if left >= right or top >= bottom:
+            return
+        source = (slice(top - y, bottom - y), slice(left - x, right - x))
+        region = frame[top:bottom, left:right]
+        region[:] = (
+            sprite.premultiplied[source] + region * sprite.inverse[source] + 127
+        ) // 255
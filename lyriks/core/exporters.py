@@ -0,0 +1,188 @@
+"""
+Subtitle exporters: write the aligned lyrics as SRT, WebVTT, enhanced LRC or a
+standalone ASS file instead of rendering a video, for players that overlay the
+lyrics themselves.
+
+Every writer streams one segment at a time, and export() feeds several formats
+from a single pass over the segments.
+"""
+
+import click
+
+from .video_generator_ps2 import VideoGenerator, karaoke_text, segment_words
+
+
+def _clock(seconds, separator=".", hours=True):
+    # 3723.5 -> "01:02:03.500" (or "01:02:03,500" for SRT)
+    ms = max(0, round(seconds * 1000))
+    h, ms = divmod(ms, 3600_000)
+    m, ms = divmod(ms, 60_000)
+    s, ms = divmod(ms, 1000)
+    if hours:
+        return f"{h:02d}:{m:02d}:{s:02d}{separator}{ms:03d}"
+    return f"{h * 60 + m:02d}:{s:02d}{separator}{ms:03d}"
+
+
+def _lrc_clock(seconds):
+    # mm:ss.xx (centiseconds)
+    cs = max(0, round(seconds * 100))
+    m, cs = divmod(cs, 6000)
+    s, cs = divmod(cs, 100)
+    return f"{m:02d}:{s:02d}.{cs:02d}"
+
+
+def _ass_clock(seconds):
+    # h:mm:ss.cc
+    cs = max(0, round(seconds * 100))
+    h, cs = divmod(cs, 360_000)
+    m, cs = divmod(cs, 6000)
+    s, cs = divmod(cs, 100)
+    return f"{h}:{m:02d}:{s:02d}.{cs:02d}"
+
+
+def _line(words, segment):
+    if words:
+        return " ".join(w["word"].strip() for w in words)
+    return segment["text"].strip()
+
+
+class SubtitleWriter:
+    suffix = None
+
+    def __init__(self, file):
+        self.file = file
+        self.count = 0
+
+    def begin(self):
+        pass
+
+    def write(self, segment):
+        words = segment_words(segment)
+        self.count += 1
+        self.write_segment(segment, words)
+
+    def write_segment(self, segment, words):
+        raise NotImplementedError
+
+    def end(self):
+        pass
+
+
+class SrtWriter(SubtitleWriter):
+    suffix = ".srt"
+
+    def write_segment(self, segment, words):
+        self.file.write(
+            f"{self.count}\n"
+            f"{_clock(segment['start'], ',')} --> {_clock(segment['end'], ',')}\n"
+            f"{_line(words, segment)}\n\n"
+        )
+
+
+class VttWriter(SubtitleWriter):
+    """
+    WebVTT with word-level timing: every word after the first is preceded by a
+    timestamp tag, so players can highlight the words as they are sung.
+    """
+
+    suffix = ".vtt"
+
+    def begin(self):
+        self.file.write("WEBVTT\n\n")
+
+    def write_segment(self, segment, words):
+        if words:
+            parts = [words[0]["word"].strip()]
+            for w in words[1:]:
+                parts.append(f"<{_clock(w['start'])}>{w['word'].strip()}")
+            text = " ".join(parts)
+        else:
+            text = segment["text"].strip()
+        self.file.write(
+            f"{_clock(segment['start'])} --> {_clock(segment['end'])}\n{text}\n\n"
+        )
+
+
+class LrcWriter(SubtitleWriter):
+    # enhanced LRC: [line start] <word start> word <word start> word ... <end>
+    suffix = ".lrc"
+
+    def begin(self):
+        self.file.write("[re:Lyriks]\n")
+
+    def write_segment(self, segment, words):
+        line = f"[{_lrc_clock(segment['start'])}]"
+        if words:
+            line += "".join(
+                f"<{_lrc_clock(w['start'])}>{w['word'].strip()} " for w in words
+            ).rstrip()
+            line += f"<{_lrc_clock(words[-1]['end'])}>"
+        else:
+            line += segment["text"].strip()
+        self.file.write(line + "\n")
+
+
+class AssWriter(SubtitleWriter):
+    # the same karaoke subtitles the ps2 generator burns into the video
+    suffix = ".ass"
+
+    def begin(self):
+        self.file.write(VideoGenerator().subs.to_string("ass"))
+
+    def write_segment(self, segment, words):
+        if not words:
+            return
+        self.file.write(
+            f"Dialogue: 0,{_ass_clock(segment['start'])},{_ass_clock(segment['end'])},"
+            f"Default,,0,0,0,,{karaoke_text(words)}\n"
+        )
+
+
+WRITERS = {"srt": SrtWriter, "vtt": VttWriter, "lrc": LrcWriter, "ass": AssWriter}
+
+
+def export(words, output, formats=tuple(WRITERS)):
+    """
+    Writes the segments to <output>.<format> for every format in one pass.
+    Returns the written paths.
+    """
+    files, writers = [], []
+    try:
+        for name in formats:
+            writer = WRITERS[name]
+            files.append(open(output + writer.suffix, "w", encoding="utf-8"))
+            writers.append(writer(files[-1]))
+        for writer in writers:
+            writer.begin()
+        for segment in words:
+            for writer in writers:
+                writer.write(segment)
+        for writer in writers:
+            writer.end()
+    finally:
+        for file in files:
+            file.close()
+    return [file.name for file in files]
+
+
+def render(words, output, audio_file, temp_dir, formats=tuple(WRITERS), **options):
+    # generator backend for one or more subtitle formats; nothing is rendered
+    for path in export(words, output, formats):
+        click.secho(f"Subtitles saved to {path}", fg="green")
+    return True
+
+
+def render_srt(words, output, audio_file, temp_dir, **options):
+    return render(words, output, audio_file, temp_dir, formats=("srt",))
+
+
+def render_vtt(words, output, audio_file, temp_dir, **options):
+    return render(words, output, audio_file, temp_dir, formats=("vtt",))
+
+
+def render_lrc(words, output, audio_file, temp_dir, **options):
+    return render(words, output, audio_file, temp_dir, formats=("lrc",))
+
+
+def render_ass(words, output, audio_file, temp_dir, **options):
+    return render(words, output, audio_file, temp_dir, formats=("ass",))
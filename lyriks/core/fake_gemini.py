@@ -0,0 +1,196 @@
+"""
+Local stand-in for the Gemini generateContent endpoint, for offline testing.
+
+It answers every request by echoing the Whisper transcript from the prompt back
+in the aligned output format, restricted to the prompt's time window. It can be
+told to delay, fail or truncate responses to exercise retries and concurrency.
+
+Run it with `python -m lyriks.core.fake_gemini --port 8765` and point Lyriks at
+it with `GEMINI_BASE_URL=http://127.0.0.1:8765`.
+"""
+
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import click
+
+TRANSCRIPT_PATTERN = re.compile(
+    r"Whisper transcript \(with possible errors\):\n(.*?)\n\nCorrect lyrics:", re.S
+)
+WINDOW_PATTERN = re.compile(r"start between ([\d.]+)s and ([\d.]+)s")
+
+
+def align(prompt):
+    # echo the transcript back as aligned segments
+    match = TRANSCRIPT_PATTERN.search(prompt)
+    segments = json.loads(match.group(1)) if match else []
+    window = WINDOW_PATTERN.search(prompt)
+    result = []
+    for segment in segments:
+        if window and not (
+            float(window.group(1)) <= segment["start"] <= float(window.group(2))
+        ):
+            continue
+        words = [
+            w if isinstance(w, dict) else {"start": w[0], "end": w[1], "word": w[2]}
+            for w in segment["words"]
+        ]
+        result.append(
+            {
+                "text": segment["text"].strip(),
+                "words": words,
+                "start": segment["start"],
+                "end": segment["end"],
+            }
+        )
+    return result
+
+
+class FakeGemini:
+    """
+    delay: seconds to wait before answering each request
+    fail_first: number of requests to answer with fail_status
+    truncate_first: number of (non-failed) requests to answer with cut-off JSON
+    fail_always: answer every request with fail_status
+    """
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        delay=0.0,
+        fail_first=0,
+        fail_status=503,
+        truncate_first=0,
+        fail_always=False,
+    ):
+        self.delay = delay
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.truncate_first = truncate_first
+        self.fail_always = fail_always
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.prompts = []
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, body):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                with fake.lock:
+                    fake.requests += 1
+                    number = fake.requests
+                    fake.in_flight += 1
+                    fake.max_in_flight = max(fake.max_in_flight, fake.in_flight)
+                try:
+                    time.sleep(fake.delay)
+                    if not self.path.split("?")[0].endswith(":generateContent"):
+                        self._send(
+                            404, {"error": {"code": 404, "message": "Not found"}}
+                        )
+                        return
+                    if fake.fail_always or number <= fake.fail_first:
+                        self._send(
+                            fake.fail_status,
+                            {
+                                "error": {
+                                    "code": fake.fail_status,
+                                    "message": "Fake failure",
+                                    "status": "UNAVAILABLE",
+                                }
+                            },
+                        )
+                        return
+
+                    prompt = "".join(
+                        part.get("text", "")
+                        for content in request.get("contents", [])
+                        for part in content.get("parts", [])
+                    )
+                    with fake.lock:
+                        fake.prompts.append(prompt)
+                    text = json.dumps(align(prompt))
+                    finish_reason = "STOP"
+                    if number <= fake.fail_first + fake.truncate_first:
+                        text, finish_reason = text[: len(text) // 2], "MAX_TOKENS"
+                    self._send(
+                        200,
+                        {
+                            "candidates": [
+                                {
+                                    "content": {
+                                        "role": "model",
+                                        "parts": [{"text": text}],
+                                    },
+                                    "finishReason": finish_reason,
+                                }
+                            ]
+                        },
+                    )
+                finally:
+                    with fake.lock:
+                        fake.in_flight -= 1
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self.base_url
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exception, value, tb):
+        self.stop()
+
+
+@click.command()
+@click.option("--host", default="127.0.0.1")
+@click.option("--port", default=8765, type=int)
+@click.option("--delay", default=0.0, type=float, help="Seconds per request")
+@click.option("--fail-first", default=0, type=int, help="Fail the first N requests")
+def main(host, port, delay, fail_first):
+    fake = FakeGemini(host, port, delay=delay, fail_first=fail_first)
+    click.secho(f"Fake Gemini listening on {fake.base_url}", fg="green")
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fake.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,15 @@
+import collections
+import json
+import os
 import re
 import subprocess
+import threading
 
 from tqdm import tqdm
 
+# stderr lines kept for error reports; ffmpeg's progress comes from -progress
+STDERR_LINES = 200
+
 
 def parse_time(timestr):
     # format: HH:MM:SS.xx
@@ -10,34 +17,156 @@ def parse_time(timestr):
     return int(h) * 3600 + int(m) * 60 + float(s)
 
 
-def ffmpeg_progress(cmd, total_duration):
-    process = subprocess.Popen(
-        cmd, stderr=subprocess.PIPE, universal_newlines=True, text=True
-    )
+def _number(value, suffix=""):
+    # "1.5x" / "1234.5kbits/s" / "N/A" -> float or None
+    try:
+        return float(value.strip().removesuffix(suffix))
+    except (AttributeError, ValueError):
+        return None
+
+
+def parse_progress(fields, total_duration=None):
+    """
+    Turns one block of ffmpeg's -progress key=value output into an event:
+    frame, fps, speed, out_time (seconds), bitrate (kbit/s), total_size (bytes),
+    done and, with a known total duration, percent. Missing values are None.
+    """
+    out_time = None
+    if fields.get("out_time_us", "N/A") != "N/A":
+        out_time = int(fields["out_time_us"]) / 1e6
+    elif fields.get("out_time", "N/A") != "N/A":
+        out_time = parse_time(fields["out_time"])
+    if out_time is not None:
+        out_time = max(0.0, out_time)
+    frame = _number(fields.get("frame"))
+    total_size = _number(fields.get("total_size"))
+    event = {
+        "frame": int(frame) if frame is not None else None,
+        "fps": _number(fields.get("fps")),
+        "speed": _number(fields.get("speed"), "x"),
+        "out_time": out_time,
+        "bitrate": _number(fields.get("bitrate"), "kbits/s"),
+        "total_size": int(total_size) if total_size is not None else None,
+        "done": fields.get("progress") == "end",
+        "percent": None,
+    }
+    if total_duration and out_time is not None:
+        event["percent"] = min(100.0, out_time / total_duration * 100)
+    return event
+
+
+def progress_bar(total_duration):
+    """
+    A tqdm bar over the output duration, as an on_progress callback. Call
+    close() on it when the encode is over.
+    """
     pbar = tqdm(
         total=total_duration,
         unit="s",
         bar_format="{l_bar}{bar}| {n:.1f}/{total_fmt} [{elapsed}<{remaining}, {rate_fmt}{postfix}]",
     )
-    last_time = 0
-    stderr_output = []
-    for line in process.stderr:
-        stderr_output.append(line)
-        match_time = re.search(r"time=(\d+:\d+:\d+\.\d+)", line)
-        match_fps = re.search(r"fps=\s*([\d.]+)", line)
-        if match_time:
-            current_time = parse_time(match_time.group(1))
-            pbar.update(current_time - last_time)
-            last_time = current_time
-        if match_fps:
-            try:
-                fps = float(match_fps.group(1))
-                pbar.set_postfix_str(f"fps={fps:.2f}")
-            except ValueError:
-                pass
-    pbar.close()
-    process.wait()
+
+    def update(event):
+        if event["out_time"] is not None:
+            pbar.update(event["out_time"] - pbar.n)
+        if event["fps"] is not None:
+            pbar.set_postfix_str(f"fps={event['fps']:.2f}")
+
+    update.close = pbar.close
+    return update
+
+
+def ffmpeg_progress(
+    cmd, total_duration, on_progress=None, show_bar=True, stderr_lines=STDERR_LINES
+):
+    """
+    Runs an ffmpeg command and reports its progress. ffmpeg writes key=value
+    progress blocks to stdout (-progress pipe:1), every block is passed to
+    on_progress(event) as parsed by parse_progress; an exception raised by the
+    callback stops ffmpeg. Only the last stderr_lines lines of stderr are kept,
+    for the error raised when ffmpeg fails.
+    """
+    cmd = [cmd[0], "-progress", "pipe:1", "-nostats"] + list(cmd[1:])
+    process = subprocess.Popen(
+        cmd,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        errors="replace",
+    )
+    # drained on its own thread, so a chatty stderr can't block the progress pipe
+    stderr_tail = collections.deque(maxlen=stderr_lines)
+    stderr_thread = threading.Thread(
+        target=stderr_tail.extend, args=(process.stderr,), daemon=True
+    )
+    stderr_thread.start()
+
+    callbacks = [on_progress] if on_progress else []
+    bar = progress_bar(total_duration) if show_bar else None
+    if bar:
+        callbacks.append(bar)
+    try:
+        fields = {}
+        for line in process.stdout:
+            key, _, value = line.strip().partition("=")
+            if not key:
+                continue
+            fields[key] = value
+            if key == "progress":
+                event = parse_progress(fields, total_duration)
+                for callback in callbacks:
+                    callback(event)
+                fields = {}
+    except BaseException:
+        # e.g. a callback cancelling the render
+        process.kill()
+        raise
+    finally:
+        if bar:
+            bar.close()
+        process.wait()
+        stderr_thread.join()
     if process.returncode != 0:
         raise subprocess.CalledProcessError(
-            process.returncode, cmd, output=None, stderr="".join(stderr_output)
+            process.returncode, cmd, output=None, stderr="".join(stderr_tail)
+        )
+
+
+# probe results per (path, size, mtime) so repeated renders of the same files
+# don't spawn ffprobe again
+_probe_cache = {}
+
+
+def probe(path):
+    path = os.path.abspath(str(path))
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    if key not in _probe_cache:
+        cmd = [
+            "ffprobe",
+            "-v",
+            "error",
+            "-show_entries",
+            "format=duration:stream=index,codec_type,codec_name,width,height,r_frame_rate",
+            "-of",
+            "json",
+            path,
+        ]
+        result = subprocess.run(
+            cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True
         )
+        _probe_cache[key] = json.loads(result.stdout)
+    return _probe_cache[key]
+
+
+def probe_duration(path):
+    return float(probe(path)["format"]["duration"])
+
+
+def probe_stream(path, codec_type):
+    # first stream of the given type ("audio" or "video"), or None
+    for stream in probe(path).get("streams", []):
+        if stream.get("codec_type") == codec_type:
+            return stream
+    return None
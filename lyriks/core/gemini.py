@@ -1,21 +1,20 @@
 import json
 import os
+import random
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 import click
 from google import genai
-from google.genai import types
+from google.genai import errors, types
 
 from .spinner import Spinner
 
+MODEL = "gemini-2.5-flash"
+# bump when PROMPT, WINDOW or SYSTEM_PROMPT change, so cached alignments expire
+PROMPT_VERSION = 2
 
-def generate(whisper_transcript, lyrics):
-    client = genai.Client(
-        api_key=os.environ.get("GEMINI_API_KEY"),
-    )
-
-    model = "gemini-2.5-flash"
-    prompt = f"""
+PROMPT = """
 You are a forced aligner that must fix the Whisper transcript (word-level timestamps) to match the correct lyrics below.
 
 --- Context ---
@@ -25,12 +24,12 @@ Whisper transcript (with possible errors):
 Correct lyrics:
 {lyrics}
 ----------------
-
+{window}
 You MUST:
-1. Use *all* word-level timestamps from the transcript (the "start" and "end" times for each word).  
-2. Output the correct lyrics text in the "text" field, precisely as in the reference lyrics, even if Whisper got them wrong.  
-3. If Whisper is missing words, replicate or expand the transcript's closest timestamps so the "words" array matches the correct lyrics text.  
-4. If Whisper has extra words not in the correct lyrics, remove or merge them, but preserve the rest of the timestamps.  
+1. Use *all* word-level timestamps from the transcript (the "start" and "end" times for each word).
+2. Output the correct lyrics text in the "text" field, precisely as in the reference lyrics, even if Whisper got them wrong.
+3. If Whisper is missing words, replicate or expand the transcript's closest timestamps so the "words" array matches the correct lyrics text.
+4. If Whisper has extra words not in the correct lyrics, remove or merge them, but preserve the rest of the timestamps.
 5. Output valid JSON (no markdown) in the format:
 [
   {{
@@ -45,24 +44,30 @@ You MUST:
   ...
 ]
 
-This JSON must reflect the correct lyrics text, but each word must be assigned a start/end time from the Whisper transcript. 
-If you must guess or merge timings, do so gracefully. 
-NEVER output invalid JSON. 
+This JSON must reflect the correct lyrics text, but each word must be assigned a start/end time from the Whisper transcript.
+If you must guess or merge timings, do so gracefully.
+NEVER output invalid JSON.
 """
 
-    system_prompt = "You are a forced aligner. Always follow the instructions exactly and output valid JSON as described."
+WINDOW = """
+The transcript above is an excerpt of a longer song. Only output the segments that start between {start:.2f}s and {end:.2f}s; the transcript around that range is context only.
+"""
 
-    contents = [
-        types.Content(
-            role="user",
-            parts=[
-                types.Part.from_text(
-                    text=prompt,
-                ),
-            ],
-        ),
-    ]
-    generate_content_config = types.GenerateContentConfig(
+SYSTEM_PROMPT = "You are a forced aligner. Always follow the instructions exactly and output valid JSON as described."
+
+
+def make_client(base_url=None):
+    # GEMINI_BASE_URL points the client at another endpoint (e.g. fake_gemini)
+    base_url = base_url or os.environ.get("GEMINI_BASE_URL")
+    http_options = types.HttpOptions(base_url=base_url) if base_url else None
+    return genai.Client(
+        api_key=os.environ.get("GEMINI_API_KEY"),
+        http_options=http_options,
+    )
+
+
+def generate_content_config():
+    return types.GenerateContentConfig(
         response_mime_type="application/json",
         response_schema=genai.types.Schema(
             type=genai.types.Type.ARRAY,
@@ -94,56 +99,193 @@ NEVER output invalid JSON.
         ),
         max_output_tokens=65536,
         system_instruction=[
-            types.Part.from_text(text=system_prompt),
+            types.Part.from_text(text=SYSTEM_PROMPT),
         ],
     )
 
-    start_time = time.time()
-
-    # collect chunks
-
-    click.secho("Fixing up lyrics... (This may take up to 5 minutes)", fg="blue")
-    result_str = ""
-    try:
-        with Spinner():
-            result_chunks = []
-            for chunk in client.models.generate_content_stream(
-                model=model,
-                contents=contents,
-                config=generate_content_config,
-            ):
-                if hasattr(chunk, "text"):
-                    result_chunks.append(chunk.text)
-                elif hasattr(chunk, "data"):
-                    result_chunks.append(chunk.data)
-            result_str = "".join(
-                [str(chunk) for chunk in result_chunks if chunk is not None]
-            ).strip()
-    except Exception as e:
-        click.secho(f"Error during Gemini API call: {e}", fg="red")
-        return False
 
+def chunk_transcript(segments, chunk_segments=20, overlap_segments=2):
+    """
+    Splits the transcript into chunks of chunk_segments segments. Every chunk
+    also carries overlap_segments neighbouring segments on each side as context.
+    """
+    chunks = []
+    for first in range(0, len(segments), chunk_segments):
+        last = min(first + chunk_segments, len(segments))
+        context_first = max(0, first - overlap_segments)
+        context_last = min(len(segments), last + overlap_segments)
+        chunks.append(
+            {
+                "core": segments[first:last],
+                "context": segments[context_first:context_last],
+                "start": segments[first]["start"],
+                "end": segments[last - 1]["end"],
+            }
+        )
+    return chunks
+
+
+def chunk_window(chunk, windowed):
+    return WINDOW.format(start=chunk["start"], end=chunk["end"]) if windowed else ""
+
+
+def build_prompt(chunk, lyrics, windowed):
+    window = chunk_window(chunk, windowed)
+    transcript = json.dumps(chunk["context"], ensure_ascii=False)
+    return PROMPT.format(whisper_transcript=transcript, lyrics=lyrics, window=window)
+
+
+def parse_response(result_str):
+    result_str = (result_str or "").strip()
     if not result_str.endswith("]"):
-        click.secho(
-            "Gemini returned invalid JSON. This might indicate the song is too long.",
-            fg="red",
+        raise ValueError(
+            f"Gemini returned truncated JSON ({len(result_str)} characters)."
+        )
+    result_json = json.loads(result_str)
+    if not isinstance(result_json, list):
+        raise ValueError("Gemini did not return a JSON list.")
+    for segment in result_json:
+        if not isinstance(segment, dict) or not all(
+            key in segment for key in ("text", "words", "start", "end")
+        ):
+            raise ValueError(f"Gemini returned a malformed segment: {segment}")
+    return result_json
+
+
+def _retryable(error):
+    # client errors (bad key, bad request) won't go away by retrying
+    if isinstance(error, errors.ClientError):
+        return error.code == 429
+    return True
+
+
+def align_chunk(client, prompt, config, retries=3, backoff=2.0):
+    contents = [
+        types.Content(role="user", parts=[types.Part.from_text(text=prompt)]),
+    ]
+    for attempt in range(retries + 1):
+        try:
+            response = client.models.generate_content(
+                model=MODEL, contents=contents, config=config
+            )
+            return parse_response(response.text)
+        except Exception as e:
+            if attempt == retries or not _retryable(e):
+                raise
+            delay = backoff * 2**attempt + random.uniform(0, backoff)
+            click.secho(
+                f"Gemini request failed ({e}), retrying in {delay:.1f}s...",
+                fg="yellow",
+            )
+            time.sleep(delay)
+
+
+def whisper_fallback(segments):
+    # Whisper segments with their (start, end, word) tuples turned into the
+    # word dicts Gemini returns, so merged results share one schema
+    return [
+        dict(
+            segment,
+            words=[
+                w if isinstance(w, dict) else {"start": w[0], "end": w[1], "word": w[2]}
+                for w in segment["words"]
+            ],
         )
-        click.secho(f"Response length: {len(result_str)} characters", fg="yellow")
+        for segment in segments
+    ]
+
+
+def merge_chunks(chunks, results):
+    # keeps each chunk's segments that start inside its own core range, so the
+    # overlapping context never shows up twice
+    merged = []
+    for index, (chunk, result) in enumerate(zip(chunks, results)):
+        lower = chunk["start"] if index > 0 else float("-inf")
+        upper = chunks[index + 1]["start"] if index + 1 < len(chunks) else float("inf")
+        for segment in result:
+            if lower <= segment["start"] < upper:
+                merged.append(segment)
+    return merged
+
+
+def generate(
+    whisper_transcript,
+    lyrics,
+    chunk_segments=20,
+    overlap_segments=2,
+    max_in_flight=4,
+    retries=3,
+    backoff=2.0,
+    base_url=None,
+    cache=None,
+    refresh=False,
+):
+    """
+    cache: an AlignmentCache; chunks found in it skip the request, successful
+    responses are stored. refresh: ignore cached entries but store new ones.
+    """
+    if not whisper_transcript:
+        click.secho("Nothing to align, the transcript is empty.", fg="yellow")
         return False
 
-    # parse json
-    try:
-        result_json = json.loads(result_str)
-        # print(json.dumps(result_json, indent=2, ensure_ascii=False))
+    chunks = chunk_transcript(whisper_transcript, chunk_segments, overlap_segments)
+    windowed = len(chunks) > 1
+    prompts = [build_prompt(chunk, lyrics, windowed) for chunk in chunks]
+    results = [None] * len(chunks)
+    keys = [None] * len(chunks)
+    if cache is not None:
+        for index, chunk in enumerate(chunks):
+            window = chunk_window(chunk, windowed)
+            keys[index] = cache.key(
+                MODEL, PROMPT_VERSION, chunk["context"], lyrics, window
+            )
+            if not refresh:
+                results[index] = cache.get(keys[index])
+    pending = [index for index, result in enumerate(results) if result is None]
+    if len(pending) < len(chunks):
+        click.secho(
+            f"Using {len(chunks) - len(pending)} cached alignment chunk(s).",
+            fg="blue",
+        )
+
+    failed = 0
+    if pending:
+        client = make_client(base_url)
+        config = generate_content_config()
+
+        start_time = time.time()
+        click.secho(
+            f"Fixing up lyrics in {len(pending)} chunk(s)... (This may take a while)",
+            fg="blue",
+        )
+
+        def run(prompt):
+            return align_chunk(client, prompt, config, retries=retries, backoff=backoff)
+
+        with Spinner(), ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+            futures = {index: pool.submit(run, prompts[index]) for index in pending}
+            for index, future in futures.items():
+                try:
+                    results[index] = future.result()
+                except Exception as e:
+                    # keep the unaligned Whisper segments for this part of the song
+                    click.secho(
+                        f"Gemini failed for chunk {index + 1}/{len(chunks)}: {e}",
+                        fg="red",
+                    )
+                    results[index] = whisper_fallback(chunks[index]["core"])
+                    failed += 1
+                    continue
+                # only validated responses end up here, fallbacks are never cached
+                if cache is not None:
+                    cache.put(keys[index], results[index], model=MODEL)
+
         click.secho(f"Gemini took: {round(time.time() - start_time, 2)}s", fg="blue")
-        return result_json
-    except json.JSONDecodeError as e:
-        click.secho(f"Failed to parse JSON from Gemini: {e}", fg="red")
-        click.secho("Raw output:", fg="yellow")
-        click.secho(result_str, fg="yellow")
-        return False
-    except Exception as e:
-        click.secho(f"An unexpected error occurred during JSON parsing: {e}", fg="red")
-        click.secho("Raw output:", fg="yellow")
-        click.secho(result_str, fg="yellow")
+
+    if failed == len(chunks):
         return False
+    if failed:
+        click.secho(
+            f"{failed} chunk(s) use the original Whisper transcript.", fg="yellow"
+        )
+    return merge_chunks(chunks, results)
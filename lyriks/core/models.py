@@ -0,0 +1,211 @@
+"""
+Process-wide registry for the Whisper and Demucs models.
+
+Models are loaded on first use and keyed by (kind, name, device, dtype), so
+jobs with different model sizes can share one process. The registry keeps at
+most max_models models or max_memory bytes resident and evicts the least
+recently used model to make room. Evicted models stay alive for as long as a
+caller still holds them, the registry only drops its own reference.
+
+Callers that need several independent copies of one model at once (e.g.
+threads transcribing in parallel) ask for copy=1, 2, ..., which count towards
+the limits like any other model.
+"""
+
+import gc
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import click
+
+from . import profiler
+
+
+def _load_whisper(name, device, dtype):
+    import whisper_timestamped as whisper
+
+    model = whisper.load_model(name, device=device)
+    if dtype:
+        import torch
+
+        model = model.to(getattr(torch, dtype))
+    return model
+
+
+def _load_demucs(name, device, dtype):
+    from demucs.pretrained import get_model
+
+    model = get_model(name).to(device)
+    if dtype:
+        import torch
+
+        model = model.to(getattr(torch, dtype))
+    model.eval()
+    return model
+
+
+LOADERS = {"whisper": _load_whisper, "demucs": _load_demucs}
+
+
+def model_memory(model):
+    # bytes held by a model's weights and buffers (arrays report their nbytes)
+    if hasattr(model, "parameters"):
+        tensors = list(model.parameters())
+        if hasattr(model, "buffers"):
+            tensors += list(model.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+    return int(getattr(model, "nbytes", 0))
+
+
+def _release_device_memory(device):
+    gc.collect()
+    torch = sys.modules.get("torch")
+    if torch is not None and str(device).startswith("cuda"):
+        torch.cuda.empty_cache()
+
+
+class _Entry:
+    def __init__(self):
+        self.model = None
+        self.memory = 0
+        self.loads = 0
+        self.hits = 0
+        self.evictions = 0
+        self.load_seconds = 0.0
+        self.last_used = None
+        # held while loading, so two threads never load the same model twice
+        self.lock = threading.Lock()
+
+
+class ModelRegistry:
+    def __init__(self, max_models=None, max_memory=None, loaders=None):
+        self.max_models = max_models
+        self.max_memory = max_memory
+        self.loaders = dict(LOADERS if loaders is None else loaders)
+        self._entries = {}
+        # resident models, least recently used first
+        self._resident = OrderedDict()
+        # reentrant, evict() is also called while making room
+        self._lock = threading.RLock()
+
+    def get(self, kind, name, device="cpu", dtype=None, copy=0):
+        if kind not in self.loaders:
+            raise KeyError(f"Unknown model kind '{kind}'")
+        key = (kind, name, str(device), dtype, copy)
+        with self._lock:
+            entry = self._entries.setdefault(key, _Entry())
+        with entry.lock:
+            with self._lock:
+                if entry.model is not None:
+                    entry.hits += 1
+                    entry.last_used = time.time()
+                    self._resident.move_to_end(key)
+                    return entry.model
+                # the size of an earlier load is the best guess for this one
+                self._make_room(entry.memory)
+
+            label = f"'{name}' (copy {copy})" if copy else f"'{name}'"
+            click.secho(f"Loading {kind} model {label} on {device}...", fg="blue")
+            start = time.perf_counter()
+            try:
+                with profiler.stage("model load", kind=kind, model=name):
+                    model = self.loaders[kind](name, device, dtype)
+            except Exception as e:
+                click.secho(f"Error loading AI models: {e}", fg="red")
+                raise
+
+            with self._lock:
+                entry.model = model
+                entry.memory = model_memory(model)
+                entry.loads += 1
+                entry.load_seconds += time.perf_counter() - start
+                entry.last_used = time.time()
+                self._resident[key] = entry
+                self._make_room(0, keep=key)
+            return model
+
+    def _resident_memory(self):
+        return sum(entry.memory for entry in self._resident.values())
+
+    def _over_limit(self, incoming_count, incoming_memory):
+        count = len(self._resident) + incoming_count
+        memory = self._resident_memory() + incoming_memory
+        return (self.max_models is not None and count > self.max_models) or (
+            self.max_memory is not None and memory > self.max_memory
+        )
+
+    def _make_room(self, incoming_memory, keep=None):
+        # evicts least recently used models; a model that is too big on its own
+        # is still loaded, it just ends up alone
+        incoming = 0 if keep else 1
+        while self._over_limit(incoming, incoming_memory):
+            victim = next((k for k in self._resident if k != keep), None)
+            if victim is None:
+                break
+            self.evict(victim)
+
+    def evict(self, key):
+        with self._lock:
+            entry = self._resident.pop(key, None)
+            if entry is None:
+                return False
+            entry.model = None
+            entry.evictions += 1
+        click.secho(f"Evicted {key[0]} model '{key[1]}' ({key[2]})", fg="blue")
+        _release_device_memory(key[2])
+        return True
+
+    def clear(self):
+        for key in list(self._resident):
+            self.evict(key)
+
+    def stats(self):
+        with self._lock:
+            models = [
+                {
+                    "kind": key[0],
+                    "name": key[1],
+                    "device": key[2],
+                    "dtype": key[3],
+                    "copy": key[4],
+                    "resident": entry.model is not None,
+                    "memory": entry.memory,
+                    "loads": entry.loads,
+                    "hits": entry.hits,
+                    "evictions": entry.evictions,
+                    "load_seconds": round(entry.load_seconds, 3),
+                }
+                for key, entry in self._entries.items()
+            ]
+            return {
+                "resident_models": len(self._resident),
+                "resident_memory": self._resident_memory(),
+                "max_models": self.max_models,
+                "max_memory": self.max_memory,
+                "models": models,
+            }
+
+
+_default = None
+
+
+def default_registry():
+    """
+    The registry shared by everything in this process. Limits come from
+    LYRIKS_MAX_MODELS and LYRIKS_MAX_MODEL_MEMORY (e.g. "6G"), unlimited if
+    unset.
+    """
+    global _default
+    if _default is None:
+        from .cache import parse_size
+
+        max_models = os.environ.get("LYRIKS_MAX_MODELS")
+        max_memory = os.environ.get("LYRIKS_MAX_MODEL_MEMORY")
+        _default = ModelRegistry(
+            max_models=int(max_models) if max_models else None,
+            max_memory=parse_size(max_memory) if max_memory else None,
+        )
+    return _default
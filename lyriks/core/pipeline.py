@@ -0,0 +1,327 @@
+import io
+import json
+import os
+import sys
+import threading
+import time
+
+import click
+
+from . import profiler, registry
+
+BOUNDARY_ERROR = "Got start time outside of audio boundary"
+
+
+class _ThreadStream:
+    """
+    Stands in for sys.stdout/sys.stderr. Threads running a captured stage
+    write to their own buffer, every other thread to the real stream, so
+    stages in concurrent server jobs never see (or swallow) each other's
+    output.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.buffers = {}
+
+    def write(self, text):
+        buffer = self.buffers.get(threading.get_ident())
+        return (self.stream if buffer is None else buffer).write(text)
+
+    def flush(self):
+        buffer = self.buffers.get(threading.get_ident())
+        (self.stream if buffer is None else buffer).flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+_install_lock = threading.Lock()
+
+
+def _thread_stream(name):
+    # installs the proxy once (again if something replaced the stream since)
+    with _install_lock:
+        stream = getattr(sys, name)
+        if not isinstance(stream, _ThreadStream):
+            stream = _ThreadStream(stream)
+            setattr(sys, name, stream)
+        return stream
+
+
+def _capture(func):
+    # runs func with this thread's stdout/stderr captured, echoes them and
+    # returns both
+    streams = [_thread_stream("stdout"), _thread_stream("stderr")]
+    buffers = [io.StringIO(), io.StringIO()]
+    thread = threading.get_ident()
+    for stream, buffer in zip(streams, buffers):
+        stream.buffers[thread] = buffer
+    try:
+        result = func()
+    finally:
+        for stream in streams:
+            stream.buffers.pop(thread, None)
+        for buffer in buffers:
+            if buffer.getvalue().strip():
+                click.secho(buffer.getvalue().strip(), fg="white")
+    return result, buffers[0].getvalue() + buffers[1].getvalue()
+
+
+def run_stage(name, func, retries=3, retry_if=None):
+    """
+    Runs one pipeline stage, retrying only this stage when it raises or when
+    retry_if(captured output) is true. The last attempt's result is kept even
+    if retry_if still matches.
+    """
+    for attempt in range(1, retries + 1):
+        try:
+            result, output = _capture(func)
+        except Exception as e:
+            if attempt == retries:
+                raise
+            click.secho(
+                f"Warning: {name} failed ({e}), retrying ({attempt}/{retries}).",
+                fg="yellow",
+            )
+            continue
+        if retry_if is not None and retry_if(output) and attempt < retries:
+            click.secho(
+                f"Warning: Retrying {name} ({attempt}/{retries}).",
+                fg="yellow",
+            )
+            continue
+        return result
+
+
+def _file_fingerprint(path):
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+
+def process_audio(processor, retries=3, work_dir=None, keep_stems=False):
+    """
+    Separates the vocals, detects the non-silent regions and transcribes them.
+    With a WorkDir, every completed stage is recorded and restored on resume.
+    In-memory stems are only written to the work dir when they are kept or
+    the run is resumed, otherwise separation is simply redone on resume.
+    """
+    click.secho("Processing audio...", fg="blue")
+
+    # stems
+    stems = None
+    if work_dir is not None:
+        stems = work_dir.restore(
+            "stems",
+            *_file_fingerprint(processor.audio_file),
+            processor.separation_model,
+        )
+        if stems and not all(work_dir.file(name).exists() for name in stems.values()):
+            stems = None
+    if stems:
+        click.secho("Resuming with stems from the work dir.", fg="blue")
+        processor.restore_stems(
+            work_dir.file(stems["vocals"]), work_dir.file(stems["instrumental"])
+        )
+    else:
+        run_stage("vocal separation", processor.isolate_vocals, retries)
+        if work_dir is None:
+            pass
+        elif processor.vocals_file is not None:
+            stems = {
+                "vocals": os.path.basename(processor.vocals_file),
+                "instrumental": os.path.basename(processor.instrumental_file),
+            }
+            work_dir.complete("stems", stems)
+        elif keep_stems or work_dir.resume:
+            # in-memory stems need a copy for resuming
+            processor.save_stems(work_dir.file("stems"))
+            stems = {
+                "vocals": "stems_vocals.wav",
+                "instrumental": "stems_instrumental.wav",
+            }
+            work_dir.complete("stems", stems)
+
+    # voice activity regions and transcript
+    regions = work_dir.restore("vad") if work_dir is not None else None
+    transcript = None
+    if work_dir is not None:
+        transcript = work_dir.restore(
+            "transcript",
+            processor.model_size,
+            processor.lyrics,
+            processor.per_region,
+            processor.region_length,
+        )
+
+    if regions:
+        # the silence-removed audio is only rebuilt if it is transcribed again
+        processor.restore_regions(
+            regions["non_silent_parts"],
+            regions["total_duration"],
+            build_audio=transcript is None,
+        )
+    else:
+        run_stage("silence detection", processor.remove_silence, retries)
+        if work_dir is not None:
+            work_dir.complete(
+                "vad",
+                {
+                    "non_silent_parts": processor.non_silent_parts,
+                    "total_duration": processor.total_duration,
+                },
+            )
+
+    if transcript:
+        click.secho("Resuming with the transcript from the work dir.", fg="blue")
+        processor.restore_transcript(
+            transcript["words"], transcript["used_silence_removed"]
+        )
+    else:
+        # only transcription is retried for the boundary error
+        run_stage(
+            "transcription",
+            processor.transcribe,
+            retries,
+            retry_if=lambda output: BOUNDARY_ERROR in output,
+        )
+        if work_dir is not None:
+            work_dir.complete(
+                "transcript",
+                {
+                    "words": processor.words,
+                    "used_silence_removed": processor.used_silence_removed,
+                },
+            )
+
+    return processor.vocals_file, processor.instrumental_file, processor.no_silence_file
+
+
+def align(
+    processor,
+    no_gemini=False,
+    aligner="gemini",
+    cache=None,
+    refresh=False,
+    work_dir=None,
+):
+    if work_dir is not None:
+        words = work_dir.restore("mapped")
+        if words is None:
+            words = processor.map_words_to_original()
+            work_dir.complete("mapped", words)
+        aligned = work_dir.restore("aligned", no_gemini, aligner)
+        if aligned is not None and not refresh:
+            click.secho("Resuming with the alignment from the work dir.", fg="blue")
+            return aligned
+        aligned, succeeded = _align(
+            processor, words, no_gemini, aligner, cache, refresh
+        )
+        # a failed alignment is not recorded, so resuming tries again
+        if succeeded:
+            work_dir.complete("aligned", aligned)
+        return aligned
+    words = processor.map_words_to_original()
+    return _align(processor, words, no_gemini, aligner, cache, refresh)[0]
+
+
+def _align(processor, words, no_gemini, aligner, cache, refresh):
+    # returns the words and whether the requested alignment succeeded
+    if no_gemini:
+        return words, True
+    try:
+        backend = registry.ALIGNERS.get(aligner)
+    except KeyError as e:
+        click.secho(f"{e}, using original lyrics.", fg="yellow")
+        return words, False
+
+    start_time = time.time()
+    with profiler.stage("alignment", aligner=aligner):
+        aligned = backend(words, processor.lyrics, cache=cache, refresh=refresh)
+    if aligned:
+        click.secho(
+            f"Alignment ({aligner}) succeeded in {round(time.time() - start_time, 2)}s.",
+            fg="green",
+        )
+        return aligned, True
+    click.secho(
+        f"Alignment ({aligner}) failed, using original lyrics. See above for details.",
+        fg="yellow",
+    )
+    return words, False
+
+
+def render(
+    words,
+    generator,
+    output,
+    audio_file,
+    temp_dir,
+    background=None,
+    work_dir=None,
+    **render_options,
+):
+    # generate output with the selected backends (imported only now);
+    # generator may list several, e.g. "ps2,srt,vtt"
+    try:
+        backends = [
+            (name, registry.GENERATORS.get(name))
+            for name in split_generators(generator)
+        ]
+    except KeyError as e:
+        click.secho(f"Unknown video generator selected: {e}", fg="red")
+        return False
+
+    formats = [name for name, _ in backends if name in registry.SUBTITLE_FORMATS]
+    success = True
+    if len(formats) > 1:
+        # all subtitle files from one pass over the words
+        from . import exporters
+
+        success = exporters.render(words, output, audio_file, temp_dir, formats)
+        backends = [(name, b) for name, b in backends if name not in formats]
+    for name, backend in backends:
+        success = (
+            backend(
+                words,
+                output,
+                audio_file,
+                temp_dir,
+                background=background,
+                work_dir=work_dir,
+                **render_options,
+            )
+            and success
+        )
+    return success
+
+
+def split_generators(generator):
+    # "ps2, srt" -> ["ps2", "srt"]
+    names = [name.strip() for name in str(generator).split(",")]
+    return list(dict.fromkeys(name for name in names if name))
+
+
+def output_files(generator, output, targets=None):
+    """
+    The files the built-in generators write for output: videos (one per
+    target for ps2), subtitle files and the transcript.
+    """
+    paths = []
+    for name in split_generators(generator):
+        if name == "ps2" and targets:
+            paths += [f"{output}_{target['name']}.mp4" for target in targets]
+        elif name in ("ps2", "mp"):
+            paths.append(f"{output}.mp4")
+        elif name == "ts":
+            paths.append(f"{output}.json")
+        elif name in registry.SUBTITLE_FORMATS:
+            paths.append(f"{output}.{name}")
+    return list(dict.fromkeys(paths))
+
+
+def save_transcript(words, output, audio_file, temp_dir, **options):
+    click.secho("Only saving transcript.", fg="green")
+    with open(output + ".json", "w") as file:
+        json.dump(words, file, indent=2)
+    return True
@@ -0,0 +1,267 @@
+"""
+Per-stage timing and resource trace for `--profile`.
+
+Code marks its stages with `with profiler.stage("separation"):` (or the
+@profiler.profiled decorator). Nothing is recorded unless a Profiler has been
+enabled, so the marks cost next to nothing in normal runs. Every stage records
+wall time, CPU time (including finished child processes such as ffmpeg), peak
+RSS and bytes read/written. The trace is written in the Chrome trace event
+format, which chrome://tracing and ui.perfetto.dev open directly.
+
+On Linux the peak RSS is the stage's own: the kernel's high-water mark is
+reset when a stage starts, after the stages still open have taken the peak
+reached so far. Elsewhere it is the process peak so far, and child processes
+only ever report the largest child so far.
+"""
+
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import click
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_active = None
+
+
+def _usage():
+    # cpu seconds and peak rss in bytes, for this process and its children
+    if resource is None:
+        return time.process_time(), 0, 0
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = sum(
+        (self_usage.ru_utime, self_usage.ru_stime, children.ru_utime, children.ru_stime)
+    )
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return cpu, self_usage.ru_maxrss * scale, children.ru_maxrss * scale
+
+
+def _high_water_mark():
+    # resident peak since the last reset, in bytes (Linux only)
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _reset_high_water_mark():
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss():
+    # peak resident memory of this process so far, in bytes
+    return _usage()[1]
+
+
+def _io():
+    # storage bytes read and written by this process and its waited-for children
+    try:
+        with open("/proc/self/io", "r") as f:
+            fields = dict(line.split(": ") for line in f.read().splitlines())
+        return int(fields["read_bytes"]), int(fields["write_bytes"])
+    except (OSError, KeyError, ValueError):
+        pass
+    if resource is None:
+        return 0, 0
+    # block counts as a fallback (512-byte blocks)
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return (
+        (self_usage.ru_inblock + children.ru_inblock) * 512,
+        (self_usage.ru_oublock + children.ru_oublock) * 512,
+    )
+
+
+class Profiler:
+    def __init__(self):
+        self.events = []
+        self.origin = time.perf_counter()
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        # peaks of the stages that are still running
+        self._open = []
+
+    def _update_open_peaks(self):
+        peak = _high_water_mark()
+        if peak is not None:
+            for holder in self._open:
+                holder["peak"] = max(holder["peak"], peak)
+
+    @contextmanager
+    def stage(self, name, **args):
+        holder = {"peak": 0}
+        with self.lock:
+            # hand the peak so far to the enclosing stages before resetting it
+            self._update_open_peaks()
+            self._open.append(holder)
+            per_stage = _reset_high_water_mark()
+        start = time.perf_counter()
+        cpu, _, _ = _usage()
+        read, written = _io()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            end_cpu, peak_rss, children_peak_rss = _usage()
+            end_read, end_written = _io()
+            with self.lock:
+                self._update_open_peaks()
+                self._open.remove(holder)
+            if per_stage and holder["peak"]:
+                peak_rss = holder["peak"]
+            event = {
+                "name": name,
+                "start": start - self.origin,
+                "wall": end - start,
+                "cpu": end_cpu - cpu,
+                "peak_rss": peak_rss,
+                "children_peak_rss": children_peak_rss,
+                "read_bytes": end_read - read,
+                "write_bytes": end_written - written,
+                "thread": threading.get_ident(),
+                "args": args,
+            }
+            with self.lock:
+                self.events.append(event)
+
+    def trace(self):
+        # Chrome trace events: one complete ("X") event per stage, plus a
+        # counter track for the peak RSS
+        trace = []
+        for event in sorted(self.events, key=lambda e: e["start"]):
+            timestamp = round(event["start"] * 1e6, 1)
+            trace.append(
+                {
+                    "name": event["name"],
+                    "cat": "stage",
+                    "ph": "X",
+                    "ts": timestamp,
+                    "dur": round(event["wall"] * 1e6, 1),
+                    "pid": self.pid,
+                    "tid": event["thread"],
+                    "args": {
+                        "cpu_ms": round(event["cpu"] * 1000, 1),
+                        "peak_rss_mb": round(event["peak_rss"] / 1024**2, 1),
+                        "children_peak_rss_mb": round(
+                            event["children_peak_rss"] / 1024**2, 1
+                        ),
+                        "read_bytes": event["read_bytes"],
+                        "write_bytes": event["write_bytes"],
+                        **{key: str(value) for key, value in event["args"].items()},
+                    },
+                }
+            )
+            trace.append(
+                {
+                    "name": "peak RSS (MB)",
+                    "ph": "C",
+                    "ts": round((event["start"] + event["wall"]) * 1e6, 1),
+                    "pid": self.pid,
+                    "args": {"rss": round(event["peak_rss"] / 1024**2, 1)},
+                }
+            )
+        return {"traceEvents": trace, "displayTimeUnit": "ms"}
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.trace(), f)
+        return path
+
+    def summary(self):
+        # totals per stage name, in the order the stages first ran
+        stages = {}
+        for event in sorted(self.events, key=lambda e: e["start"]):
+            row = stages.setdefault(
+                event["name"],
+                {
+                    "name": event["name"],
+                    "calls": 0,
+                    "wall": 0.0,
+                    "cpu": 0.0,
+                    "peak_rss": 0,
+                    "read_bytes": 0,
+                    "write_bytes": 0,
+                },
+            )
+            row["calls"] += 1
+            row["wall"] += event["wall"]
+            row["cpu"] += event["cpu"]
+            row["peak_rss"] = max(row["peak_rss"], event["peak_rss"])
+            row["read_bytes"] += event["read_bytes"]
+            row["write_bytes"] += event["write_bytes"]
+        return list(stages.values())
+
+    def summary_table(self):
+        rows = self.summary()
+        width = max([len("stage")] + [len(row["name"]) for row in rows])
+        lines = [
+            f"{'stage':<{width}}  {'calls':>5}  {'wall s':>8}  {'cpu s':>8}  "
+            f"{'peak RSS MB':>11}  {'read MB':>8}  {'written MB':>10}"
+        ]
+        for row in rows:
+            lines.append(
+                f"{row['name']:<{width}}  {row['calls']:>5}  {row['wall']:>8.2f}  "
+                f"{row['cpu']:>8.2f}  {row['peak_rss'] / 1024**2:>11.0f}  "
+                f"{row['read_bytes'] / 1024**2:>8.1f}  "
+                f"{row['write_bytes'] / 1024**2:>10.1f}"
+            )
+        return "\n".join(lines)
+
+    def report(self, path):
+        self.save(path)
+        click.secho(self.summary_table(), fg="white")
+        click.secho(f"Profile saved to {path}", fg="blue")
+
+
+def enable():
+    global _active
+    _active = Profiler()
+    return _active
+
+
+def disable():
+    global _active
+    profiler, _active = _active, None
+    return profiler
+
+
+@contextmanager
+def stage(name, **args):
+    # records into the enabled profiler, if there is one
+    profiler = _active
+    if profiler is None:
+        yield
+        return
+    with profiler.stage(name, **args):
+        yield
+
+
+def profiled(name):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
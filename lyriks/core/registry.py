@@ -0,0 +1,78 @@
+"""
+Name -> backend registries for video generators and lyrics aligners.
+
+Backends are registered as "module:function" strings and only imported when
+they are picked, so choosing e.g. the ps2 generator with the local aligner never
+imports moviepy or google-genai. Keep this module free of heavy imports, the CLI
+loads it for its option choices.
+"""
+
+import importlib
+
+
+class Registry:
+    def __init__(self, kind):
+        self.kind = kind
+        self._targets = {}
+        self._descriptions = {}
+        self._loaded = {}
+
+    def register(self, name, target, description=""):
+        # target: "package.module:function" or a callable
+        self._targets[name] = target
+        self._descriptions[name] = description
+        self._loaded.pop(name, None)
+
+    def names(self):
+        return list(self._targets)
+
+    def description(self, name):
+        return self._descriptions[name]
+
+    def __contains__(self, name):
+        return name in self._targets
+
+    def get(self, name):
+        if name not in self._targets:
+            raise KeyError(
+                f"Unknown {self.kind} '{name}' (choose from {', '.join(self.names())})"
+            )
+        if name not in self._loaded:
+            target = self._targets[name]
+            if isinstance(target, str):
+                module_name, _, attribute = target.partition(":")
+                target = getattr(importlib.import_module(module_name), attribute)
+            self._loaded[name] = target
+        return self._loaded[name]
+
+
+# render(words, output, audio_file, temp_dir, background=None, work_dir=None,
+#        **options) -> bool
+GENERATORS = Registry("generator")
+GENERATORS.register(
+    "ps2",
+    "lyriks.core.video_generator_ps2:render",
+    "pysubs2 + ffmpeg (fast, good quality)",
+)
+GENERATORS.register(
+    "mp", "lyriks.core.video_generator_mp:render", "Moviepy (slow, low quality, legacy)"
+)
+GENERATORS.register(
+    "ts", "lyriks.core.pipeline:save_transcript", "Only save transcript (for debugging)"
+)
+# subtitle files instead of a video; several of them are written in one pass
+SUBTITLE_FORMATS = {
+    "srt": "SubRip subtitles (.srt)",
+    "vtt": "WebVTT with word timing (.vtt)",
+    "lrc": "Enhanced LRC with word timing (.lrc)",
+    "ass": "Karaoke ASS subtitles, not rendered (.ass)",
+}
+for name, description in SUBTITLE_FORMATS.items():
+    GENERATORS.register(name, f"lyriks.core.exporters:render_{name}", description)
+
+# align(whisper_words, lyrics, **options) -> segments, or False on failure
+ALIGNERS = Registry("aligner")
+ALIGNERS.register("gemini", "lyriks.core.gemini:generate", "Gemini (online)")
+ALIGNERS.register(
+    "local", "lyriks.core.aligner:align", "Local edit-distance alignment (offline)"
+)
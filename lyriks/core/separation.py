@@ -0,0 +1,316 @@
+import json
+import math
+import multiprocessing
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import click
+import numpy as np
+import soundfile as sf
+import torch
+from demucs.apply import apply_model
+from demucs.audio import AudioFile
+
+from . import models, profiler, separators
+
+# rough multiplier on top of the raw sample buffers (input, every source,
+# stems, crossfade tail) for model activations and framework overhead
+MEMORY_OVERHEAD = 6
+MIN_WINDOW_SECONDS = 20.0
+BLOCK_FRAMES = 1024 * 1024
+
+
+def window_seconds(max_memory, samplerate, channels, n_sources, overlap=2.0):
+    # bytes that one second of audio costs while a window is being separated
+    bytes_per_second = samplerate * channels * 4 * (n_sources + 3) * MEMORY_OVERHEAD
+    seconds = max_memory / bytes_per_second
+    if seconds < MIN_WINDOW_SECONDS:
+        click.secho(
+            f"Warning: memory budget only fits {seconds:.1f}s windows, "
+            f"using {MIN_WINDOW_SECONDS:.0f}s.",
+            fg="yellow",
+        )
+        seconds = MIN_WINDOW_SECONDS
+    return max(seconds, 4 * overlap)
+
+
+def split_sources(sources, vocals_idx):
+    # build the instrumental in place instead of summing full-length copies
+    vocals = sources[vocals_idx]
+    instrumental = None
+    for i in range(sources.shape[0]):
+        if i == vocals_idx:
+            continue
+        if instrumental is None:
+            instrumental = sources[i].clone()
+        else:
+            instrumental += sources[i]
+    return vocals, instrumental
+
+
+def _apply(model, wav, separator, device):
+    options = {"shifts": separator["shifts"], "overlap": separator["overlap"]}
+    if separator["segment"] is not None:
+        options["segment"] = separator["segment"]
+    with torch.no_grad():
+        return apply_model(model, wav, device=device, **options)[0]
+
+
+def vocal_submodels(model, vocals_idx):
+    # (submodel, weight) pairs of a bag of models that contribute to the
+    # vocals, None for single models and bags whose models all do
+    if not hasattr(model, "models") or getattr(model, "weights", None) is None:
+        return None
+    pairs = [
+        (submodel, weights[vocals_idx])
+        for submodel, weights in zip(model.models, model.weights)
+        if weights[vocals_idx]
+    ]
+    if not pairs or len(pairs) == len(model.models):
+        return None
+    return pairs
+
+
+def separate(model, wav, separator=None, device="cpu"):
+    """
+    Vocals and instrumental (channels x samples tensors) of wav (1 x channels x
+    samples). With stems="vocals", bags of per-source models such as
+    htdemucs_ft only run the models that produce the vocals, and the
+    instrumental is the mix minus the vocals.
+    """
+    separator = separator or separators.DEFAULT
+    vocals_idx = model.sources.index("vocals")
+    submodels = None
+    if separator["stems"] == "vocals":
+        submodels = vocal_submodels(model, vocals_idx)
+    if submodels is None:
+        sources = _apply(model, wav, separator, device)
+        return split_sources(sources, vocals_idx)
+
+    vocals = None
+    for submodel, weight in submodels:
+        part = _apply(submodel, wav, separator, device)[
+            submodel.sources.index("vocals")
+        ]
+        part *= weight
+        vocals = part if vocals is None else vocals + part
+    vocals /= sum(weight for _, weight in submodels)
+    return vocals, wav[0] - vocals
+
+
+def write_wav(path, data, samplerate, block_frames=BLOCK_FRAMES):
+    # write in blocks so memory-mapped stems are never fully paged in at once
+    with sf.SoundFile(
+        str(path), "w", samplerate, data.shape[1], subtype="FLOAT"
+    ) as out:
+        for start in range(0, len(data), block_frames):
+            out.write(np.asarray(data[start : start + block_frames]))
+
+
+class _CrossfadeWriter:
+    """
+    Writes overlapping windows to a sound file, blending every window's first
+    `overlap` frames with the held-back last `overlap` frames of the previous
+    window using an equal-gain linear crossfade.
+    """
+
+    def __init__(self, path, samplerate, channels, overlap):
+        self.file = sf.SoundFile(str(path), "w", samplerate, channels, subtype="FLOAT")
+        self.overlap = overlap
+        self.tail = None
+        self.fade_in = np.linspace(0.0, 1.0, overlap, dtype=np.float32)[:, None]
+
+    def write(self, chunk):
+        if self.tail is not None:
+            n = min(len(self.tail), len(chunk))
+            fade = self.fade_in[:n]
+            chunk[:n] *= fade
+            chunk[:n] += self.tail[:n] * (1.0 - fade)
+        if len(chunk) <= self.overlap:
+            self.file.write(chunk)
+            self.tail = None
+        else:
+            self.file.write(chunk[: -self.overlap])
+            self.tail = chunk[-self.overlap :].copy()
+
+    def close(self):
+        if self.tail is not None:
+            self.file.write(self.tail)
+            self.tail = None
+        self.file.close()
+
+
+def separate_streaming(
+    model,
+    audio_file,
+    vocals_file,
+    instrumental_file,
+    device="cpu",
+    max_memory=4 * 1024**3,
+    overlap=2.0,
+    separator=None,
+):
+    """
+    Separates vocals from audio_file window by window and streams the stems to
+    vocals_file and instrumental_file. Peak memory depends on the window size
+    derived from max_memory, not on the length of the track.
+    """
+    samplerate = model.samplerate
+    channels = model.audio_channels
+
+    audio = AudioFile(Path(audio_file))
+    window = window_seconds(
+        max_memory, samplerate, channels, len(model.sources), overlap
+    )
+    window_frames = int(window * samplerate)
+    overlap_frames = int(overlap * samplerate)
+    hop_frames = window_frames - overlap_frames
+    n_windows = max(
+        1, math.ceil((audio.duration * samplerate - overlap_frames) / hop_frames)
+    )
+    click.secho(
+        f"Separating in {n_windows} window(s) of {window:.0f}s "
+        f"({overlap:.0f}s crossfade).",
+        fg="blue",
+    )
+
+    vocals_out = _CrossfadeWriter(vocals_file, samplerate, channels, overlap_frames)
+    instrumental_out = _CrossfadeWriter(
+        instrumental_file, samplerate, channels, overlap_frames
+    )
+    try:
+        index = 0
+        while True:
+            # the container duration is only an estimate, so keep reading until
+            # a window comes back short
+            wav = audio.read(
+                seek_time=index * hop_frames / samplerate,
+                duration=(window_frames + 0.5) / samplerate,
+                streams=0,
+                samplerate=samplerate,
+                channels=channels,
+            )
+            frames = wav.shape[-1]
+            if frames == 0:
+                break
+            wav = wav.float().unsqueeze(0).to(device)
+            vocals, instrumental = separate(model, wav, separator, device)
+            del wav
+            vocals_out.write(vocals.cpu().numpy().T.copy())
+            instrumental_out.write(instrumental.cpu().numpy().T.copy())
+            del vocals, instrumental
+
+            if frames < window_frames:
+                break
+            index += 1
+    finally:
+        vocals_out.close()
+        instrumental_out.close()
+
+    return vocals_file, instrumental_file
+
+
+def benchmark(audio_file, separator, device="cpu", duration=None, vocals_file=None):
+    """
+    Loads the separator's model and separates (the first duration seconds
+    of) audio_file. Meant to run in a fresh process, so the peak RSS belongs
+    to this separator alone. The vocals are saved to vocals_file if given.
+    """
+    start = time.perf_counter()
+    model = models.LOADERS["demucs"](separator["model"], device, None)
+    load_seconds = time.perf_counter() - start
+
+    wav = AudioFile(Path(audio_file)).read(
+        streams=0,
+        samplerate=model.samplerate,
+        channels=model.audio_channels,
+        duration=duration,
+    )
+    audio_seconds = wav.shape[-1] / model.samplerate
+    wav = wav.float().unsqueeze(0).to(device)
+    cuda = str(device).startswith("cuda")
+    if cuda:
+        torch.cuda.reset_peak_memory_stats()
+
+    start, cpu = time.perf_counter(), time.process_time()
+    vocals, _ = separate(model, wav, separator, device)
+    seconds = time.perf_counter() - start
+    if vocals_file:
+        np.save(vocals_file, vocals.cpu().numpy())
+
+    return {
+        "separator": separators.label(separator),
+        "audio_seconds": round(audio_seconds, 2),
+        "load_seconds": round(load_seconds, 2),
+        "seconds": round(seconds, 2),
+        "cpu_seconds": round(time.process_time() - cpu, 2),
+        "rtf": round(seconds / audio_seconds, 4),
+        "peak_rss": profiler.peak_rss(),
+        "peak_gpu_memory": torch.cuda.max_memory_allocated() if cuda else None,
+    }
+
+
+def vocals_sdr(reference, estimate):
+    # signal to distortion ratio of estimate against reference, in dB
+    length = min(reference.shape[-1], estimate.shape[-1])
+    reference, estimate = reference[..., :length], estimate[..., :length]
+    noise = np.sum((reference - estimate) ** 2, dtype=np.float64)
+    if noise == 0:
+        return float("inf")
+    return float(10 * np.log10(np.sum(reference**2, dtype=np.float64) / noise))
+
+
+def benchmark_separators(audio_file, separator_list, device="cpu", duration=None):
+    """
+    Benchmarks every separator in its own process. The vocals of the first
+    separator are the reference the others' SDR is measured against.
+    """
+    context = multiprocessing.get_context("spawn")
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        vocal_files = []
+        for index, separator in enumerate(separator_list):
+            click.secho(
+                f"[{index + 1}/{len(separator_list)}] "
+                f"{separators.label(separator)}...",
+                fg="blue",
+            )
+            vocals_file = str(Path(folder) / f"vocals{index}.npy")
+            with ProcessPoolExecutor(1, mp_context=context) as pool:
+                result = pool.submit(
+                    benchmark, audio_file, separator, device, duration, vocals_file
+                ).result()
+            results.append(result)
+            vocal_files.append(vocals_file)
+
+        reference = np.load(vocal_files[0])
+        results[0]["sdr"] = None
+        for result, vocals_file in zip(results[1:], vocal_files[1:]):
+            result["sdr"] = round(vocals_sdr(reference, np.load(vocals_file)), 2)
+    return results
+
+
+def benchmark_table(results):
+    width = max([len("separator")] + [len(row["separator"]) for row in results])
+    lines = [
+        f"{'separator':<{width}}  {'RTF':>6}  {'sep s':>7}  {'load s':>6}  "
+        f"{'peak RSS MB':>11}  {'GPU MB':>7}  {'SDR dB':>6}"
+    ]
+    for row in results:
+        gpu = row["peak_gpu_memory"]
+        gpu = f"{gpu / 1024**2:>7.0f}" if gpu is not None else f"{'-':>7}"
+        sdr = f"{row['sdr']:>6.1f}" if row["sdr"] is not None else f"{'ref':>6}"
+        lines.append(
+            f"{row['separator']:<{width}}  {row['rtf']:>6.3f}  "
+            f"{row['seconds']:>7.1f}  {row['load_seconds']:>6.1f}  "
+            f"{row['peak_rss'] / 1024**2:>11.0f}  {gpu}  {sdr}"
+        )
+    return "\n".join(lines)
+
+
+def save_benchmark(results, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    return path
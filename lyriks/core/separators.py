@@ -0,0 +1,96 @@
+"""
+Source separator settings for `--separator`: which Demucs model separates the
+vocals and how it is applied.
+
+A separator is a dict with the model name, the segment length in seconds (None
+for the model's default), the overlap between segments, the number of random
+shifts that are averaged, and the stems that are computed: "vocals" for the
+two-stem vocals/no_vocals fast path, or "all" to compute every source and sum
+the non-vocal ones.
+"""
+
+import re
+
+# pretrained Demucs models; other names are passed to Demucs as they are
+MODELS = (
+    "htdemucs",
+    "htdemucs_ft",
+    "htdemucs_6s",
+    "hdemucs_mmi",
+    "mdx",
+    "mdx_extra",
+    "mdx_q",
+    "mdx_extra_q",
+)
+
+STEMS = ("vocals", "all")
+
+# Demucs' own defaults, i.e. what lyriks has always used
+DEFAULT = {
+    "model": "htdemucs",
+    "segment": None,
+    "overlap": 0.25,
+    "shifts": 1,
+    "stems": "vocals",
+}
+
+# compared by `lyriks bench-separator` unless others are given; the first
+# one is the reference the others' vocals are measured against
+BENCHMARK = (
+    "htdemucs_ft",
+    "htdemucs",
+    "htdemucs,shifts=0",
+    "htdemucs,shifts=0,overlap=0.1",
+    "mdx_extra_q,shifts=0",
+)
+
+OPTIONS = {"segment": float, "overlap": float, "shifts": int, "stems": str}
+
+MODEL_NAME = re.compile(r"[\w.-]+")
+
+
+def parse_separator(spec):
+    """
+    A model name followed by comma separated overrides, e.g.
+    "htdemucs_ft,shifts=0,overlap=0.1" or "mdx_extra_q,segment=10".
+    """
+    model, *overrides = [part.strip() for part in str(spec).split(",")]
+    if not MODEL_NAME.fullmatch(model):
+        raise ValueError(
+            f"Invalid separator '{spec}' (start with a model: {', '.join(MODELS)})"
+        )
+    separator = dict(DEFAULT, model=model)
+    for override in overrides:
+        key, _, value = override.partition("=")
+        key = key.strip()
+        if key not in OPTIONS or not value:
+            raise ValueError(
+                f"Invalid separator option '{override}' "
+                f"(use {', '.join(OPTIONS)} as key=value)"
+            )
+        try:
+            separator[key] = OPTIONS[key](value.strip())
+        except ValueError:
+            raise ValueError(f"Invalid value for {key}: {value}")
+
+    if separator["stems"] not in STEMS:
+        raise ValueError(f"Invalid stems '{separator['stems']}' (use vocals or all)")
+    if not 0 <= separator["overlap"] < 1:
+        raise ValueError("The overlap must be between 0 and 1.")
+    if separator["shifts"] < 0:
+        raise ValueError("The number of shifts can't be negative.")
+    if separator["segment"] is not None and separator["segment"] <= 0:
+        raise ValueError("The segment length must be positive.")
+    return separator
+
+
+def label(separator):
+    """
+    Short name of a separator: the model, plus the settings that differ from
+    the defaults. Used in cache keys, so stems from other settings never mix.
+    """
+    parts = [separator["model"]]
+    for key in OPTIONS:
+        if separator.get(key, DEFAULT[key]) != DEFAULT[key]:
+            parts.append(f"{key}={separator[key]}")
+    return ",".join(parts)
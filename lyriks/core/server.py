@@ -0,0 +1,382 @@
+"""
+Job server for `lyriks serve`: keeps the models loaded and takes jobs over a
+local HTTP API, on a TCP port or a Unix socket.
+
+    POST   /jobs              submit a job (JSON, same fields as a batch entry)
+    GET    /jobs              list all jobs
+    GET    /jobs/<id>         status of one job
+    DELETE /jobs/<id>         cancel a job
+    GET    /jobs/<id>/result  download the finished video (or transcript)
+    GET    /stats             loaded models, load times and memory
+
+Jobs wait in a bounded queue. The ML stage (separation, transcription,
+alignment) and the render stage run in separate worker pools, so one job can
+render while the next one is transcribed. Only the latest max_finished
+finished jobs are remembered; their output files are left on disk.
+"""
+
+import json
+import os
+import queue
+import socketserver
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import click
+
+from .batch import parse_entry
+
+QUEUED = "queued"
+ANALYZING = "analyzing"
+WAITING = "waiting for render"
+RENDERING = "rendering"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+RESULT_TYPES = {
+    ".mp4": "video/mp4",
+    ".json": "application/json",
+    ".srt": "application/x-subrip",
+    ".vtt": "text/vtt",
+    ".lrc": "text/plain",
+    ".ass": "text/x-ssa",
+}
+
+
+class QueueFull(Exception):
+    pass
+
+
+class ShuttingDown(Exception):
+    pass
+
+
+class Cancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, job_id, spec):
+        self.id = job_id
+        self.spec = spec
+        self.status = QUEUED
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        # latest ffmpeg progress event while rendering
+        self.progress = None
+        self.cancel_requested = threading.Event()
+
+    def result_path(self):
+        for suffix in RESULT_TYPES:
+            path = Path(self.spec["output"] + suffix)
+            if path.exists():
+                return path
+        return None
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "error": self.error,
+            "audio": str(self.spec["audio"]),
+            "output": self.spec["output"],
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "progress": self.progress,
+        }
+
+
+class JobServer:
+    """
+    analyze(job, worker_index) runs the ML stage and returns whatever
+    render(job, state, on_progress) needs. worker_index picks the ML worker's
+    own models. Cancelling a job during analysis takes effect at the next stage
+    boundary; a render is stopped at its next progress update.
+    """
+
+    def __init__(
+        self,
+        analyze,
+        render,
+        queue_size=16,
+        ml_workers=1,
+        render_workers=1,
+        output_dir=None,
+        stats=None,
+        max_finished=1000,
+    ):
+        self.analyze = analyze
+        self.render = render
+        self.stats = stats or dict
+        self.output_dir = Path(output_dir or "lyriks_jobs").absolute()
+        self.jobs = {}
+        # ids of finished jobs, oldest first
+        self.finished_ids = deque()
+        self.max_finished = max_finished
+        self.lock = threading.Lock()
+        self.pending = queue.Queue(maxsize=queue_size)
+        # small hand-off queue, so the ML stage can't run far ahead of rendering
+        self.renders = queue.Queue(maxsize=max(1, render_workers))
+        self.stopping = False
+        self.ml_threads = [
+            threading.Thread(target=self._ml_worker, args=(index,), daemon=True)
+            for index in range(ml_workers)
+        ]
+        self.render_threads = [
+            threading.Thread(target=self._render_worker, daemon=True)
+            for _ in range(render_workers)
+        ]
+
+    def start(self):
+        for thread in self.ml_threads + self.render_threads:
+            thread.start()
+
+    def submit(self, entry):
+        if self.stopping:
+            raise ShuttingDown("The server is shutting down.")
+        job_id = uuid.uuid4().hex[:12]
+        entry = dict(entry)
+        entry.setdefault("output", str(self.output_dir / job_id / "video"))
+        # relative paths are taken relative to the server's working directory
+        job = Job(job_id, parse_entry(entry, Path.cwd()))
+        with self.lock:
+            # only submit() adds jobs, so there is still room once inside
+            if self.pending.full():
+                raise QueueFull(f"The queue is full ({self.pending.maxsize} jobs).")
+            Path(job.spec["output"]).parent.mkdir(parents=True, exist_ok=True)
+            self.pending.put_nowait(job)
+            self.jobs[job_id] = job
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def list(self):
+        with self.lock:
+            return list(self.jobs.values())
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is None:
+            return None
+        with self.lock:
+            if job.status not in FINISHED:
+                job.cancel_requested.set()
+                if job.status == QUEUED:
+                    # the worker skips it when it comes up
+                    self._finish(job, CANCELLED)
+        return job
+
+    def _finish(self, job, status, error=None):
+        # called with the lock held
+        job.status = status
+        job.error = error
+        job.finished = time.time()
+        self.finished_ids.append(job.id)
+        while len(self.finished_ids) > self.max_finished:
+            self.jobs.pop(self.finished_ids.popleft(), None)
+
+    def _set_status(self, job, status):
+        # returns False if the job was cancelled in the meantime
+        with self.lock:
+            if job.cancel_requested.is_set():
+                if job.status not in FINISHED:
+                    self._finish(job, CANCELLED)
+                return False
+            job.status = status
+            return True
+
+    def _ml_worker(self, index):
+        while True:
+            job = self.pending.get()
+            if job is None:
+                break
+            if not self._set_status(job, ANALYZING):
+                continue
+            job.started = time.time()
+            click.secho(f"[{job.id}] analyzing {job.spec['audio']}", fg="blue")
+            try:
+                state = self.analyze(job.spec, index)
+            except Exception as e:
+                with self.lock:
+                    self._finish(job, FAILED, f"{type(e).__name__}: {e}")
+                click.secho(f"[{job.id}] failed: {e}", fg="red")
+                continue
+            if self._set_status(job, WAITING):
+                self.renders.put((job, state))
+
+    def _render_worker(self):
+        while True:
+            item = self.renders.get()
+            if item is None:
+                break
+            job, state = item
+            if not self._set_status(job, RENDERING):
+                continue
+
+            def on_progress(event, job=job):
+                job.progress = event
+                if job.cancel_requested.is_set():
+                    raise Cancelled(f"Job {job.id} was cancelled.")
+
+            try:
+                self.render(job.spec, state, on_progress)
+            except Exception as e:
+                with self.lock:
+                    if job.cancel_requested.is_set():
+                        self._finish(job, CANCELLED)
+                    else:
+                        self._finish(job, FAILED, f"{type(e).__name__}: {e}")
+                click.secho(f"[{job.id}] {job.status}: {e}", fg="red")
+                continue
+            with self.lock:
+                self._finish(job, DONE)
+            click.secho(
+                f"[{job.id}] done in {job.finished - job.started:.1f}s", fg="green"
+            )
+
+    def shutdown(self):
+        """
+        Stops taking jobs, cancels the queued ones and waits for the running
+        ones to finish.
+        """
+        if self.stopping:
+            return
+        self.stopping = True
+        while True:
+            try:
+                job = self.pending.get_nowait()
+            except queue.Empty:
+                break
+            if job is not None:
+                self.cancel(job.id)
+        for _ in self.ml_threads:
+            self.pending.put(None)
+        for thread in self.ml_threads:
+            thread.join()
+        for _ in self.render_threads:
+            self.renders.put(None)
+        for thread in self.render_threads:
+            thread.join()
+
+
+def make_handler(job_server):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, body):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _route(self):
+            parts = [part for part in self.path.split("?")[0].split("/") if part]
+            if not parts or parts[0] != "jobs" or len(parts) > 3:
+                return None, None
+            job_id = parts[1] if len(parts) > 1 else None
+            action = parts[2] if len(parts) > 2 else None
+            return job_id, action
+
+        def _job(self, job_id):
+            job = job_server.get(job_id)
+            if job is None:
+                self._send(404, {"error": f"Unknown job {job_id}"})
+            return job
+
+        def do_POST(self):
+            job_id, action = self._route()
+            if job_id is not None or self.path.split("?")[0].rstrip("/") != "/jobs":
+                self._send(404, {"error": "Not found"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                entry = json.loads(self.rfile.read(length) or b"{}")
+                if not isinstance(entry, dict):
+                    raise ValueError("Expected a JSON object.")
+                job = job_server.submit(entry)
+            except (ValueError, KeyError) as e:
+                self._send(400, {"error": str(e)})
+                return
+            except (QueueFull, ShuttingDown) as e:
+                self._send(503, {"error": str(e)})
+                return
+            self._send(202, job.to_dict())
+
+        def do_GET(self):
+            path = self.path.split("?")[0].rstrip("/")
+            if path == "/jobs":
+                self._send(200, [job.to_dict() for job in job_server.list()])
+                return
+            if path == "/stats":
+                self._send(200, job_server.stats())
+                return
+            job_id, action = self._route()
+            if job_id is None or action not in (None, "result"):
+                self._send(404, {"error": "Not found"})
+                return
+            job = self._job(job_id)
+            if job is None:
+                return
+            if action is None:
+                self._send(200, job.to_dict())
+                return
+
+            path = job.result_path() if job.status == DONE else None
+            if path is None:
+                self._send(409, {"error": f"Job {job_id} is {job.status}"})
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", RESULT_TYPES[path.suffix])
+            self.send_header("Content-Length", str(path.stat().st_size))
+            self.send_header(
+                "Content-Disposition", f'attachment; filename="{path.name}"'
+            )
+            self.end_headers()
+            with open(path, "rb") as f:
+                while chunk := f.read(1024 * 1024):
+                    self.wfile.write(chunk)
+
+        def do_DELETE(self):
+            job_id, action = self._route()
+            if job_id is None or action is not None:
+                self._send(404, {"error": "Not found"})
+                return
+            job = job_server.cancel(job_id)
+            if job is None:
+                self._send(404, {"error": f"Unknown job {job_id}"})
+                return
+            self._send(200, job.to_dict())
+
+    return Handler
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        # BaseHTTPRequestHandler expects a (host, port) client address
+        request, _ = super().get_request()
+        return request, ("local", 0)
+
+
+def make_http_server(job_server, host="127.0.0.1", port=8766, socket_path=None):
+    handler = make_handler(job_server)
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        return UnixHTTPServer(str(socket_path), handler)
+    return ThreadingHTTPServer((host, port), handler)
@@ -0,0 +1,190 @@
+import numpy as np
+import soundfile as sf
+
+# frames per block when streaming; a block covers BLOCK_HOPS hops of audio
+BLOCK_HOPS = 4096
+
+
+def frame_count(total_frames, frame_length, hop_length):
+    # same framing as range(0, total_frames - frame_length, hop_length)
+    return max(0, -(-(total_frames - frame_length) // hop_length))
+
+
+def frame_rms(audio, frame_length=2048, hop_length=512, count=None):
+    """
+    RMS energy of frames starting every hop_length samples, computed from a
+    cumulative sum of squares instead of one mean per frame.
+    """
+    if count is None:
+        count = frame_count(len(audio), frame_length, hop_length)
+    else:
+        count = min(count, max(0, (len(audio) - frame_length) // hop_length + 1))
+    if count <= 0:
+        return np.empty(0)
+    squares = np.square(audio, dtype=np.float64)
+    cumulative = np.concatenate(([0.0], np.cumsum(squares)))
+    starts = np.arange(count) * hop_length
+    energy = (cumulative[starts + frame_length] - cumulative[starts]) / frame_length
+    return np.sqrt(np.maximum(energy, 0.0))
+
+
+def to_mono(block):
+    if block.ndim > 1:
+        return block.mean(axis=1)
+    return block
+
+
+def _blocks(source, blocksize, overlap):
+    if isinstance(source, np.ndarray):
+        step = blocksize - overlap
+        for start in range(0, max(len(source) - overlap, 1), step):
+            yield to_mono(np.asarray(source[start : start + blocksize]))
+    else:
+        for block in sf.blocks(
+            str(source), blocksize=blocksize, overlap=overlap, dtype="float64"
+        ):
+            yield to_mono(block)
+
+
+def source_info(source, samplerate=None):
+    # returns (total frames, sample rate) for a file path or an in-memory array
+    if isinstance(source, np.ndarray):
+        return len(source), samplerate
+    info = sf.info(str(source))
+    return info.frames, info.samplerate
+
+
+def stream_rms(source, total_frames, frame_length=2048, hop_length=512):
+    """
+    Frame energies of a file or (memory-mapped) array, read in blocks so only
+    BLOCK_HOPS frames worth of audio are held in memory at a time. Consecutive
+    blocks overlap by frame_length - hop_length samples so every block starts
+    on a frame boundary.
+    """
+    total = frame_count(total_frames, frame_length, hop_length)
+    overlap = frame_length - hop_length
+    blocksize = BLOCK_HOPS * hop_length + overlap
+    energies = []
+    done = 0
+    for block in _blocks(source, blocksize, overlap):
+        if done >= total:
+            break
+        block_energies = frame_rms(block, frame_length, hop_length, total - done)
+        energies.append(block_energies)
+        done += len(block_energies)
+    if not energies:
+        return np.empty(0)
+    return np.concatenate(energies)
+
+
+def find_runs(mask):
+    # start and (inclusive) end index of every run of True values
+    padded = np.concatenate(([0], mask.astype(np.int8), [0]))
+    edges = np.diff(padded)
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1) - 1
+    return starts, ends
+
+
+def detect_non_silent(
+    source,
+    samplerate=None,
+    frame_length=2048,
+    hop_length=512,
+    silence_thresh=0.02,
+    min_non_silence_sec=0.2,
+):
+    """
+    Finds the non-silent regions of a file or array. Returns
+    (non_silent_parts, total_duration, samplerate), or None for the parts if the
+    audio is completely silent.
+    """
+    total_frames, sr = source_info(source, samplerate)
+    total_duration = total_frames / sr
+
+    energies = stream_rms(source, total_frames, frame_length, hop_length)
+    starts, ends = find_runs(energies > silence_thresh)
+    if not len(starts):
+        return None, total_duration, sr
+
+    start_times = starts * hop_length / sr
+    end_times = (ends * hop_length + frame_length) / sr
+    keep = end_times - start_times >= min_non_silence_sec
+    non_silent_parts = [
+        (float(start), float(end))
+        for start, end in zip(start_times[keep], end_times[keep])
+    ]
+    return non_silent_parts, total_duration, sr
+
+
+def silent_gaps(non_silent_parts, total_duration):
+    silent_parts = []
+    prev_end = 0.0
+    for start_time, end_time in non_silent_parts:
+        if start_time > prev_end:
+            silent_parts.append(
+                (float(round(prev_end, 2)), float(round(start_time, 2)))
+            )
+        prev_end = end_time
+    if prev_end < total_duration:
+        silent_parts.append(
+            (float(round(prev_end, 2)), float(round(total_duration, 2)))
+        )
+    return silent_parts
+
+
+def merge_regions(non_silent_parts, target_length=30.0, total_duration=None, pad=0.2):
+    """
+    Groups neighbouring non-silent parts into regions of up to target_length
+    seconds (including the silence between them), so every region can be
+    transcribed on its own. Longer parts stay single regions. Each region is
+    padded by up to pad seconds, but never past the middle of the gap to its
+    neighbours, so regions never overlap.
+    """
+    merged = []
+    for start, end in non_silent_parts:
+        if merged and end - merged[-1][0] <= target_length:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+
+    regions = []
+    for index, (start, end) in enumerate(merged):
+        lower = (merged[index - 1][1] + start) / 2 if index else 0.0
+        if index + 1 < len(merged):
+            upper = (end + merged[index + 1][0]) / 2
+        else:
+            upper = total_duration
+        start = max(start - pad, lower)
+        end = end + pad if upper is None else min(end + pad, upper)
+        regions.append((float(start), float(end)))
+    return regions
+
+
+def _read_region(source, samplerate, start_time, end_time):
+    start_sample = int(start_time * samplerate)
+    end_sample = int(end_time * samplerate)
+    if isinstance(source, np.ndarray):
+        region = np.asarray(source[start_sample:end_sample])
+    else:
+        region = sf.read(
+            str(source), start=start_sample, stop=end_sample, dtype="float64"
+        )[0]
+    return to_mono(region)
+
+
+def extract_regions(source, samplerate, regions):
+    # concatenates the given regions (mono) into one array
+    if not regions:
+        return np.empty(0)
+    return np.concatenate(
+        [_read_region(source, samplerate, start, end) for start, end in regions]
+    )
+
+
+def write_regions(source, samplerate, regions, output_file):
+    # concatenates the given regions (mono) into output_file, one region at a time
+    with sf.SoundFile(str(output_file), "w", samplerate, 1) as out:
+        for start_time, end_time in regions:
+            out.write(_read_region(source, samplerate, start_time, end_time))
+    return output_file
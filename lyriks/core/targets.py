@@ -0,0 +1,89 @@
+"""
+Output profiles for multi-target ps2 renders, e.g. 1080p landscape, 720p and
+a 9:16 vertical cut written by one ffmpeg run.
+
+A target is a dict with a name (used in the file name), size, fps, x264 CRF,
+the alignment of the lyrics, a font scale and optionally a vertical margin as
+a fraction of the frame height.
+"""
+
+import re
+
+# ASS numpad alignments
+ALIGNMENTS = {"top": 8, "middle": 5, "bottom": 2}
+
+PROFILES = {
+    "1080p": {"size": "1920x1080", "fps": 60, "crf": 20, "align": "middle"},
+    "720p": {"size": "1280x720", "fps": 30, "crf": 23, "align": "middle"},
+    # short-form platforms put their buttons over the lowest part of the frame
+    "vertical": {
+        "size": "1080x1920",
+        "fps": 30,
+        "crf": 23,
+        "align": "bottom",
+        "margin": 0.25,
+    },
+}
+
+DEFAULTS = {"fps": 30, "crf": 23, "align": "middle", "font_scale": 1.0}
+
+OPTIONS = {
+    "name": str,
+    "fps": int,
+    "crf": int,
+    "align": str,
+    "font_scale": float,
+    "margin": float,
+}
+
+SIZE = re.compile(r"(\d+)x(\d+)(?:@(\d+))?")
+
+
+def parse_target(spec):
+    """
+    "720p", "1080x1920@30" or either of them followed by comma separated
+    overrides, e.g. "vertical,crf=20,name=shorts".
+    """
+    first, *overrides = [part.strip() for part in str(spec).split(",")]
+    if first in PROFILES:
+        target = dict(DEFAULTS, **PROFILES[first], name=first)
+    else:
+        match = SIZE.fullmatch(first)
+        if not match:
+            raise ValueError(
+                f"Unknown output target '{first}' "
+                f"(use {', '.join(PROFILES)} or WIDTHxHEIGHT[@FPS])"
+            )
+        width, height, fps = match.groups()
+        target = dict(DEFAULTS, size=f"{width}x{height}", name=first.replace("@", "_"))
+        if fps:
+            target["fps"] = int(fps)
+
+    for override in overrides:
+        key, _, value = override.partition("=")
+        key = key.strip().replace("-", "_")
+        if key not in OPTIONS or not value:
+            raise ValueError(
+                f"Invalid output target option '{override}' "
+                f"(use {', '.join(OPTIONS)} as key=value)"
+            )
+        try:
+            target[key] = OPTIONS[key](value.strip())
+        except ValueError:
+            raise ValueError(f"Invalid value for {key}: {value}")
+
+    if target["align"] not in ALIGNMENTS:
+        raise ValueError(
+            f"Invalid alignment '{target['align']}' (use {', '.join(ALIGNMENTS)})"
+        )
+    if target["fps"] <= 0 or not 0 <= target["crf"] <= 51:
+        raise ValueError(f"Invalid fps or CRF in output target '{spec}'")
+    return target
+
+
+def check_names(targets):
+    # every target is written to <output>_<name>.mp4
+    names = [target["name"] for target in targets]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Output targets need distinct names: {', '.join(duplicates)}")
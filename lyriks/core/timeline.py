@@ -0,0 +1,124 @@
+import numpy as np
+
+
+class TimelineMap:
+    """
+    Maps timestamps between the original audio and the silence-removed audio
+    that remove_silence() builds by concatenating the non-silent parts.
+
+    Built once from non_silent_parts; lookups use np.searchsorted, so mapping
+    n timestamps costs O(n log regions) instead of O(n * regions).
+    """
+
+    def __init__(self, non_silent_parts):
+        parts = np.asarray(non_silent_parts, dtype=np.float64).reshape(-1, 2)
+        self.orig_starts = parts[:, 0]
+        self.orig_ends = parts[:, 1]
+        durations = self.orig_ends - self.orig_starts
+        self.new_ends = np.cumsum(durations)
+        self.new_starts = self.new_ends - durations
+        self.duration = float(self.new_ends[-1]) if len(parts) else 0.0
+
+    def __len__(self):
+        return len(self.orig_starts)
+
+    def region_index(self, times):
+        """
+        Index of the region each silence-removed timestamp falls into, or -1.
+        Region ends are inclusive, so a timestamp exactly on the end of the last
+        region still maps.
+        """
+        times = np.asarray(times, dtype=np.float64)
+        if not len(self):
+            return np.full(times.shape, -1)
+        index = np.searchsorted(self.new_starts, times, side="right") - 1
+        inside = (index >= 0) & (times <= self.new_ends[np.maximum(index, 0)])
+        return np.where(inside, index, -1)
+
+    def to_original(self, times, index=None):
+        """
+        Maps silence-removed timestamps back to the original timeline. Values
+        outside the silence-removed audio become NaN. Pass index (from
+        region_index) to map relative to a given region, e.g. word ends relative
+        to the region of the word start.
+        """
+        times = np.asarray(times, dtype=np.float64)
+        if index is None:
+            index = self.region_index(times)
+        if not len(self):
+            return np.full(times.shape, np.nan)
+        safe = np.maximum(index, 0)
+        mapped = self.orig_starts[safe] + (times - self.new_starts[safe])
+        return np.where(index >= 0, mapped, np.nan)
+
+    def to_silence_removed(self, times):
+        """
+        Maps original timestamps onto the silence-removed timeline. Timestamps
+        inside removed silence snap to the point where the next region starts.
+        """
+        times = np.asarray(times, dtype=np.float64)
+        if not len(self):
+            return np.zeros(times.shape)
+        index = np.searchsorted(self.orig_starts, times, side="right") - 1
+        safe = np.maximum(index, 0)
+        offset = np.clip(times - self.orig_starts[safe], 0.0, None)
+        offset = np.minimum(offset, self.orig_ends[safe] - self.orig_starts[safe])
+        return np.where(index >= 0, self.new_starts[safe] + offset, 0.0)
+
+
+def map_segments(segments, non_silent_parts):
+    """
+    Maps Whisper segments ({"start", "end", "text", "words": [(start, end,
+    word)]}) of the silence-removed audio back to the original timeline. Words
+    that fall outside the audio are dropped, and so are segments left without
+    words.
+    """
+    timeline = TimelineMap(non_silent_parts)
+
+    # map every segment and word boundary in one vectorized pass
+    segment_times = np.array(
+        [(segment["start"], segment["end"]) for segment in segments],
+        dtype=np.float64,
+    ).reshape(-1, 2)
+    mapped_segments = timeline.to_original(segment_times)
+
+    word_starts = np.array(
+        [w[0] for segment in segments for w in segment["words"]], np.float64
+    )
+    word_ends = np.array(
+        [w[1] for segment in segments for w in segment["words"]], np.float64
+    )
+    # word ends are mapped relative to the region the word starts in
+    word_index = timeline.region_index(word_starts)
+    mapped_starts = timeline.to_original(word_starts, word_index)
+    mapped_ends = timeline.to_original(word_ends, word_index)
+
+    mapped_words = []
+    position = 0
+    for segment, (start, end) in zip(segments, mapped_segments):
+        mapped_segment = {
+            "text": segment["text"],
+            # fall back to the unmapped time if it is outside the audio
+            "start": segment["start"] if np.isnan(start) else round(float(start), 2),
+            "end": segment["end"] if np.isnan(end) else round(float(end), 2),
+            "words": [],
+        }
+
+        for _, _, word in segment["words"]:
+            if word_index[position] >= 0:
+                mapped_segment["words"].append(
+                    (
+                        round(float(mapped_starts[position]), 2),
+                        round(float(mapped_ends[position]), 2),
+                        word,
+                    )
+                )
+            position += 1
+
+        if (
+            not mapped_segment["words"] == []
+            and mapped_segment["end"] > mapped_segment["start"]
+        ):
+            mapped_words.append(mapped_segment)
+
+    return mapped_words
@@ -1,13 +1,12 @@
 import click
 from matplotlib import font_manager
-from moviepy import (
-    AudioFileClip,
-    ColorClip,
-    CompositeVideoClip,
-    TextClip,
-    VideoFileClip,
-)
-from PIL import ImageFont
+from moviepy import AudioFileClip, VideoClip, VideoFileClip
+
+from . import profiler
+from .compositor import Compositor, load_font
+
+# frame rate without a background video
+FPS = 24
 
 
 class VideoGenerator:
@@ -21,9 +20,9 @@ class VideoGenerator:
                 clip_duration = int(duration)
             else:
                 clip_duration = self.audio_duration
-            self.clip = ColorClip(
-                size=(width, height), color=(0, 0, 0), duration=clip_duration
-            )
+            self.clip = None
+            self.duration = clip_duration
+            self.fps = FPS
             self.audio = self.audio.subclipped(0, clip_duration)
         else:
             if duration is not None:
@@ -34,25 +33,33 @@ class VideoGenerator:
                     0, self.audio_duration
                 )
                 self.audio = self.audio.subclipped(0, self.audio_duration)
-        self.video_width = self.clip.w
-        self.video_height = self.clip.h
+        if self.clip is not None:
+            width, height = self.clip.w, self.clip.h
+            self.duration = self.clip.duration
+            self.fps = self.clip.fps or FPS
+        self.video_width = width
+        self.video_height = height
         self.font_path = font_manager.findfont("DejaVu Sans")
-        self.text_clips = []
+        # text is blitted onto the background frame by frame, every distinct
+        # line is only rasterized once
+        self.compositor = Compositor(
+            (width, height),
+            self.clip.get_frame if self.clip is not None else (0, 0, 0),
+        )
         click.secho("Video Generator initialized", fg="green")
 
     def add_text(self, text, start: int, end: int, font_size: int = 80):
-        txt_clip = TextClip(
-            font=self.font_path,
-            text=text,
-            font_size=font_size,
+        self.compositor.add_text(
+            text,
+            start,
+            end,
+            self.font_path,
+            font_size,
             color="white",
-            method="caption",
-            size=(self.video_width, self.video_height),
+            max_width=self.video_width,
         )
-        txt_clip = txt_clip.with_position("center").with_start(start).with_end(end)
-        self.text_clips.append(txt_clip)
 
-        font = ImageFont.truetype(self.font_path, font_size)
+        font = load_font(self.font_path, font_size)
         words = text.split(" ")
         x = 0
         coords = []
@@ -67,28 +74,39 @@ class VideoGenerator:
 
         x_offset = (self.video_width - total_text_width) // 2
         y_position = self.video_height // 2
+        marker = self.compositor.sprites.get("|", self.font_path, font_size, "red")
+        marker_height = marker.block_size[1]
         for c in coords:
-            marker_clip = TextClip(
-                text="|", font=self.font_path, font_size=font_size, color="red"
-            )
-            marker_clip = marker_clip.with_position(
-                (x_offset + c["start_x"] - 10, (y_position - marker_clip.h // 2 + 5))
+            position = (
+                x_offset + c["start_x"] - 10,
+                y_position - marker_height // 2 + 5,
             )
-            click.secho(
-                f"Placed marker at {x_offset + c['start_x'] - 10},{y_position - marker_clip.h // 2 + 5}"
-            )
-            marker_clip = marker_clip.with_start(start).with_end(end)
-            self.text_clips.append(marker_clip)
+            click.secho(f"Placed marker at {position[0]},{position[1]}")
+            self.compositor.add(marker, start, end, position)
 
+    @profiler.profiled("render")
     def render_video(self, output_file_name, temp_dir):
-        self.video = CompositeVideoClip([self.clip] + self.text_clips)
+        self.video = VideoClip(
+            frame_function=self.compositor.make_frame, duration=self.duration
+        )
         self.video = self.video.with_audio(self.audio)
         output = output_file_name + ".mp4"
         temp_audiofile = str(temp_dir / "temp-audio.mp3")
         self.video.write_videofile(
             output,
+            fps=self.fps,
             temp_audiofile=temp_audiofile,
             remove_temp=True,
             codec="libx264",
             audio_codec="libmp3lame",
         )
+
+
+def render(words, output, audio_file, temp_dir, background=None, **options):
+    # generator backend; ps2-only options (render jobs, still frames, ...) are ignored
+    generator = VideoGenerator(audio_file, clip_path=background)
+    for segment in words:
+        generator.add_text(segment["text"], segment["start"], segment["end"])
+    generator.render_video(output_file_name=output, temp_dir=temp_dir)
+    click.secho("Video created using MoviePy.", fg="green")
+    return True
@@ -1,10 +1,37 @@
 import os
+import re
 import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 
 import click
 import pysubs2
 
-from . import ffmpeg
+from . import ffmpeg, profiler, targets
+
+# audio codecs that can be muxed into mp4 without re-encoding
+MP4_COPY_AUDIO_CODECS = ("aac",)
+
+# length of the fade in/out of the whole video, in seconds
+VIDEO_FADE = 1.0
+
+KARAOKE_TAG = re.compile(r"\\(?:kf|ko|k|K)(\d+)")
+FADE_TAG = re.compile(r"\\fad\((\d+),(\d+)\)")
+
+# how background proxies are encoded; part of their cache key
+PROXY_ENCODE_ARGS = ["-c:v", "libx264", "-preset", "veryfast", "-crf", "18"]
+
+# one lock per proxy, so concurrent renders of the same background wait for
+# the first one and then read its proxy, while other proxies encode meanwhile
+_proxy_locks = {}
+_proxy_locks_lock = threading.Lock()
+
+
+def _proxy_lock(key):
+    with _proxy_locks_lock:
+        return _proxy_locks.setdefault(key, threading.Lock())
 
 
 class VideoGenerator:
@@ -35,33 +62,15 @@ class VideoGenerator:
         self.filename = None
 
     def add_words(self, segment, style="Default"):
-        words = segment["words"]
+        words = segment_words(segment)
         if not words:
             return
 
-        if isinstance(words[0], tuple):
-            words = [{"start": w[0], "end": w[1], "word": w[2]} for w in words]
-        elif isinstance(words[0], list):
-            words = [{"start": w[0], "end": w[1], "word": w[2]} for w in words]
-
-        # full_text = " ".join([w["word"] for w in words])
-
-        # karaoke highlighting
-        ass_text = ""
-        for i, w in enumerate(words):
-            duration_cs = int((w["end"] - w["start"]) * 100)
-            ass_text += f"{{\K{duration_cs}}}" + w["word"]
-            if i < len(words) - 1:
-                ass_text += " "
-
-        fade_ms = 100
-        ass_text = r"{\fad(" + str(fade_ms) + "," + str(fade_ms) + ")}" + ass_text
-
         self.subs.append(
             pysubs2.SSAEvent(
                 start=int(segment["start"] * 1000),
                 end=int(segment["end"] * 1000),
-                text=ass_text,
+                text=karaoke_text(words),
                 style=style,
             )
         )
@@ -71,6 +80,13 @@ class VideoGenerator:
         self.subs.save(self.filename)
         return self.filename
 
+    def load(self, filename):
+        # picks up subtitles saved by an earlier run
+        self.subs = pysubs2.load(str(filename))
+        self.filename = str(filename)
+        return self.filename
+
+    @profiler.profiled("render")
     def render_video(
         self,
         output_file_name,
@@ -79,146 +95,276 @@ class VideoGenerator:
         fps=60,
         duration=60,
         background_path=None,
+        render_jobs=1,
+        silent_parts=None,
+        still_frames=False,
+        report_savings=False,
+        on_progress=None,
+        background_cache=None,
     ):
         if not self.filename:
             click.secho("Please save subtitles first.", fg="red")
             return False
 
-        temp_video = output_file_name + "_temp.mp4"
-
         try:
-            if audio_file:
-                cmd = [
-                    "ffprobe",
-                    "-v",
-                    "error",
-                    "-show_entries",
-                    "format=duration",
-                    "-of",
-                    "default=noprint_wrappers=1:nokey=1",
-                    str(audio_file),
-                ]
-                try:
-                    result = subprocess.run(
-                        cmd,
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.PIPE,
-                        text=True,
-                        check=True,
-                    )
-                    duration = round(float(result.stdout.strip()), 1)
-                except subprocess.CalledProcessError as e:
-                    click.secho(
-                        f"Error getting audio duration with ffprobe:\n{e.stderr}",
-                        fg="red",
-                    )
-                    return False
-                except (ValueError, IndexError) as e:
-                    click.secho(f"Error parsing audio duration: {e}", fg="red")
-                    return False
+            if background_path and background_cache is not None:
+                background_path = background_proxy(
+                    background_path, size, fps, background_cache
+                )
+            durations = self.probe_durations(audio_file, background_path, duration)
+            if durations is None:
+                return False
+            duration, bg_duration = durations
 
-            fade_filter = f"fade=t=in:st=0:d=1,fade=t=out:st={duration-1}:d=1"
+            if still_frames and background_path:
+                click.secho(
+                    "Still-frame encoding only applies without a background video.",
+                    fg="yellow",
+                )
+                still_frames = False
+            if still_frames and render_jobs > 1:
+                click.secho(
+                    "Still-frame encoding is not combined with --render-jobs, "
+                    "rendering in one pass.",
+                    fg="yellow",
+                )
+                render_jobs = 1
 
-            if background_path:
-                bg_cmd = [
-                    "ffprobe",
-                    "-v",
-                    "error",
-                    "-show_entries",
-                    "format=duration",
-                    "-of",
-                    "default=noprint_wrappers=1:nokey=1",
-                    str(background_path),
-                ]
-                try:
-                    bg_result = subprocess.run(
-                        bg_cmd,
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.PIPE,
-                        text=True,
-                        check=True,
-                    )
-                    bg_duration = float(bg_result.stdout.strip())
-                except subprocess.CalledProcessError as e:
-                    click.secho(
-                        f"Error getting background video duration:\n{e.stderr}",
-                        fg="red",
-                    )
-                    return False
-                except (ValueError, IndexError) as e:
-                    click.secho(
-                        f"Error parsing background video duration: {e}", fg="red"
-                    )
-                    return False
+            if render_jobs > 1:
+                return self.render_segmented(
+                    output_file_name + ".mp4",
+                    render_jobs,
+                    audio_file=audio_file,
+                    size=size,
+                    fps=fps,
+                    duration=duration,
+                    background_path=background_path,
+                    background_duration=bg_duration,
+                    silent_parts=silent_parts,
+                    on_progress=on_progress,
+                )
 
-                if bg_duration < duration:
-                    click.secho(
-                        "Error: Background video must be at least as long as the audio.",
-                        fg="red",
-                    )
-                    return False
-
-                ffmpeg_cmd = [
-                    "ffmpeg",
-                    "-y",
-                    "-i",
-                    str(background_path),
-                    "-t",
-                    str(duration),  # cut background to audio length
-                    "-vf",
-                    f"{fade_filter},ass={self.filename}",
-                    "-c:v",
-                    "libx264",
-                    "-pix_fmt",
-                    "yuv420p",
-                    "-r",
-                    str(fps),
-                    temp_video,
-                ]
-            else:
-                ffmpeg_cmd = [
-                    "ffmpeg",
-                    "-y",
-                    "-f",
-                    "lavfi",
-                    "-i",
-                    f"color=c=black:s={size}:d={duration}:r={fps}",
-                    "-vf",
-                    f"{fade_filter},ass={self.filename}",
-                    "-c:v",
-                    "libx264",
-                    "-pix_fmt",
-                    "yuv420p",
-                    temp_video,
-                ]
+            ffmpeg_cmd = self.build_command(
+                output_file_name + ".mp4",
+                audio_file=audio_file,
+                size=size,
+                fps=fps,
+                duration=duration,
+                background_path=background_path,
+                background_duration=bg_duration,
+                still_frames=still_frames,
+            )
 
             click.secho("Rendering video...", fg="blue")
-            ffmpeg.ffmpeg_progress(ffmpeg_cmd, duration)
+            start_time = time.time()
+            ffmpeg.ffmpeg_progress(ffmpeg_cmd, duration, on_progress)
+            encode_time = time.time() - start_time
 
-            # mix audio and video
-            if audio_file:
-                final_output = output_file_name + ".mp4"
-                ffmpeg_mux_cmd = [
-                    "ffmpeg",
-                    "-y",
-                    "-i",
-                    temp_video,
-                    "-i",
-                    str(audio_file),
-                    "-c:v",
-                    "copy",
-                    "-c:a",
-                    "aac",
-                    "-b:a",
-                    "192k",
-                    "-shortest",
-                    final_output,
-                ]
-                click.secho("Adding audio to video...", fg="blue")
-                ffmpeg.ffmpeg_progress(ffmpeg_mux_cmd, duration)
+            if still_frames and report_savings:
+                self.report_still_savings(
+                    output_file_name + ".mp4",
+                    encode_time,
+                    audio_file=audio_file,
+                    size=size,
+                    fps=fps,
+                    duration=duration,
+                )
+            return True
+
+        except subprocess.CalledProcessError as e:
+            click.secho(
+                f"ffmpeg command failed with exit code {e.returncode}", fg="red"
+            )
+            click.secho(f"Stderr:\n{e.stderr}", fg="yellow")
+            return False
+        except Exception as e:
+            click.secho(
+                f"An unexpected error occurred during video rendering: {e}", fg="red"
+            )
+            return False
+
+    def probe_durations(self, audio_file, background_path, duration):
+        # (duration, background duration), or None after printing the error
+        bg_duration = None
+        if audio_file:
+            try:
+                duration = round(ffmpeg.probe_duration(audio_file), 1)
+            except subprocess.CalledProcessError as e:
+                click.secho(
+                    f"Error getting audio duration with ffprobe:\n{e.stderr}",
+                    fg="red",
+                )
+                return None
+            except (ValueError, KeyError) as e:
+                click.secho(f"Error parsing audio duration: {e}", fg="red")
+                return None
+
+        if background_path:
+            try:
+                bg_duration = ffmpeg.probe_duration(background_path)
+            except subprocess.CalledProcessError as e:
+                click.secho(
+                    f"Error getting background video duration:\n{e.stderr}",
+                    fg="red",
+                )
+                return None
+            except (ValueError, KeyError) as e:
+                click.secho(f"Error parsing background video duration: {e}", fg="red")
+                return None
+
+            if bg_duration < duration:
+                click.secho(
+                    "Background video is shorter than the audio, looping it.",
+                    fg="blue",
+                )
+        return duration, bg_duration
+
+    def build_command(
+        self,
+        output_file,
+        audio_file=None,
+        size="1920x1080",
+        fps=60,
+        duration=60,
+        background_path=None,
+        background_duration=None,
+        still_frames=False,
+    ):
+        # burn subtitles, fade and mux the audio in a single ffmpeg invocation
+        fade_filter = fade_filters(duration)
+        video_filter = f"{fade_filter},ass={self.filename}"
+        if background_path:
+            video_filter = f"{background_filter(size)},{video_filter}"
+        if still_frames:
+            # only keep frames while something on screen changes
+            intervals = still_frame_intervals(self.subs, duration, fps)
+            video_filter += f",select='{select_expression(intervals)}'"
+
+        cmd = ["ffmpeg", "-y"]
+        cmd += video_input_args(
+            background_path,
+            size,
+            fps,
+            duration,
+            background_duration=background_duration,
+        )
+        if audio_file:
+            cmd += ["-i", str(audio_file), "-map", "0:v:0", "-map", "1:a:0"]
+
+        cmd += [
+            "-t",
+            str(duration),  # cut background to audio length
+            "-vf",
+            video_filter,
+            "-c:v",
+            "libx264",
+            "-pix_fmt",
+            "yuv420p",
+        ]
+        if background_path:
+            cmd += ["-r", str(fps)]
+        if still_frames:
+            cmd += ["-fps_mode", "vfr", "-tune", "stillimage"]
+
+        if audio_file:
+            cmd += audio_codec_args(audio_file)
+            cmd += ["-shortest"]
+        cmd += [output_file]
+        return cmd
+
+    def layout(self, target):
+        """
+        Copy of the subtitles laid out for a target's frame: the script
+        resolution is the frame size, and fonts, outlines and margins are
+        scaled from the 384x288 default so the lyrics keep their size relative
+        to the shorter side of the frame.
+        """
+        width, height = (int(n) for n in target["size"].split("x"))
+        scale = min(width / 384, height / 288)
+        font_scale = scale * target.get("font_scale", 1.0)
+        subs = pysubs2.SSAFile()
+        subs.info = dict(self.subs.info, PlayResX=str(width), PlayResY=str(height))
+        for name, style in self.subs.styles.items():
+            style = style.copy()
+            style.fontsize = round(style.fontsize * font_scale, 1)
+            style.outline = round(style.outline * font_scale, 1)
+            style.shadow = round(style.shadow * font_scale, 1)
+            style.marginl = round(style.marginl * scale)
+            style.marginr = round(style.marginr * scale)
+            if target.get("margin") is not None:
+                style.marginv = round(target["margin"] * height)
             else:
-                os.rename(temp_video, output_file_name + ".mp4")
+                style.marginv = round(style.marginv * scale)
+            style.alignment = pysubs2.Alignment(targets.ALIGNMENTS[target["align"]])
+            subs.styles[name] = style
+        subs.events = [event.copy() for event in self.subs]
+        return subs
 
+    @profiler.profiled("render")
+    def render_targets(
+        self,
+        output_file_name,
+        output_targets,
+        audio_file=None,
+        duration=60,
+        background_path=None,
+        on_progress=None,
+        background_cache=None,
+    ):
+        """
+        Writes <output>_<name>.mp4 for every target (see targets.py) in one
+        ffmpeg run: the background and audio are decoded once and split into
+        one branch per target, each with its own subtitle layout. With a
+        background cache every target reads the proxy for its own size instead.
+        """
+        if not self.filename:
+            click.secho("Please save subtitles first.", fg="red")
+            return False
+        try:
+            targets.check_names(output_targets)
+        except ValueError as e:
+            click.secho(str(e), fg="red")
+            return False
+
+        try:
+            proxies = None
+            if background_path and background_cache is not None:
+                proxies = [
+                    background_proxy(
+                        background_path, target["size"], target["fps"], background_cache
+                    )
+                    for target in output_targets
+                ]
+            durations = self.probe_durations(audio_file, background_path, duration)
+            if durations is None:
+                return False
+            duration, bg_duration = durations
+
+            folder = Path(self.filename).parent
+            ass_files = []
+            for target in output_targets:
+                ass_file = str(folder / f"lyrics_{target['name']}.ass")
+                self.layout(target).save(ass_file)
+                ass_files.append(ass_file)
+
+            cmd, outputs = self.build_targets_command(
+                output_file_name,
+                output_targets,
+                ass_files,
+                audio_file=audio_file,
+                duration=duration,
+                background_path=background_path,
+                background_duration=bg_duration,
+                proxies=proxies,
+            )
+            click.secho(
+                f"Rendering {len(outputs)} outputs "
+                f"({', '.join(t['name'] for t in output_targets)})...",
+                fg="blue",
+            )
+            ffmpeg.ffmpeg_progress(cmd, duration, on_progress)
+            for output in outputs:
+                click.secho(f"Video saved to {output}", fg="green")
             return True
 
         except subprocess.CalledProcessError as e:
@@ -232,6 +378,441 @@ class VideoGenerator:
                 f"An unexpected error occurred during video rendering: {e}", fg="red"
             )
             return False
+
+    def build_targets_command(
+        self,
+        output_file_name,
+        output_targets,
+        ass_files,
+        audio_file=None,
+        duration=60,
+        background_path=None,
+        background_duration=None,
+        proxies=None,
+    ):
+        # [0:v]split -> scale/crop, fps, fade and subtitles per target; with
+        # proxies every target has its own, already scaled input instead
+        count = len(output_targets)
+        cmd = ["ffmpeg", "-y"]
+        if proxies:
+            for proxy in proxies:
+                cmd += video_input_args(
+                    proxy, None, None, duration, background_duration=background_duration
+                )
+            graph = []
+            sources = [f"[{i}:v]" for i in range(count)]
+        else:
+            fps = max(target["fps"] for target in output_targets)
+            cmd += video_input_args(
+                background_path,
+                output_targets[0]["size"],
+                fps,
+                duration,
+                background_duration=background_duration,
+            )
+            graph = [f"[0:v]split={count}" + "".join(f"[s{i}]" for i in range(count))]
+            sources = [f"[s{i}]" for i in range(count)]
+        audio_input = count if proxies else 1
+        if audio_file:
+            cmd += ["-i", str(audio_file)]
+
+        for i, (target, ass_file) in enumerate(zip(output_targets, ass_files)):
+            graph.append(
+                f"{sources[i]}{background_filter(target['size'])},fps={target['fps']},"
+                f"{fade_filters(duration)},ass={ass_file}[v{i}]"
+            )
+        cmd += ["-filter_complex", ";".join(graph)]
+
+        audio_args = audio_codec_args(audio_file) if audio_file else []
+        outputs = []
+        for i, target in enumerate(output_targets):
+            output = f"{output_file_name}_{target['name']}.mp4"
+            cmd += ["-map", f"[v{i}]"]
+            if audio_file:
+                cmd += ["-map", f"{audio_input}:a:0"]
+            cmd += ["-t", str(duration), "-c:v", "libx264"]
+            cmd += ["-crf", str(target["crf"]), "-pix_fmt", "yuv420p"]
+            if audio_file:
+                cmd += audio_args + ["-shortest"]
+            cmd += [output]
+            outputs.append(output)
+        return cmd, outputs
+
+    def report_still_savings(self, output_file, encode_time, **render_args):
+        # renders the constant frame rate equivalent for comparison
+        reference = str(Path(self.filename).parent / "cfr_reference.mp4")
+        cmd = self.build_command(reference, **render_args)
+        click.secho("Rendering constant frame rate reference...", fg="blue")
+        start_time = time.time()
+        try:
+            ffmpeg.ffmpeg_progress(cmd, render_args["duration"])
+            reference_time = time.time() - start_time
+            still_size = os.path.getsize(output_file)
+            reference_size = os.path.getsize(reference)
         finally:
-            if os.path.exists(temp_video):
-                os.remove(temp_video)
+            if os.path.exists(reference):
+                os.remove(reference)
+
+        click.secho(
+            f"Still-frame encode: {encode_time:.1f}s, {still_size / 1024**2:.2f} MB\n"
+            f"Constant {render_args['fps']} fps: {reference_time:.1f}s, "
+            f"{reference_size / 1024**2:.2f} MB\n"
+            f"Saved {reference_time - encode_time:.1f}s "
+            f"({(1 - encode_time / max(reference_time, 1e-9)) * 100:.0f}%) and "
+            f"{(reference_size - still_size) / 1024**2:.2f} MB "
+            f"({(1 - still_size / max(reference_size, 1)) * 100:.0f}%).",
+            fg="green",
+        )
+        return {
+            "still_time": encode_time,
+            "still_size": still_size,
+            "cfr_time": reference_time,
+            "cfr_size": reference_size,
+        }
+
+    def chunk_subtitles(self, start, end, filename):
+        # copy of the events inside [start, end) seconds, shifted to start at 0
+        start_ms, end_ms = int(start * 1000), int(end * 1000)
+        part = pysubs2.SSAFile()
+        part.info = dict(self.subs.info)
+        part.styles = {name: style.copy() for name, style in self.subs.styles.items()}
+        for event in self.subs:
+            if event.end > start_ms and event.start < end_ms:
+                part.append(event.copy())
+        part.shift(ms=-start_ms)
+        part.save(filename)
+        return filename
+
+    def render_segmented(
+        self,
+        output_file,
+        render_jobs,
+        audio_file=None,
+        size="1920x1080",
+        fps=60,
+        duration=60,
+        background_path=None,
+        background_duration=None,
+        silent_parts=None,
+        on_progress=None,
+    ):
+        # renders independent chunks in parallel ffmpeg processes and joins them
+        # with the concat demuxer, muxing the audio in the same (copy) pass
+        event_times = [(event.start / 1000, event.end / 1000) for event in self.subs]
+        cuts = split_points(duration, render_jobs, event_times, silent_parts, fps)
+        bounds = list(zip([0.0] + cuts, cuts + [duration]))
+        folder = Path(self.filename).parent
+        threads = max(1, (os.cpu_count() or 1) // len(bounds))
+
+        commands, parts = [], []
+        for index, (start, end) in enumerate(bounds):
+            ass_file = self.chunk_subtitles(
+                start, end, str(folder / f"lyrics_part{index}.ass")
+            )
+            part_file = str(folder / f"part{index}.mp4")
+            fade = fade_filters(
+                end - start, fade_in=index == 0, fade_out=index == len(bounds) - 1
+            )
+            filters = f"{fade},ass={ass_file}" if fade else f"ass={ass_file}"
+            if background_path:
+                filters = f"{background_filter(size)},{filters}"
+            cmd = ["ffmpeg", "-y", "-loglevel", "error"]
+            cmd += video_input_args(
+                background_path, size, fps, end - start, start, background_duration
+            )
+            cmd += [
+                "-t",
+                f"{end - start:.6f}",
+                "-vf",
+                filters,
+                "-c:v",
+                "libx264",
+                "-pix_fmt",
+                "yuv420p",
+                "-r",
+                str(fps),
+                "-threads",
+                str(threads),
+                "-an",
+                part_file,
+            ]
+            commands.append(cmd)
+            parts.append(part_file)
+
+        click.secho(
+            f"Rendering video in {len(bounds)} segments ({render_jobs} jobs)...",
+            fg="blue",
+        )
+        bar = ffmpeg.progress_bar(duration)
+        lock = threading.Lock()
+        segment_times = [0.0] * len(commands)
+
+        def segment_progress(index):
+            # the segments' progress adds up to the progress of the whole video
+            def update(event):
+                with lock:
+                    if event["out_time"] is not None:
+                        segment_times[index] = event["out_time"]
+                    event = dict(event, out_time=sum(segment_times), segment=index)
+                    event["percent"] = min(100.0, event["out_time"] / duration * 100)
+                    event["done"] = False
+                    bar(event)
+                    if on_progress:
+                        on_progress(event)
+
+            return update
+
+        try:
+            with ThreadPoolExecutor(max_workers=render_jobs) as pool:
+                futures = [
+                    pool.submit(
+                        ffmpeg.ffmpeg_progress,
+                        cmd,
+                        end - start,
+                        segment_progress(index),
+                        show_bar=False,
+                    )
+                    for index, (cmd, (start, end)) in enumerate(zip(commands, bounds))
+                ]
+                for future in futures:
+                    future.result()
+            bar.close()
+
+            list_file = folder / "parts.txt"
+            with open(list_file, "w") as f:
+                for part_file in parts:
+                    f.write(f"file '{Path(part_file).resolve().as_posix()}'\n")
+
+            cmd = ["ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", str(list_file)]
+            if audio_file:
+                cmd += ["-i", str(audio_file), "-map", "0:v:0", "-map", "1:a:0"]
+            cmd += ["-c:v", "copy"]
+            if audio_file:
+                cmd += audio_codec_args(audio_file) + ["-shortest"]
+            cmd += [output_file]
+            click.secho("Joining segments...", fg="blue")
+            ffmpeg.ffmpeg_progress(cmd, duration, on_progress)
+        finally:
+            bar.close()
+            for part_file in parts:
+                if os.path.exists(part_file):
+                    os.remove(part_file)
+        return True
+
+
+def segment_words(segment):
+    # words as {"start", "end", "word"} dicts, whether they came as tuples,
+    # lists (JSON) or dicts
+    words = segment["words"]
+    if words and isinstance(words[0], (tuple, list)):
+        words = [{"start": w[0], "end": w[1], "word": w[2]} for w in words]
+    return words
+
+
+def karaoke_text(words, fade_ms=100):
+    # karaoke highlighting
+    ass_text = ""
+    for i, w in enumerate(words):
+        duration_cs = int((w["end"] - w["start"]) * 100)
+        ass_text += f"{{\\K{duration_cs}}}" + w["word"]
+        if i < len(words) - 1:
+            ass_text += " "
+
+    return r"{\fad(" + str(fade_ms) + "," + str(fade_ms) + ")}" + ass_text
+
+
+def fade_filters(duration, fade_in=True, fade_out=True):
+    fades = []
+    if fade_in:
+        fades.append("fade=t=in:st=0:d=1")
+    if fade_out:
+        fades.append(f"fade=t=out:st={duration-1}:d=1")
+    return ",".join(fades)
+
+
+def video_input_args(
+    background_path, size, fps, duration, start=0.0, background_duration=None
+):
+    if background_path:
+        args = []
+        if background_duration and start + duration > background_duration:
+            # shorter backgrounds loop, a chunk starts at its place in the loop
+            args += ["-stream_loop", "-1"]
+            start %= background_duration
+        if start:
+            args += ["-ss", f"{start:.6f}"]
+        return args + ["-i", str(background_path)]
+    return ["-f", "lavfi", "-i", f"color=c=black:s={size}:d={duration}:r={fps}"]
+
+
+def background_filter(size):
+    # scales to cover the frame and crops what sticks out
+    width, height = size.split("x")
+    return (
+        f"scale={width}:{height}:force_original_aspect_ratio=increase,"
+        f"crop={width}:{height},setsar=1"
+    )
+
+
+def proxy_command(source, target, size, fps):
+    # keyframes every second keep seeking into the proxy cheap
+    return (
+        ["ffmpeg", "-y", "-i", str(source), "-an"]
+        + ["-vf", f"{background_filter(size)},fps={fps}"]
+        + PROXY_ENCODE_ARGS
+        + ["-g", str(fps), "-pix_fmt", "yuv420p", str(target)]
+    )
+
+
+def background_proxy(background_path, size, fps, cache):
+    """
+    The background scaled and re-encoded to size and fps, from the cache or
+    encoded (and cached) now.
+    """
+    key = cache.key(background_path, size, fps, " ".join(PROXY_ENCODE_ARGS))
+    proxy = cache.get(key)
+    if proxy is not None:
+        click.secho(f"Using cached background proxy {proxy}", fg="blue")
+        return proxy
+    with _proxy_lock(key):
+        # encoded by another render while this one waited
+        proxy = cache.get(key)
+        if proxy is not None:
+            return proxy
+        source_duration = ffmpeg.probe_duration(background_path)
+        click.secho(f"Creating {size} {fps} fps background proxy...", fg="blue")
+        with profiler.stage("background proxy", size=size, fps=fps):
+            return cache.put(
+                key,
+                lambda target: ffmpeg.ffmpeg_progress(
+                    proxy_command(background_path, target, size, fps),
+                    source_duration,
+                ),
+                source=str(background_path),
+                size=size,
+                fps=fps,
+            )
+
+
+def still_frame_intervals(subs, duration, fps=60):
+    """
+    Time ranges (seconds) in which the picture changes: the video fade in/out,
+    and for every subtitle event its fade in/out and the karaoke sweep.
+    Outside of these ranges every frame equals the one before it. Ranges are
+    padded by one frame and merged.
+    """
+    frame = 1.0 / fps
+    intervals = [(0.0, VIDEO_FADE), (duration - VIDEO_FADE, duration)]
+    for event in subs:
+        start, end = event.start / 1000, event.end / 1000
+        fade = FADE_TAG.search(event.text)
+        fade_in, fade_out = (
+            (int(fade.group(1)) / 1000, int(fade.group(2)) / 1000) if fade else (0, 0)
+        )
+        sweep = sum(int(cs) for cs in KARAOKE_TAG.findall(event.text)) / 100
+        intervals.append((start, min(end, start + max(fade_in, sweep))))
+        intervals.append((max(start, end - fade_out), end))
+
+    merged = []
+    for start, end in sorted(intervals):
+        start, end = max(0.0, start - frame), min(duration, end + frame)
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def select_expression(intervals):
+    # keeps frames inside the intervals plus the very first frame
+    terms = ["eq(n,0)"] + [
+        f"between(t,{start:.3f},{end:.3f})" for start, end in intervals
+    ]
+    return "+".join(terms)
+
+
+def split_points(duration, jobs, event_times, silent_parts=None, fps=60):
+    """
+    Picks up to jobs - 1 cut times, close to an even split of the timeline, that
+    fall where no subtitle event is on screen: in the middle of silent parts or
+    of the gaps between events. Cuts are snapped to the frame grid.
+    """
+    candidates = [(start + end) / 2 for start, end in silent_parts or []]
+    events = sorted(event_times)
+    for (_, prev_end), (next_start, _) in zip(events, events[1:]):
+        if next_start > prev_end:
+            candidates.append((prev_end + next_start) / 2)
+
+    def on_screen(t):
+        return any(start <= t < end for start, end in events)
+
+    candidates = sorted(
+        round(t * fps) / fps
+        for t in candidates
+        if 1.0 < t < duration - 1.0 and not on_screen(round(t * fps) / fps)
+    )
+
+    cuts = []
+    for i in range(1, jobs):
+        target = duration * i / jobs
+        remaining = [t for t in candidates if t not in cuts]
+        if not remaining:
+            break
+        cuts.append(min(remaining, key=lambda t: abs(t - target)))
+    return sorted(cuts)
+
+
+def audio_codec_args(audio_file):
+    # copy the audio stream when the mp4 container can take it as-is
+    try:
+        stream = ffmpeg.probe_stream(audio_file, "audio")
+    except (subprocess.CalledProcessError, ValueError, OSError):
+        stream = None
+    if stream and stream.get("codec_name") in MP4_COPY_AUDIO_CODECS:
+        return ["-c:a", "copy"]
+    return ["-c:a", "aac", "-b:a", "192k"]
+
+
+def render(
+    words, output, audio_file, temp_dir, background=None, work_dir=None, **options
+):
+    """
+    Generator backend: karaoke subtitles burnt in with ffmpeg. With a work dir
+    the subtitle file is checkpointed and reused on resume.
+    """
+    output_targets = options.pop("targets", None)
+    generator = VideoGenerator()
+    subtitles = None
+    if work_dir is not None:
+        subtitles = work_dir.restore("subtitles", "ps2")
+        if subtitles and not work_dir.file(subtitles["file"]).exists():
+            subtitles = None
+    if subtitles:
+        generator.load(work_dir.file(subtitles["file"]))
+    else:
+        for segment in words:
+            generator.add_words(segment)
+        filename = generator.save(work_dir.path if work_dir is not None else temp_dir)
+        if work_dir is not None:
+            work_dir.complete("subtitles", {"file": os.path.basename(filename)})
+    if output_targets:
+        # one ffmpeg run for all targets; render jobs and still frames only
+        # apply to single renders
+        success = generator.render_targets(
+            output,
+            output_targets,
+            audio_file=audio_file,
+            background_path=background,
+            on_progress=options.get("on_progress"),
+            background_cache=options.get("background_cache"),
+        )
+    else:
+        success = generator.render_video(
+            output_file_name=output,
+            audio_file=audio_file,
+            background_path=background,
+            **options,
+        )
+    if success:
+        click.secho("Video created using pysubs2 + ffmpeg.", fg="green")
+    return success
@@ -0,0 +1,131 @@
+import json
+import os
+import shutil
+from pathlib import Path
+
+import click
+
+from .cache import key_hash
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+# in pipeline order; every stage only runs once all earlier ones are recorded
+STAGES = ("stems", "vad", "transcript", "mapped", "aligned", "subtitles")
+
+
+class WorkDir:
+    """
+    Persistent per-job folder with a manifest of the completed pipeline stages.
+
+    Every stage is recorded together with a key that chains its own parameters
+    onto the key of the stage before it, so changing e.g. the Whisper model
+    invalidates the transcript and everything after it, but keeps the stems.
+    Without resume, an existing work folder is wiped and the job starts over.
+
+    Only folders holding a manifest are ever wiped, and only those the
+    manifest marks as created by lyriks are removed, also when a later run
+    reuses them. A folder that exists, isn't empty and has no manifest is
+    refused with a ValueError, and an empty one is emptied again but kept.
+    """
+
+    def __init__(self, path, resume=False):
+        self.path = Path(path)
+        self.resume = resume
+        self.manifest = {"version": MANIFEST_VERSION, "stages": {}}
+        if self.path.exists() and not self._owned():
+            if not self.path.is_dir() or any(self.path.iterdir()):
+                raise ValueError(
+                    f"{self.path} is not a lyriks work directory, "
+                    "choose an empty or new folder as --work-dir"
+                )
+        # removed with the job only if lyriks made it, now or in an earlier run
+        created = not self.path.exists()
+        previous = self._load() if self._owned() else None
+        if previous is not None:
+            created = created or previous.get("created", False)
+        if resume:
+            self.manifest = previous or self.manifest
+        elif self._owned():
+            self._wipe()
+        self.manifest["created"] = created
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._save()
+        self._keys = {}
+
+    @property
+    def manifest_path(self):
+        return self.path / MANIFEST_NAME
+
+    def _owned(self):
+        return self.manifest_path.is_file()
+
+    def _wipe(self):
+        for entry in self.path.iterdir():
+            if entry.is_dir() and not entry.is_symlink():
+                shutil.rmtree(entry, ignore_errors=True)
+            else:
+                entry.unlink(missing_ok=True)
+
+    def _load(self):
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            click.secho(f"Ignoring unreadable work manifest: {e}", fg="yellow")
+            return None
+        if manifest.get("version") != MANIFEST_VERSION:
+            return None
+        return manifest
+
+    def _save(self):
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def file(self, name):
+        return self.path / name
+
+    def restore(self, stage, *params):
+        """
+        Returns the data recorded for stage if it completed with the same
+        parameters and upstream stages, otherwise None. In that case the stage
+        and every later one are dropped from the manifest.
+        """
+        index = STAGES.index(stage)
+        previous = self._keys.get(STAGES[index - 1], "") if index else ""
+        key = key_hash(previous, stage, *params)
+        self._keys[stage] = key
+
+        entry = self.manifest["stages"].get(stage)
+        if entry is not None and entry["key"] == key:
+            return entry["data"]
+        if any(name in self.manifest["stages"] for name in STAGES[index:]):
+            for name in STAGES[index:]:
+                self.manifest["stages"].pop(name, None)
+            self._save()
+        return None
+
+    def complete(self, stage, data=None):
+        # restore() must have been called for this stage to compute its key
+        self.manifest["stages"][stage] = {"key": self._keys[stage], "data": data}
+        self._save()
+
+    def completed(self):
+        return [stage for stage in STAGES if stage in self.manifest["stages"]]
+
+    def remove(self):
+        if not self._owned():
+            return
+        if self.manifest.get("created"):
+            shutil.rmtree(self.path, ignore_errors=True)
+        else:
+            # a folder the user made: leave it empty, as it was
+            self._wipe()
+
+
+def default_path(output):
+    return Path(f"{output}.work")
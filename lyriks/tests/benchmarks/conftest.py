@@ -0,0 +1,72 @@
+import os
+
+import numpy as np
+import pytest
+
+# multiplies the size of every synthetic input, e.g. LYRIKS_BENCH_SCALE=10
+SCALE = float(os.environ.get("LYRIKS_BENCH_SCALE", 1))
+
+
+def make_song(seconds, samplerate=44100, channels=2, seed=0):
+    """
+    Vocals-like audio: phrases of a few harmonic tones over noise, separated by
+    silence gaps of 0.1-3 s. Returns (audio, phrases).
+    """
+    seconds *= SCALE
+    rng = np.random.default_rng(seed)
+    total = int(seconds * samplerate)
+    audio = np.zeros(total, np.float32)
+    phrases = []
+    position = rng.uniform(0.5, 2.0)
+    while position < seconds:
+        length = rng.uniform(0.5, 6.0)
+        start, end = int(position * samplerate), min(
+            total, int((position + length) * samplerate)
+        )
+        t = np.arange(end - start) / samplerate
+        pitch = rng.uniform(150, 600)
+        phrase = sum(
+            0.2 / harmonic * np.sin(2 * np.pi * pitch * harmonic * t)
+            for harmonic in (1, 2, 3)
+        )
+        audio[start:end] = phrase + 0.02 * rng.standard_normal(end - start)
+        phrases.append((start / samplerate, end / samplerate))
+        position += length + rng.uniform(0.1, 3.0)
+    # low background noise in the gaps, below the silence threshold
+    audio += 0.002 * rng.standard_normal(total).astype(np.float32)
+    return np.repeat(audio[:, None], channels, axis=1), phrases
+
+
+def make_transcript(segments, words_per_segment=6, seed=0):
+    # Whisper-style segments with (start, end, word) tuples, back to back
+    segments = max(1, int(segments * SCALE))
+    rng = np.random.default_rng(seed)
+    transcript = []
+    position = 0.0
+    for index in range(segments):
+        words = []
+        start = position
+        for word in range(words_per_segment):
+            length = rng.uniform(0.15, 0.6)
+            words.append((position, position + length, f"word{index}_{word}"))
+            position += length + rng.uniform(0.0, 0.2)
+        transcript.append(
+            {
+                "start": round(start, 2),
+                "end": round(words[-1][1], 2),
+                "text": " ".join(word for _, _, word in words),
+                "words": words,
+            }
+        )
+        position += rng.uniform(0.2, 2.0)
+    return transcript
+
+
+@pytest.fixture
+def synthetic_song():
+    return make_song
+
+
+@pytest.fixture
+def synthetic_transcript():
+    return make_transcript
@@ -0,0 +1,82 @@
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+pytest.importorskip("moviepy")
+pytest.importorskip("PIL")
+
+from moviepy import ColorClip, CompositeVideoClip, TextClip  # noqa: E402
+
+from lyriks.core.compositor import Compositor  # noqa: E402
+
+FONT = "DejaVuSans.ttf"
+SIZE = (1920, 1080)
+FRAMES = 24
+
+
+def song(transcript):
+    # every fourth line is the chorus, as in most songs
+    return [
+        ("Here comes the chorus again" if index % 4 == 3 else segment["text"],)
+        + (segment["start"], segment["end"])
+        for index, segment in enumerate(transcript)
+    ]
+
+
+def frame_times(lines):
+    duration = lines[-1][2]
+    return [duration * i / FRAMES for i in range(FRAMES)]
+
+
+def render_frames(make_frame, times):
+    for t in times:
+        make_frame(t)
+    return len(times)
+
+
+def record_fps(benchmark, frames):
+    # there are no stats with --benchmark-disable
+    if benchmark.stats is not None:
+        benchmark.extra_info["fps"] = frames / benchmark.stats.stats.mean
+
+
+@pytest.fixture
+def lines(synthetic_transcript):
+    try:
+        from PIL import ImageFont
+
+        ImageFont.truetype(FONT, 10)
+    except OSError:
+        pytest.skip("DejaVu Sans not installed")
+    return song(synthetic_transcript(40, words_per_segment=5))
+
+
+def test_moviepy_composite(benchmark, lines):
+    # the previous approach: one full-frame caption TextClip per line
+    clips = [ColorClip(size=SIZE, color=(0, 0, 0), duration=lines[-1][2])]
+    for text, start, end in lines:
+        clip = TextClip(
+            font=FONT,
+            text=text,
+            font_size=80,
+            color="white",
+            method="caption",
+            size=SIZE,
+        )
+        clips.append(clip.with_position("center").with_start(start).with_end(end))
+    video = CompositeVideoClip(clips)
+
+    # slow, a few rounds are enough
+    frames = benchmark.pedantic(
+        render_frames, args=(video.get_frame, frame_times(lines)), rounds=3
+    )
+    record_fps(benchmark, frames)
+
+
+def test_sprite_compositor(benchmark, lines):
+    compositor = Compositor(SIZE)
+    for text, start, end in lines:
+        compositor.add_text(text, start, end, FONT, 80, max_width=SIZE[0])
+
+    frames = benchmark(render_frames, compositor.make_frame, frame_times(lines))
+    record_fps(benchmark, frames)
+    assert compositor.sprites.misses == len({text for text, _, _ in lines})
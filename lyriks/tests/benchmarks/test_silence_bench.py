@@ -0,0 +1,43 @@
+import pytest
+import soundfile as sf
+
+from lyriks.core import silence
+from lyriks.core.timeline import map_segments
+
+pytest.importorskip("pytest_benchmark")
+
+
+def remove_silence(source, samplerate, output_file):
+    # what AudioProcessor.remove_silence does, without the models
+    parts, total_duration, sr = silence.detect_non_silent(source, samplerate)
+    silence.silent_gaps(parts, total_duration)
+    silence.write_regions(source, sr, parts, output_file)
+    return parts
+
+
+@pytest.mark.parametrize("seconds", [30, 180])
+def test_remove_silence_in_memory(benchmark, synthetic_song, tmp_path, seconds):
+    audio, phrases = synthetic_song(seconds)
+    parts = benchmark(remove_silence, audio, 44100, tmp_path / "no_silence.wav")
+    assert len(parts) == pytest.approx(len(phrases), rel=0.1)
+
+
+def test_remove_silence_from_file(benchmark, synthetic_song, tmp_path):
+    audio, phrases = synthetic_song(180)
+    vocals = tmp_path / "vocals.wav"
+    sf.write(vocals, audio, 44100)
+    parts = benchmark(remove_silence, vocals, None, tmp_path / "no_silence.wav")
+    assert len(parts) == pytest.approx(len(phrases), rel=0.1)
+
+
+@pytest.mark.parametrize("segments", [100, 2_000])
+def test_map_segments(benchmark, synthetic_transcript, segments):
+    transcript = synthetic_transcript(segments)
+    duration = transcript[-1]["end"]
+    # every 10 s of the silence-removed audio came after a 2 s pause
+    parts = [
+        (start * 1.2, start * 1.2 + 10.0) for start in range(0, int(duration) + 10, 10)
+    ]
+
+    mapped = benchmark(map_segments, transcript, parts)
+    assert len(mapped) == len(transcript)
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from lyriks.core.timeline import TimelineMap, map_segments
+
+pytest.importorskip("pytest_benchmark")
+
+
+def live_recording_regions(count, seed=0):
+    # many short phrases separated by pauses, like a long live recording
+    rng = np.random.default_rng(seed)
+    lengths = rng.uniform(0.2, 8.0, count)
+    gaps = rng.uniform(0.1, 3.0, count)
+    starts = np.cumsum(gaps + lengths) - lengths
+    return list(zip(starts, starts + lengths))
+
+
+@pytest.mark.parametrize("regions", [1_000, 10_000])
+def test_region_lookup(benchmark, regions):
+    # the vectorized core of map_segments, without building the segments
+    timeline = TimelineMap(live_recording_regions(regions))
+    # roughly five words per region
+    words = np.sort(np.random.default_rng(1).uniform(0, timeline.duration, 5 * regions))
+
+    def map_words():
+        index = timeline.region_index(words)
+        return timeline.to_original(words, index), timeline.to_original(
+            words + 0.3, index
+        )
+
+    starts, _ = benchmark(map_words)
+    assert not np.isnan(starts).any()
+
+
+@pytest.mark.parametrize("regions", [1_000, 10_000])
+def test_map_segments(benchmark, regions):
+    # what AudioProcessor.map_words_to_original runs on the Whisper output
+    parts = live_recording_regions(regions)
+    duration = TimelineMap(parts).duration
+    starts = np.sort(np.random.default_rng(1).uniform(0, duration - 1, 5 * regions))
+    segments = [
+        {
+            "start": float(chunk[0]),
+            "end": float(chunk[-1]) + 0.3,
+            "text": " ".join("word" for _ in chunk),
+            "words": [(float(t), float(t) + 0.3, "word") for t in chunk],
+        }
+        for chunk in np.array_split(starts, regions)
+    ]
+
+    mapped = benchmark(map_segments, segments, parts)
+    assert sum(len(segment["words"]) for segment in mapped) == 5 * regions
+
+
+def test_build_timeline(benchmark):
+    parts = live_recording_regions(10_000)
+    timeline = benchmark(TimelineMap, parts)
+    assert len(timeline) == 10_000
@@ -0,0 +1,51 @@
+import shutil
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from lyriks.core.video_generator_ps2 import VideoGenerator
+
+pytest.importorskip("pytest_benchmark")
+
+
+def build_subtitles(transcript):
+    generator = VideoGenerator()
+    for segment in transcript:
+        generator.add_words(segment)
+    return generator
+
+
+@pytest.mark.parametrize("segments", [100, 2_000])
+def test_add_words(benchmark, synthetic_transcript, segments):
+    transcript = synthetic_transcript(segments)
+    generator = benchmark(build_subtitles, transcript)
+    assert len(generator.subs) == len(transcript)
+
+
+def test_save(benchmark, synthetic_transcript, tmp_path):
+    generator = build_subtitles(synthetic_transcript(2_000))
+    filename = benchmark(generator.save, tmp_path)
+    assert filename.endswith("lyrics.ass")
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg not installed")
+def test_render_tiny_clip(benchmark, synthetic_transcript, tmp_path):
+    # 5 s at 160x90 and 10 fps: measures ffmpeg startup, subtitle burn-in and
+    # muxing rather than encoding throughput
+    transcript = [
+        s for s in synthetic_transcript(10, words_per_segment=3) if s["end"] < 5
+    ]
+    generator = build_subtitles(transcript)
+    generator.save(tmp_path)
+    audio = tmp_path / "song.wav"
+    sf.write(audio, np.zeros((5 * 44100, 2), np.float32), 44100)
+
+    rendered = benchmark.pedantic(
+        generator.render_video,
+        args=(str(tmp_path / "video"),),
+        kwargs={"audio_file": str(audio), "size": "160x90", "fps": 10},
+        rounds=3,
+    )
+    assert rendered
+    assert (tmp_path / "video.mp4").stat().st_size > 0
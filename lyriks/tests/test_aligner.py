@@ -0,0 +1,157 @@
+import time
+
+from lyriks.core import aligner
+
+LYRICS = """[Verse 1]
+Hello darkness, my old friend
+I've come to talk with you again
+
+(Chorus)
+Because a vision softly creeping
+"""
+
+
+def transcript(words):
+    # one Whisper segment per call, words as map_words_to_original tuples
+    return {
+        "text": " ".join(w[2] for w in words),
+        "start": words[0][0],
+        "end": words[-1][1],
+        "words": words,
+    }
+
+
+def test_exact_transcript_keeps_timing():
+    segments = [
+        transcript(
+            [
+                (1.0, 1.4, "Hello"),
+                (1.4, 2.0, "darkness,"),
+                (2.0, 2.2, "my"),
+                (2.2, 2.5, "old"),
+                (2.5, 3.0, "friend"),
+            ]
+        )
+    ]
+    result = aligner.align(segments, "Hello darkness, my old friend")
+
+    assert result == [
+        {
+            "text": "Hello darkness, my old friend",
+            "words": [
+                {"start": 1.0, "end": 1.4, "word": "Hello"},
+                {"start": 1.4, "end": 2.0, "word": "darkness,"},
+                {"start": 2.0, "end": 2.2, "word": "my"},
+                {"start": 2.2, "end": 2.5, "word": "old"},
+                {"start": 2.5, "end": 3.0, "word": "friend"},
+            ],
+            "start": 1.0,
+            "end": 3.0,
+        }
+    ]
+
+
+def test_misheard_missing_and_extra_words():
+    segments = [
+        transcript(
+            [
+                (1.0, 1.4, "hallo"),
+                (1.4, 2.0, "darknes"),
+                (2.5, 3.0, "friend"),
+            ]
+        ),
+        transcript(
+            [
+                (4.0, 4.3, "I"),
+                (4.3, 4.5, "uh"),
+                (4.5, 4.8, "come"),
+                (4.8, 5.0, "to"),
+                (5.0, 5.3, "talk"),
+                (5.3, 5.5, "with"),
+                (5.5, 5.7, "you"),
+                (5.7, 6.2, "again"),
+            ]
+        ),
+        transcript(
+            [
+                (7.0, 7.5, "Because"),
+                (7.5, 7.6, "a"),
+                (7.6, 8.0, "vision"),
+                (8.0, 8.5, "softly"),
+                (8.5, 9.0, "creeping"),
+            ]
+        ),
+    ]
+    result = aligner.align(segments, LYRICS)
+
+    # section headers are skipped, the text is taken from the lyrics
+    assert [s["text"] for s in result] == [
+        "Hello darkness, my old friend",
+        "I've come to talk with you again",
+        "Because a vision softly creeping",
+    ]
+    first = result[0]["words"]
+    assert first[0] == {"start": 1.0, "end": 1.4, "word": "Hello"}
+    assert first[1] == {"start": 1.4, "end": 2.0, "word": "darkness,"}
+    assert first[4] == {"start": 2.5, "end": 3.0, "word": "friend"}
+    # "my old" were not transcribed and are spread over the gap
+    assert first[2]["start"] == 2.0 and first[3]["end"] == 2.5
+    assert first[2]["end"] == first[3]["start"]
+
+    second = result[1]["words"]
+    assert second[1] == {"start": 4.5, "end": 4.8, "word": "come"}
+    assert result[2]["start"] == 7.0 and result[2]["end"] == 9.0
+
+
+def test_timing_is_monotonic():
+    words = [(i * 0.5, i * 0.5 + 0.4, w) for i, w in enumerate("la la la".split())]
+    result = aligner.align(
+        [transcript(words)], "la la la la la la\nsomething else entirely"
+    )
+
+    starts = [w["start"] for s in result for w in s["words"]]
+    assert starts == sorted(starts)
+    for segment in result:
+        assert segment["end"] > segment["start"]
+        for word in segment["words"]:
+            assert word["end"] >= word["start"]
+
+
+def test_empty_inputs():
+    assert aligner.align([], "some lyrics") is False
+    assert aligner.align([transcript([(0.0, 1.0, "hi")])], "[Intro]\n\n") is False
+
+
+def test_token_cost():
+    cache = {}
+    tokens = {w: aligner._Token(w) for w in ["Night", "night", "nite", "day"]}
+    assert aligner.token_cost(tokens["Night"], tokens["night"], cache) == 0.0
+    assert aligner.token_cost(tokens["night"], tokens["nite"], cache) == 0.25
+    assert (
+        aligner.token_cost(tokens["night"], tokens["day"], cache)
+        == aligner.MISMATCH_COST
+    )
+
+
+def test_long_lyrics_are_fast():
+    lines = [f"line number {i} of a very long song" for i in range(1000)]
+    lyrics = "\n".join(lines)
+    words = []
+    t = 0.0
+    for i, line in enumerate(lines):
+        for word in line.split():
+            # drop some words and mishear others
+            if (len(words) + i) % 17 == 0:
+                continue
+            words.append((round(t, 2), round(t + 0.2, 2), word + "s" * (i % 5 == 0)))
+            t += 0.25
+    segments = [transcript(words[i : i + 10]) for i in range(0, len(words), 10)]
+
+    start = time.perf_counter()
+    result = aligner.align(segments, lyrics)
+    elapsed = time.perf_counter() - start
+
+    assert len(result) == 1000
+    # the band follows the drift caused by the dropped words
+    assert result[-1]["end"] == words[-1][1]
+    assert elapsed < 5
@@ -0,0 +1,111 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("whisper_timestamped")
+pytest.importorskip("demucs")
+
+from lyriks.core import audio_processor  # noqa: E402
+from lyriks.core.models import ModelRegistry  # noqa: E402
+
+MB = 1024**2
+
+
+class FakeWhisper:
+    # a model of a given size that remembers which copy it is
+    def __init__(self, copy):
+        self.copy = copy
+        self.nbytes = 10 * MB
+
+
+def fake_registry(**limits):
+    copies = []
+
+    def load(name, device, dtype):
+        copies.append(FakeWhisper(len(copies)))
+        return copies[-1]
+
+    return ModelRegistry(loaders={"whisper": load}, **limits)
+
+
+def make_processor(**attributes):
+    # skips __init__, so no lyrics file or models are needed
+    processor = object.__new__(audio_processor.AudioProcessor)
+    processor.__dict__.update(
+        vocals=None,
+        vocals_file=None,
+        audio_file=None,
+        device="cpu",
+        language="en",
+        region_length=30.0,
+        transcribe_workers=None,
+        model_size="small",
+        dtype=None,
+        model_registry=fake_registry(),
+        _model=None,
+        _demucs_model=object(),
+    )
+    processor.__dict__.update(attributes)
+    return processor
+
+
+def test_regions_are_offset_into_original_timeline(monkeypatch):
+    sr = 16000
+    lengths = []
+
+    def fake_transcribe(model, audio, language):
+        lengths.append(len(audio) / sr)
+        return {
+            "segments": [
+                {
+                    "start": 0.5,
+                    "end": 1.0,
+                    "text": " hi",
+                    "words": [{"start": 0.5, "end": 1.0, "text": "hi"}],
+                }
+            ]
+        }
+
+    monkeypatch.setattr(audio_processor.whisper, "transcribe", fake_transcribe)
+    processor = make_processor(
+        vocals=np.zeros((sr * 100, 2), np.float32),
+        stem_samplerate=sr,
+        non_silent_parts=[(10.0, 12.0), (20.0, 25.0), (60.0, 65.0)],
+        total_duration=100.0,
+        transcribe_workers=2,
+    )
+
+    _, words = processor.transcribe_regions()
+
+    assert sorted(round(length, 1) for length in lengths) == [5.4, 15.4]
+    assert [segment["start"] for segment in words] == [10.3, 60.3]
+    assert words[1]["words"][0][:2] == pytest.approx((60.3, 60.8))
+    assert processor.map_words_to_original() == words
+
+
+def test_region_workers_use_registry_copies(monkeypatch):
+    sr = 16000
+    used = set()
+
+    def fake_transcribe(model, audio, language):
+        used.add(model.copy)
+        return {"segments": []}
+
+    monkeypatch.setattr(audio_processor.whisper, "transcribe", fake_transcribe)
+    registry = fake_registry(max_memory=25 * MB)
+    processor = make_processor(
+        vocals=np.zeros((sr * 200, 2), np.float32),
+        stem_samplerate=sr,
+        non_silent_parts=[(10.0, 12.0), (60.0, 65.0), (110.0, 115.0)],
+        total_duration=200.0,
+        transcribe_workers=3,
+        model_registry=registry,
+    )
+
+    processor.transcribe_regions()
+
+    # only two 10 MB copies fit in 25 MB, so only two workers run
+    assert used <= {0, 1}
+    copies = [m["copy"] for m in registry.stats()["models"]]
+    assert copies == [0, 1]
+    assert registry.stats()["resident_memory"] == 20 * MB
@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+from lyriks.core.batch import load_manifest, run_batch
+
+
+def test_load_csv_manifest(tmp_path):
+    manifest = tmp_path / "jobs.csv"
+    manifest.write_text(
+        "audio,lyrics,output,karaoke,generator\n"
+        "songs/a.mp3,lyrics/a.txt,out/a,yes,ts\n"
+        "songs/b.mp3,lyrics/b.txt,,,\n"
+    )
+    jobs = load_manifest(manifest)
+
+    assert len(jobs) == 2
+    assert jobs[0]["audio"] == tmp_path / "songs" / "a.mp3"
+    assert jobs[0]["output"] == str(tmp_path / "out" / "a")
+    assert jobs[0]["karaoke"] is True
+    assert jobs[0]["generator"] == "ts"
+    assert jobs[1]["output"] == str(tmp_path / "b")
+    assert jobs[1]["karaoke"] is False
+    assert jobs[1]["generator"] is None
+
+
+def test_load_json_manifest(tmp_path):
+    manifest = tmp_path / "jobs.json"
+    manifest.write_text(
+        json.dumps(
+            [
+                {
+                    "audio": "a.mp3",
+                    "lyrics": "a.txt",
+                    "no_gemini": True,
+                    "aligner": "local",
+                    "background": "bg.mp4",
+                }
+            ]
+        )
+    )
+    jobs = load_manifest(manifest)
+
+    assert jobs[0]["no_gemini"] is True
+    assert jobs[0]["aligner"] == "local"
+    assert jobs[0]["background"] == tmp_path / "bg.mp4"
+
+
+def test_manifest_requires_audio_and_lyrics(tmp_path):
+    manifest = tmp_path / "jobs.json"
+    manifest.write_text(json.dumps([{"audio": "a.mp3"}]))
+    with pytest.raises(ValueError):
+        load_manifest(manifest)
+
+
+def test_resuming_a_finished_batch(tmp_path):
+    jobs = [
+        {"audio": "a.mp3", "lyrics": "a.txt", "output": "a"},
+        {"audio": "b.mp3", "lyrics": "b.txt", "output": "b"},
+    ]
+    report_path = tmp_path / "report.json"
+    report_path.write_text(
+        json.dumps({"jobs": [dict(job, status="ok") for job in jobs]})
+    )
+
+    report = run_batch(jobs, "small", "cpu", report_path, resume=True)
+
+    assert [job["status"] for job in report["jobs"]] == ["ok", "ok"]
+    assert "resident_models" in report["models"]
+    assert json.loads(report_path.read_text())["models"] == report["models"]
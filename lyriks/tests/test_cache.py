@@ -0,0 +1,139 @@
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from lyriks.core.cache import AlignmentCache, BackgroundCache, StemCache, parse_size
+
+
+def test_parse_size():
+    assert parse_size("512") == 512
+    assert parse_size("2K") == 2048
+    assert parse_size("1.5G") == int(1.5 * 1024**3)
+    assert parse_size("10MB") == 10 * 1024**2
+    with pytest.raises(ValueError):
+        parse_size("lots")
+
+
+def test_stem_cache_roundtrip(tmp_path):
+    audio = tmp_path / "song.wav"
+    audio.write_bytes(b"not really audio")
+    cache = StemCache(tmp_path / "cache")
+
+    key = cache.key(audio, "htdemucs", 44100)
+    assert key == cache.key(audio, "htdemucs", 44100)
+    assert key != cache.key(audio, "htdemucs", 48000)
+    assert cache.get(key) is None
+
+    vocals = np.random.rand(1000, 2).astype(np.float32)
+    instrumental = np.random.rand(1000, 2).astype(np.float32)
+    cache.put(key, vocals, instrumental)
+
+    cached_vocals, cached_instrumental = cache.get(key)
+    assert isinstance(cached_vocals, np.memmap)
+    np.testing.assert_array_equal(cached_vocals, vocals)
+    np.testing.assert_array_equal(cached_instrumental, instrumental)
+
+
+def test_concurrent_stores_of_one_key_do_not_collide(tmp_path):
+    cache = StemCache(tmp_path / "cache")
+    barrier = threading.Barrier(4, timeout=10)
+    errors = []
+
+    def write(folder):
+        # every thread is inside its temporary folder at the same time
+        barrier.wait()
+        (folder / "value.txt").write_text(threading.current_thread().name)
+
+    def store():
+        try:
+            cache.store("same", write)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=store) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert (cache.lookup("same") / "value.txt").read_text().startswith("Thread")
+    assert [p.name for p in cache.directory.iterdir()] == ["same"]
+
+
+def test_stem_cache_evicts_least_recently_used(tmp_path):
+    stems = np.zeros((1000, 2), np.float32)
+    cache = StemCache(tmp_path / "cache", max_size="1G")
+    for i, key in enumerate(["a", "b", "c"]):
+        cache.put(key, stems, stems)
+        os.utime(cache.entry_path(key), (i, i))
+    entry_size = cache.size() // 3
+
+    cache.get("a")  # "a" becomes the most recently used entry
+    removed, _ = cache.prune(max_size=entry_size * 2)
+
+    assert removed == 1
+    assert cache.lookup("b") is None
+    assert cache.lookup("a") is not None
+    assert cache.lookup("c") is not None
+
+
+def test_alignment_cache_roundtrip_and_expiry(tmp_path):
+    cache = AlignmentCache(tmp_path / "cache", max_age=60)
+    segments = [{"text": "a", "words": [], "start": 0.0, "end": 1.0}]
+    key = cache.key("model", 1, [{"text": "a", "words": [(0.0, 1.0, "a")]}], "a")
+    assert key != cache.key("model", 2, [{"text": "a", "words": []}], "a")
+
+    cache.put(key, segments)
+    assert cache.get(key) == segments
+
+    path = cache.entry_path(key) / "alignment.json"
+    entry = json.loads(path.read_text())
+    entry["created"] = time.time() - 120
+    path.write_text(json.dumps(entry))
+    assert cache.get(key) is None
+    assert cache.lookup(key) is None
+
+
+def test_alignment_cache_has_its_own_size_limit(tmp_path, monkeypatch):
+    monkeypatch.setenv("LYRIKS_CACHE_MAX_SIZE", "50G")
+    assert StemCache(tmp_path / "stems").max_size == parse_size("50G")
+    assert AlignmentCache(tmp_path / "alignments").max_size == 100 * 1024**2
+
+    monkeypatch.setenv("LYRIKS_ALIGNMENT_MAX_SIZE", "10M")
+    assert AlignmentCache(tmp_path / "alignments").max_size == 10 * 1024**2
+
+
+def test_alignment_cache_prunes_expired_entries(tmp_path):
+    cache = AlignmentCache(tmp_path / "cache", max_age=60)
+    cache.put("fresh", [])
+    cache.put("broken", [])
+    (cache.entry_path("broken") / "alignment.json").write_text("{")
+
+    removed, _ = cache.prune()
+
+    assert removed == 1
+    assert cache.lookup("fresh") is not None
+
+
+def test_background_cache_key_and_roundtrip(tmp_path):
+    video = tmp_path / "bg.mp4"
+    video.write_bytes(b"not really video")
+    cache = BackgroundCache(tmp_path / "cache")
+
+    key = cache.key(video, "1920x1080", 60)
+    assert key != cache.key(video, "1280x720", 60)
+    assert key != cache.key(video, "1920x1080", 30)
+    assert cache.get(key) is None
+
+    proxy = cache.put(key, lambda target: target.write_bytes(b"proxy"), fps=60)
+    assert cache.get(key) == proxy
+    assert proxy.read_bytes() == b"proxy"
+
+    # a changed source is hashed again
+    video.write_bytes(b"another video")
+    assert cache.key(video, "1920x1080", 60) != key
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("PIL")
+
+from lyriks.core.compositor import Compositor, Sprite, rasterize  # noqa: E402
+
+FONT = "DejaVuSans.ttf"
+
+
+@pytest.fixture
+def font_path():
+    from PIL import ImageFont
+
+    try:
+        ImageFont.truetype(FONT, 10)
+    except OSError:
+        pytest.skip("DejaVu Sans not installed")
+    return FONT
+
+
+def square(color, alpha, size=4):
+    rgba = np.zeros((size, size, 4), np.uint8)
+    rgba[:, :, :3] = color
+    rgba[:, :, 3] = alpha
+    return Sprite(rgba, (0, 0), (size, size))
+
+
+def test_blending_and_clipping():
+    compositor = Compositor((10, 6), background=(0, 0, 100))
+    compositor.add(square((255, 0, 0), 255), 0, 1, (1, 1))
+    compositor.add(square((0, 255, 0), 128), 0, 2, (8, 4))  # half off screen
+    compositor.add(square((0, 0, 255), 255), 5, 6, (0, 0))
+
+    frame = compositor.make_frame(0.5)
+    assert frame.shape == (6, 10, 3) and frame.dtype == np.uint8
+    assert tuple(frame[2, 2]) == (255, 0, 0)
+    assert tuple(frame[5, 9]) == (0, 128, 50)
+    assert tuple(frame[0, 0]) == (0, 0, 100)
+    # sprites end at their end time
+    assert tuple(compositor.make_frame(1.5)[2, 2]) == (0, 0, 100)
+
+
+def test_background_frames_are_not_modified():
+    background = np.zeros((6, 10, 3), np.uint8)
+    compositor = Compositor((10, 6), background=lambda t: background)
+    compositor.add(square((255, 255, 255), 255), 0, 1, (0, 0))
+    assert compositor.make_frame(0).max() == 255
+    assert background.max() == 0
+
+
+def test_repeated_lines_are_rasterized_once(font_path):
+    compositor = Compositor((640, 360))
+    for start in range(0, 40, 10):
+        compositor.add_text("na na na", start, start + 5, font_path, 40)
+    compositor.add_text("na na na", 50, 55, font_path, 40, color="red")
+    assert (compositor.sprites.misses, compositor.sprites.hits) == (2, 3)
+
+    frame = compositor.make_frame(1)
+    rows, cols = np.nonzero(frame.max(axis=2))
+    # centered on the frame
+    assert abs((rows.min() + rows.max()) / 2 - 180) < 20
+    assert abs((cols.min() + cols.max()) / 2 - 320) < 5
+
+
+def test_sprites_are_cropped_and_wrapped(font_path):
+    line = rasterize("hello", font_path, 40)
+    wrapped = rasterize("hello hello hello", font_path, 40, max_width=150)
+    assert line.size[0] < 150 and line.size[1] < 40
+    assert wrapped.size[1] > 2 * line.size[1]
+    assert line.offset[1] > 0
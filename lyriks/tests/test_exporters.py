@@ -0,0 +1,93 @@
+import pysubs2
+
+from lyriks.core import exporters, pipeline
+from lyriks.core.video_generator_ps2 import VideoGenerator
+
+words = [
+    {
+        "text": " Hello world!",
+        "words": [(1.0, 1.5, "Hello"), (1.6, 2.0, "world!")],
+        "start": 1.0,
+        "end": 2.0,
+    },
+    {
+        "text": "This is a test.",
+        # JSON round trips turn the tuples into lists
+        "words": [[61.0, 61.3, "This"], [61.4, 61.6, "is"], [61.7, 62.5, "a test."]],
+        "start": 61.0,
+        "end": 62.5,
+    },
+]
+
+
+def read(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def test_all_formats_in_one_pass(tmp_path):
+    output = str(tmp_path / "song")
+    paths = exporters.export(words, output)
+    assert paths == [output + suffix for suffix in (".srt", ".vtt", ".lrc", ".ass")]
+
+    assert read(output + ".srt") == (
+        "1\n00:00:01,000 --> 00:00:02,000\nHello world!\n\n"
+        "2\n00:01:01,000 --> 00:01:02,500\nThis is a test.\n\n"
+    )
+    assert read(output + ".vtt") == (
+        "WEBVTT\n\n"
+        "00:00:01.000 --> 00:00:02.000\nHello <00:00:01.600>world!\n\n"
+        "00:01:01.000 --> 00:01:02.500\n"
+        "This <00:01:01.400>is <00:01:01.700>a test.\n\n"
+    )
+    assert read(output + ".lrc").splitlines() == [
+        "[re:Lyriks]",
+        "[00:01.00]<00:01.00>Hello <00:01.60>world!<00:02.00>",
+        "[01:01.00]<01:01.00>This <01:01.40>is <01:01.70>a test.<01:02.50>",
+    ]
+
+
+def test_ass_matches_the_ps2_subtitles(tmp_path):
+    output = str(tmp_path / "song")
+    exporters.export(words, output, ["ass"])
+    subs = pysubs2.load(output + ".ass")
+    assert [(event.start, event.end) for event in subs] == [
+        (1000, 2000),
+        (61000, 62500),
+    ]
+    generator = VideoGenerator()
+    for segment in words:
+        generator.add_words(segment)
+    assert [event.text for event in subs] == [event.text for event in generator.subs]
+    assert subs.styles["Default"].fontname == "Comic Sans MS"
+
+
+def test_generators_can_be_combined(tmp_path, monkeypatch):
+    passes = []
+    export = exporters.export
+    monkeypatch.setattr(
+        exporters, "export", lambda *args: passes.append(args) or export(*args)
+    )
+    output = str(tmp_path / "song")
+
+    assert pipeline.render(words, "srt, vtt,ts", output, None, tmp_path)
+
+    assert len(passes) == 1
+    for suffix in (".srt", ".vtt", ".json"):
+        assert (tmp_path / f"song{suffix}").exists()
+    assert pipeline.output_files("srt, vtt,ts", output) == [
+        f"{output}.srt",
+        f"{output}.vtt",
+        f"{output}.json",
+    ]
+    assert not pipeline.render(words, "srt,gif", output, None, tmp_path)
+
+
+def test_output_files_of_multi_target_renders():
+    targets = [{"name": "720p"}, {"name": "vertical"}]
+    assert pipeline.output_files("ps2,srt", "song", targets) == [
+        "song_720p.mp4",
+        "song_vertical.mp4",
+        "song.srt",
+    ]
+    assert pipeline.output_files("ps2", "song") == ["song.mp4"]
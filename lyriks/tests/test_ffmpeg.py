@@ -0,0 +1,83 @@
+import subprocess
+import sys
+
+import pytest
+
+from lyriks.core import ffmpeg
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="shebang script")
+
+FAKE_FFMPEG = """\
+#!{python}
+import sys, time
+assert sys.argv[1:4] == ["-progress", "pipe:1", "-nostats"], sys.argv
+blocks, fail = int(sys.argv[4]), sys.argv[5] == "fail"
+for index in range(5000):
+    print(f"stderr line {{index}}", file=sys.stderr)
+for frame in range(1, blocks + 1):
+    end = frame == blocks
+    print(f"frame={{frame * 60}}\\nfps=59.5\\nbitrate= 512.3kbits/s\\n"
+          f"total_size={{frame * 1000}}\\nout_time_us={{frame * 1000000}}\\n"
+          f"out_time=00:00:0{{frame}}.000000\\nspeed=2.01x\\n"
+          f"progress={{'end' if end else 'continue'}}", flush=True)
+    time.sleep(0.01)
+sys.exit(1 if fail else 0)
+"""
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path):
+    path = tmp_path / "ffmpeg"
+    path.write_text(FAKE_FFMPEG.format(python=sys.executable))
+    path.chmod(0o755)
+    return str(path)
+
+
+def test_progress_events(fake_ffmpeg):
+    events = []
+    ffmpeg.ffmpeg_progress([fake_ffmpeg, "4", "ok"], 8.0, events.append)
+
+    assert [event["frame"] for event in events] == [60, 120, 180, 240]
+    assert events[1] == {
+        "frame": 120,
+        "fps": 59.5,
+        "speed": 2.01,
+        "out_time": 2.0,
+        "bitrate": 512.3,
+        "total_size": 2000,
+        "done": False,
+        "percent": 25.0,
+    }
+    assert events[-1]["done"]
+
+
+def test_only_the_end_of_stderr_is_kept(fake_ffmpeg):
+    with pytest.raises(subprocess.CalledProcessError) as error:
+        ffmpeg.ffmpeg_progress([fake_ffmpeg, "1", "fail"], 1.0, stderr_lines=10)
+    lines = error.value.stderr.splitlines()
+    assert lines == [f"stderr line {index}" for index in range(4990, 5000)]
+
+
+def test_callback_can_stop_ffmpeg(fake_ffmpeg):
+    def cancel(event):
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        ffmpeg.ffmpeg_progress([fake_ffmpeg, "100", "ok"], 100.0, cancel)
+
+
+def test_missing_values():
+    event = ffmpeg.parse_progress(
+        {
+            "frame": "0",
+            "fps": "0.00",
+            "bitrate": "N/A",
+            "out_time_us": "N/A",
+            "out_time": "N/A",
+            "speed": "N/A",
+            "progress": "continue",
+        },
+        10.0,
+    )
+    assert event["bitrate"] is None and event["speed"] is None
+    assert event["out_time"] is None and event["percent"] is None
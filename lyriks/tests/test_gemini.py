@@ -0,0 +1,161 @@
+import pytest
+
+pytest.importorskip("google.genai")
+
+from lyriks.core import gemini  # noqa: E402
+from lyriks.core.cache import AlignmentCache  # noqa: E402
+from lyriks.core.fake_gemini import FakeGemini  # noqa: E402
+
+
+def transcript(count):
+    segments = []
+    for i in range(count):
+        start = i * 3.0
+        segments.append(
+            {
+                "text": f" line {i}",
+                "start": start,
+                "end": start + 2.0,
+                "words": [
+                    (start, start + 1.0, "line"),
+                    (start + 1.0, start + 2.0, str(i)),
+                ],
+            }
+        )
+    return segments
+
+
+@pytest.fixture(autouse=True)
+def api_key(monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    monkeypatch.delenv("GEMINI_BASE_URL", raising=False)
+
+
+def test_chunk_transcript_overlaps():
+    chunks = gemini.chunk_transcript(
+        transcript(10), chunk_segments=4, overlap_segments=1
+    )
+    assert [len(chunk["core"]) for chunk in chunks] == [4, 4, 2]
+    assert [len(chunk["context"]) for chunk in chunks] == [5, 6, 3]
+    assert chunks[1]["start"] == 12.0
+
+
+def test_chunks_are_merged_in_order():
+    segments = transcript(25)
+    with FakeGemini(delay=0.05) as fake:
+        result = gemini.generate(
+            segments,
+            "lyrics",
+            chunk_segments=4,
+            overlap_segments=2,
+            max_in_flight=3,
+            base_url=fake.base_url,
+        )
+
+    assert [segment["text"] for segment in result] == [f"line {i}" for i in range(25)]
+    assert result[3]["words"][1] == {"start": 10.0, "end": 11.0, "word": "3"}
+    assert fake.requests == 7
+    assert 1 < fake.max_in_flight <= 3
+
+
+def test_failed_and_truncated_responses_are_retried():
+    with FakeGemini(fail_first=2, truncate_first=1) as fake:
+        result = gemini.generate(
+            transcript(4),
+            "lyrics",
+            chunk_segments=10,
+            backoff=0.01,
+            base_url=fake.base_url,
+        )
+    assert len(result) == 4
+    assert fake.requests == 4
+
+
+def test_alignment_fails_when_a_chunk_runs_out_of_retries():
+    with FakeGemini(fail_always=True) as fake:
+        result = gemini.generate(
+            transcript(4), "lyrics", retries=1, backoff=0.01, base_url=fake.base_url
+        )
+    assert result is False
+    assert fake.requests == 2
+
+
+def test_failed_chunks_keep_whisper_segments_as_word_dicts():
+    with FakeGemini(fail_first=1) as fake:
+        result = gemini.generate(
+            transcript(4),
+            "lyrics",
+            chunk_segments=2,
+            max_in_flight=1,
+            retries=0,
+            base_url=fake.base_url,
+        )
+    assert len(result) == 4
+    # one chunk fell back to Whisper, the words look the same everywhere
+    assert {" line" in segment["text"] for segment in result} == {True, False}
+    words = [word for segment in result for word in segment["words"]]
+    assert all(set(word) == {"start", "end", "word"} for word in words)
+
+
+def test_client_errors_are_not_retried():
+    with FakeGemini(fail_always=True, fail_status=403) as fake:
+        assert (
+            gemini.generate(
+                transcript(2), "lyrics", backoff=0.01, base_url=fake.base_url
+            )
+            is False
+        )
+    assert fake.requests == 1
+
+
+def test_alignments_are_cached(tmp_path):
+    cache = AlignmentCache(tmp_path / "cache")
+    segments = transcript(10)
+    with FakeGemini() as fake:
+        first = gemini.generate(
+            segments, "lyrics", chunk_segments=4, cache=cache, base_url=fake.base_url
+        )
+        second = gemini.generate(
+            segments, "lyrics", chunk_segments=4, cache=cache, base_url=fake.base_url
+        )
+        assert fake.requests == 3
+        assert second == first
+
+        gemini.generate(
+            segments,
+            "other lyrics",
+            chunk_segments=4,
+            cache=cache,
+            base_url=fake.base_url,
+        )
+        assert fake.requests == 6
+
+        gemini.generate(
+            segments,
+            "lyrics",
+            chunk_segments=4,
+            cache=cache,
+            refresh=True,
+            base_url=fake.base_url,
+        )
+        assert fake.requests == 9
+
+
+def test_failed_chunks_are_not_cached(tmp_path):
+    cache = AlignmentCache(tmp_path / "cache")
+    with FakeGemini(fail_always=True) as fake:
+        gemini.generate(
+            transcript(4),
+            "lyrics",
+            retries=0,
+            cache=cache,
+            base_url=fake.base_url,
+        )
+    assert cache.entries() == []
+
+
+def test_parse_response_rejects_malformed_json():
+    with pytest.raises(ValueError):
+        gemini.parse_response('[{"text": "a"')
+    with pytest.raises(ValueError):
+        gemini.parse_response('[{"text": "a"}]')
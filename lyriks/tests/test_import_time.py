@@ -0,0 +1,66 @@
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+
+# heavy dependencies the CLI must only import once a command needs them
+HEAVY_MODULES = [
+    "torch",
+    "torchaudio",
+    "whisper",
+    "whisper_timestamped",
+    "demucs",
+    "google.genai",
+    "moviepy",
+    "matplotlib",
+    "PIL",
+    "questionary",
+    "numpy",
+    "pysubs2",
+]
+
+# generous for slow CI machines; set LYRIKS_IMPORT_BUDGET_MS to tighten it
+BUDGET_MS = float(os.environ.get("LYRIKS_IMPORT_BUDGET_MS", 300))
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def import_times(statement):
+    # cumulative import time in microseconds per top-level module
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            times[match.group(4)] = int(match.group(2))
+    return times
+
+
+@pytest.mark.parametrize("module", ["lyriks.cli", "lyriks.core.pipeline"])
+def test_no_heavy_imports(module):
+    times = import_times(f"import {module}")
+    loaded = [name for name in HEAVY_MODULES if name in times]
+    assert loaded == []
+
+
+def test_cli_import_budget():
+    # best of a few runs, so a busy machine doesn't fail the test
+    best = min(import_times("import lyriks.cli")["lyriks.cli"] for _ in range(3))
+    assert best / 1000 < BUDGET_MS
+
+
+def test_help_runs_without_backends():
+    result = subprocess.run(
+        [sys.executable, "-m", "lyriks", "generate", "--help"],
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0
+    assert "--aligner [gemini|local]" in result.stdout
@@ -0,0 +1,120 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from lyriks.core.models import ModelRegistry
+
+MB = 1024**2
+
+
+class FakeLoader:
+    def __init__(self, sizes, delay=0.0):
+        self.sizes = sizes
+        self.delay = delay
+        self.loaded = []
+
+    def __call__(self, name, device, dtype):
+        time.sleep(self.delay)
+        self.loaded.append((name, device, dtype))
+        return np.zeros(self.sizes[name], np.uint8)
+
+
+def make_registry(sizes, **limits):
+    loader = FakeLoader(sizes)
+    return ModelRegistry(loaders={"whisper": loader}, **limits), loader
+
+
+def test_models_are_loaded_once_per_key():
+    registry, loader = make_registry({"small": MB, "base": MB})
+
+    small = registry.get("whisper", "small")
+    assert registry.get("whisper", "small") is small
+    registry.get("whisper", "small", device="cuda")
+    registry.get("whisper", "small", dtype="float16")
+    registry.get("whisper", "base")
+
+    assert len(loader.loaded) == 4
+    stats = registry.stats()
+    assert stats["resident_models"] == 4
+    assert stats["resident_memory"] == 4 * MB
+    first = stats["models"][0]
+    assert (first["name"], first["loads"], first["hits"]) == ("small", 1, 1)
+    assert first["memory"] == MB
+
+
+def test_least_recently_used_model_is_evicted():
+    registry, loader = make_registry(
+        {"tiny": MB, "small": MB, "base": MB}, max_models=2
+    )
+    registry.get("whisper", "tiny")
+    registry.get("whisper", "small")
+    registry.get("whisper", "tiny")
+    registry.get("whisper", "base")
+
+    resident = {m["name"] for m in registry.stats()["models"] if m["resident"]}
+    assert resident == {"tiny", "base"}
+    registry.get("whisper", "small")
+    assert [name for name, _, _ in loader.loaded] == ["tiny", "small", "base", "small"]
+
+
+def test_memory_limit():
+    registry, _ = make_registry(
+        {"small": 2 * MB, "medium": 5 * MB, "large": 8 * MB}, max_memory=8 * MB
+    )
+    registry.get("whisper", "small")
+    registry.get("whisper", "medium")
+    assert registry.stats()["resident_memory"] == 7 * MB
+
+    # too big to share: everything else goes, the model is still loaded
+    registry.get("whisper", "large")
+    stats = registry.stats()
+    assert stats["resident_models"] == 1
+    assert stats["resident_memory"] == 8 * MB
+
+    # known sizes make room before loading
+    registry.get("whisper", "small")
+    assert registry.stats()["resident_memory"] == 2 * MB
+
+
+def test_copies_are_separate_models_within_the_limits():
+    registry, loader = make_registry({"small": 2 * MB}, max_memory=4 * MB)
+    small = registry.get("whisper", "small")
+    copy = registry.get("whisper", "small", copy=1)
+
+    assert copy is not small
+    assert registry.get("whisper", "small", copy=1) is copy
+    assert len(loader.loaded) == 2
+    assert [m["copy"] for m in registry.stats()["models"]] == [0, 1]
+
+    # a copy counts towards the limits like any other model
+    registry.get("whisper", "small", copy=2)
+    stats = registry.stats()
+    assert stats["resident_memory"] == 4 * MB
+    assert [m["copy"] for m in stats["models"] if m["resident"]] == [1, 2]
+
+
+def test_concurrent_requests_load_once():
+    loader = FakeLoader({"small": MB}, delay=0.05)
+    registry = ModelRegistry(loaders={"whisper": loader})
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(registry.get("whisper", "small"))
+        )
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(loader.loaded) == 1
+    assert all(model is results[0] for model in results)
+
+
+def test_unknown_kind():
+    registry, _ = make_registry({})
+    with pytest.raises(KeyError):
+        registry.get("wav2vec", "base")
@@ -0,0 +1,86 @@
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from lyriks.core import profiler
+
+MB = 1024**2
+
+
+@pytest.fixture
+def active():
+    yield profiler.enable()
+    profiler.disable()
+
+
+def test_stages_are_recorded(active, tmp_path):
+    with profiler.stage("separation", model="htdemucs"):
+        with profiler.stage("decode"):
+            pass
+    with profiler.stage("decode"):
+        pass
+
+    rows = {row["name"]: row for row in active.summary()}
+    assert list(rows) == ["separation", "decode"]
+    assert rows["decode"]["calls"] == 2
+    assert rows["separation"]["wall"] >= rows["decode"]["wall"] / 2
+    assert rows["separation"]["peak_rss"] > 0
+    assert "separation" in active.summary_table()
+
+    trace = json.loads(open(active.save(tmp_path / "trace.json")).read())
+    stages = [e for e in trace["traceEvents"] if e["ph"] == "X"]
+    assert [e["name"] for e in stages] == ["separation", "decode", "decode"]
+    assert stages[0]["args"]["model"] == "htdemucs"
+    assert all(e["dur"] >= 0 and e["pid"] == os.getpid() for e in stages)
+
+    if not os.path.exists("/proc/self/clear_refs"):
+        return  # only Linux can reset the peak between stages
+    with profiler.stage("mapping"):
+        block = np.ones(200 * MB // 8)
+        del block
+    with profiler.stage("alignment"):
+        pass
+    rows = {row["name"]: row for row in active.summary()}
+    # a later small stage doesn't inherit the earlier large peak...
+    assert rows["mapping"]["peak_rss"] - rows["alignment"]["peak_rss"] > 150 * MB
+    # ...but the enclosing stage does keep the peaks of its inner stages
+    with profiler.stage("rendering"):
+        with profiler.stage("decode"):
+            block = np.ones(200 * MB // 8)
+            del block
+    rows = {row["name"]: row for row in active.summary()}
+    assert rows["rendering"]["peak_rss"] - rows["alignment"]["peak_rss"] > 150 * MB
+
+
+def test_child_processes_count_towards_cpu(active):
+    with profiler.stage("render"):
+        subprocess.run(
+            [sys.executable, "-c", "sum(i * i for i in range(3_000_000))"],
+            check=True,
+        )
+    assert active.summary()[0]["cpu"] > 0.05
+
+
+def test_decorator_records_only_when_enabled():
+    @profiler.profiled("mapping")
+    def mapping(x):
+        return x + 1
+
+    assert mapping(1) == 2
+    active = profiler.enable()
+    try:
+        assert mapping(2) == 3
+    finally:
+        profiler.disable()
+    assert [row["name"] for row in active.summary()] == ["mapping"]
+
+
+def test_exceptions_still_end_the_stage(active):
+    with pytest.raises(ValueError):
+        with profiler.stage("alignment"):
+            raise ValueError
+    assert active.summary()[0]["calls"] == 1
@@ -0,0 +1,23 @@
+import sys
+
+import pytest
+
+from lyriks.core.registry import ALIGNERS, GENERATORS, Registry
+
+
+def test_backends_are_imported_on_first_use(monkeypatch):
+    monkeypatch.delitem(sys.modules, "lyriks.core.aligner", raising=False)
+    registry = Registry("aligner")
+    registry.register("local", "lyriks.core.aligner:align")
+    assert "lyriks.core.aligner" not in sys.modules
+
+    align = registry.get("local")
+
+    assert "lyriks.core.aligner" in sys.modules
+    assert align is sys.modules["lyriks.core.aligner"].align
+
+
+def test_unknown_names():
+    with pytest.raises(KeyError, match="choose from ps2, mp, ts"):
+        GENERATORS.get("gif")
+    assert "local" in ALIGNERS and "gemini" in ALIGNERS
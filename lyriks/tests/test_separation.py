@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+import soundfile as sf
+
+separation = pytest.importorskip("lyriks.core.separation")
+
+
+def test_crossfade_writer_reassembles_overlapping_windows(tmp_path):
+    samplerate, overlap, window = 100, 20, 200
+    signal = np.random.rand(1000, 2).astype(np.float32)
+
+    path = tmp_path / "out.wav"
+    writer = separation._CrossfadeWriter(path, samplerate, 2, overlap)
+    for start in range(0, len(signal), window - overlap):
+        writer.write(signal[start : start + window].copy())
+        if start + window >= len(signal):
+            break
+    writer.close()
+
+    written, _ = sf.read(path, dtype="float32")
+    assert written.shape == signal.shape
+    np.testing.assert_allclose(written, signal, atol=1e-6)
+
+
+def test_window_seconds_grows_with_budget():
+    small = separation.window_seconds(2 * 1024**3, 44100, 2, 4)
+    large = separation.window_seconds(8 * 1024**3, 44100, 2, 4)
+    assert large > small >= separation.MIN_WINDOW_SECONDS
+
+
+class FakeModel:
+    # "separates" by scaling the mix, one factor per source
+    def __init__(self, scales, sources=("drums", "bass", "other", "vocals")):
+        self.sources = list(sources)
+        self.scales = scales
+
+
+class FakeBag:
+    def __init__(self, models, weights):
+        self.sources = models[0].sources
+        self.models = models
+        self.weights = weights
+
+
+def fake_apply_model(calls):
+    torch = pytest.importorskip("torch")
+
+    def apply_model(model, wav, device=None, **options):
+        calls.append((model, options))
+        return torch.stack([wav[0] * scale for scale in model.scales])[None]
+
+    return apply_model
+
+
+def test_two_stem_fast_path_runs_only_the_vocal_model(monkeypatch):
+    torch = pytest.importorskip("torch")
+    calls = []
+    monkeypatch.setattr(separation, "apply_model", fake_apply_model(calls))
+    specialists = [FakeModel([0.1, 0.2, 0.3, 0.4]) for _ in range(4)]
+    weights = [[1.0 if i == j else 0.0 for j in range(4)] for i in range(4)]
+    bag = FakeBag(specialists, weights)
+    wav = torch.ones(1, 2, 100)
+
+    vocals, instrumental = separation.separate(
+        bag, wav, separation.separators.parse_separator("htdemucs_ft,shifts=0")
+    )
+
+    assert [model for model, _ in calls] == [specialists[3]]
+    assert calls[0][1]["shifts"] == 0
+    torch.testing.assert_close(vocals, torch.full((2, 100), 0.4))
+    torch.testing.assert_close(instrumental, torch.full((2, 100), 0.6))
+
+
+def test_all_stems_sums_the_other_sources(monkeypatch):
+    torch = pytest.importorskip("torch")
+    calls = []
+    monkeypatch.setattr(separation, "apply_model", fake_apply_model(calls))
+    model = FakeModel([0.1, 0.2, 0.3, 0.4])
+
+    vocals, instrumental = separation.separate(
+        model, torch.ones(1, 2, 100), separation.separators.DEFAULT
+    )
+
+    assert len(calls) == 1
+    torch.testing.assert_close(instrumental, torch.full((2, 100), 0.6))
+
+
+def test_vocals_sdr():
+    reference = np.ones((2, 1000), np.float32)
+    assert separation.vocals_sdr(reference, reference) == float("inf")
+    assert separation.vocals_sdr(reference, reference * 0.9) == pytest.approx(20.0)
@@ -0,0 +1,36 @@
+import pytest
+
+from lyriks.core.separators import DEFAULT, label, parse_separator
+
+
+def test_default_label_is_the_model():
+    assert label(DEFAULT) == "htdemucs"
+    assert parse_separator("htdemucs") == DEFAULT
+
+
+def test_overrides():
+    separator = parse_separator("htdemucs_ft, shifts=0, overlap=0.1, segment=7")
+    assert separator["model"] == "htdemucs_ft"
+    assert (separator["shifts"], separator["overlap"], separator["segment"]) == (
+        0,
+        0.1,
+        7.0,
+    )
+    assert label(separator) == "htdemucs_ft,segment=7.0,overlap=0.1,shifts=0"
+
+
+@pytest.mark.parametrize(
+    "spec",
+    [
+        "",
+        "htdemucs,shifts",
+        "htdemucs,speed=2",
+        "htdemucs,stems=drums",
+        "htdemucs,overlap=1",
+        "htdemucs,shifts=-1",
+        "htdemucs,segment=0",
+    ],
+)
+def test_invalid_separators(spec):
+    with pytest.raises(ValueError):
+        parse_separator(spec)
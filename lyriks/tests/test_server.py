@@ -0,0 +1,255 @@
+import http.client
+import json
+import socket
+import sys
+import threading
+import time
+
+import pytest
+
+from lyriks.core import server
+
+
+class FakePipeline:
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.release = threading.Event()
+        self.release.set()
+        self.analyzed = []
+        self.rendered = []
+
+    def analyze(self, job, worker):
+        self.release.wait()
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("no vocals found")
+        self.analyzed.append(job["output"])
+        return "words"
+
+    def render(self, job, state, on_progress):
+        assert state == "words"
+        on_progress({"out_time": 1.0, "percent": 50.0})
+        with open(job["output"] + ".mp4", "wb") as f:
+            f.write(b"video")
+        self.rendered.append(job["output"])
+
+
+class UnixConnection(http.client.HTTPConnection):
+    def __init__(self, path):
+        super().__init__("localhost")
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+
+
+@pytest.fixture
+def running(tmp_path):
+    servers = []
+
+    def start(pipeline, socket_path=None, **options):
+        job_server = server.JobServer(
+            pipeline.analyze,
+            pipeline.render,
+            output_dir=tmp_path / "out",
+            **options,
+        )
+        http_server = server.make_http_server(
+            job_server, port=0, socket_path=socket_path
+        )
+        job_server.start()
+        threading.Thread(target=http_server.serve_forever, daemon=True).start()
+        servers.append((job_server, http_server))
+        if socket_path:
+            connect = lambda: UnixConnection(str(socket_path))  # noqa: E731
+        else:
+            port = http_server.server_address[1]
+            connect = lambda: http.client.HTTPConnection("127.0.0.1", port)  # noqa
+        return job_server, connect
+
+    yield start
+    for job_server, http_server in servers:
+        job_server.shutdown()
+        http_server.shutdown()
+        http_server.server_close()
+
+
+def request(connect, method, path, body=None):
+    connection = connect()
+    connection.request(
+        method, path, body=json.dumps(body) if body is not None else None
+    )
+    response = connection.getresponse()
+    data = response.read()
+    connection.close()
+    if response.getheader("Content-Type") == "application/json":
+        data = json.loads(data)
+    return response.status, data
+
+
+def wait_for(connect, job_id, statuses=server.FINISHED, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        _, job = request(connect, "GET", f"/jobs/{job_id}")
+        if job["status"] in statuses:
+            return job
+        time.sleep(0.01)
+    raise TimeoutError(job)
+
+
+def test_submit_status_and_result(running, tmp_path):
+    pipeline = FakePipeline()
+    _, connect = running(pipeline)
+
+    status, job = request(
+        connect, "POST", "/jobs", {"audio": "song.mp3", "lyrics": "song.txt"}
+    )
+    assert status == 202
+    assert job["status"] == server.QUEUED
+
+    job = wait_for(connect, job["id"])
+    assert job["status"] == server.DONE
+    status, video = request(connect, "GET", f"/jobs/{job['id']}/result")
+    assert status == 200
+    assert video == b"video"
+
+    status, jobs = request(connect, "GET", "/jobs")
+    assert [j["id"] for j in jobs] == [job["id"]]
+
+
+def test_unix_socket(running, tmp_path):
+    _, connect = running(FakePipeline(), socket_path=tmp_path / "lyriks.sock")
+    status, job = request(connect, "POST", "/jobs", {"audio": "a.mp3", "lyrics": "a"})
+    assert status == 202
+    assert wait_for(connect, job["id"])["status"] == server.DONE
+
+
+def test_bad_requests(running):
+    _, connect = running(FakePipeline())
+    assert request(connect, "POST", "/jobs", {"audio": "a.mp3"})[0] == 400
+    assert request(connect, "GET", "/jobs/nope")[0] == 404
+    assert request(connect, "DELETE", "/jobs/nope")[0] == 404
+
+
+def test_queue_is_bounded_and_jobs_can_be_cancelled(running, tmp_path):
+    pipeline = FakePipeline()
+    pipeline.release.clear()
+    _, connect = running(pipeline, queue_size=2)
+
+    entry = {"audio": "a.mp3", "lyrics": "a.txt"}
+    _, running_job = request(connect, "POST", "/jobs", entry)
+    wait_for(connect, running_job["id"], statuses=(server.ANALYZING,))
+    _, queued = request(connect, "POST", "/jobs", entry)
+    _, cancelled = request(connect, "POST", "/jobs", entry)
+    rejected = tmp_path / "rejected" / "video"
+    status, _ = request(connect, "POST", "/jobs", dict(entry, output=str(rejected)))
+    assert status == 503
+    assert not rejected.parent.exists()
+
+    status, job = request(connect, "DELETE", f"/jobs/{cancelled['id']}")
+    assert status == 200 and job["status"] == server.CANCELLED
+    # a running job stops at the next stage boundary
+    request(connect, "DELETE", f"/jobs/{running_job['id']}")
+    assert request(connect, "GET", f"/jobs/{queued['id']}/result")[0] == 409
+    pipeline.release.set()
+
+    assert wait_for(connect, running_job["id"])["status"] == server.CANCELLED
+    assert wait_for(connect, queued["id"])["status"] == server.DONE
+    assert len(pipeline.rendered) == 1
+
+
+def test_only_the_latest_finished_jobs_are_kept(running):
+    _, connect = running(FakePipeline(), max_finished=2)
+    entry = {"audio": "a.mp3", "lyrics": "a.txt"}
+    ids = []
+    for _ in range(3):
+        _, job = request(connect, "POST", "/jobs", entry)
+        wait_for(connect, job["id"])
+        ids.append(job["id"])
+
+    _, jobs = request(connect, "GET", "/jobs")
+    assert [job["id"] for job in jobs] == ids[1:]
+    assert request(connect, "GET", f"/jobs/{ids[0]}")[0] == 404
+
+
+def test_failed_jobs_report_the_error(running):
+    _, connect = running(FakePipeline(fail=True))
+    _, job = request(connect, "POST", "/jobs", {"audio": "a.mp3", "lyrics": "a"})
+    job = wait_for(connect, job["id"])
+    assert job["status"] == server.FAILED
+    assert "no vocals found" in job["error"]
+
+
+def test_shutdown_finishes_running_jobs(running):
+    pipeline = FakePipeline(delay=0.2)
+    job_server, connect = running(pipeline)
+    entry = {"audio": "a.mp3", "lyrics": "a.txt"}
+    _, first = request(connect, "POST", "/jobs", entry)
+    wait_for(connect, first["id"], statuses=(server.ANALYZING,))
+    _, second = request(connect, "POST", "/jobs", entry)
+
+    job_server.shutdown()
+
+    assert job_server.get(first["id"]).status == server.DONE
+    assert job_server.get(second["id"]).status == server.CANCELLED
+    assert request(connect, "POST", "/jobs", entry)[0] == 503
+
+
+def test_stats(running):
+    _, connect = running(FakePipeline(), stats=lambda: {"models": []})
+    assert request(connect, "GET", "/stats") == (200, {"models": []})
+
+
+def test_render_progress_and_cancelling_a_render(running):
+    class SlowRender(FakePipeline):
+        def render(self, job, state, on_progress):
+            for second in range(500):
+                on_progress({"out_time": float(second), "percent": second / 5})
+                time.sleep(0.01)
+
+    _, connect = running(SlowRender())
+    _, job = request(connect, "POST", "/jobs", {"audio": "a.mp3", "lyrics": "a"})
+    wait_for(connect, job["id"], statuses=(server.RENDERING,))
+    time.sleep(0.05)
+    assert request(connect, "GET", f"/jobs/{job['id']}")[1]["progress"]["out_time"] > 0
+
+    request(connect, "DELETE", f"/jobs/{job['id']}")
+    job = wait_for(connect, job["id"], timeout=1)
+    assert job["status"] == server.CANCELLED
+
+
+def test_concurrent_stages_capture_their_own_output():
+    from lyriks.core import pipeline
+
+    outputs = {}
+    both_running = threading.Barrier(2)
+
+    def stage(marker):
+        def run():
+            both_running.wait(timeout=5)
+            for _ in range(50):
+                print(marker)
+                time.sleep(0.001)
+            return marker
+
+        return run
+
+    def job(marker):
+        pipeline.run_stage(
+            marker,
+            stage(marker),
+            retry_if=lambda output: outputs.setdefault(marker, output) and False,
+        )
+
+    threads = [threading.Thread(target=job, args=(m,)) for m in ("first", "second")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert outputs["first"].split() == ["first"] * 50
+    assert outputs["second"].split() == ["second"] * 50
+    # nothing is left pointing at a finished stage's buffer
+    assert not sys.stdout.buffers and not sys.stderr.buffers
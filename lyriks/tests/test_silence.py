@@ -0,0 +1,133 @@
+import numpy as np
+import pytest
+import soundfile as sf
+
+from lyriks.core import silence
+
+
+def reference_non_silent_parts(
+    audio_data,
+    sr,
+    frame_length=2048,
+    hop_length=512,
+    silence_thresh=0.02,
+    min_non_silence_sec=0.2,
+):
+    # the per-frame loop remove_silence used before the vectorized detector
+    if len(audio_data.shape) > 1:
+        audio_data = audio_data.mean(axis=1)
+
+    energies = []
+    for i in range(0, len(audio_data) - frame_length, hop_length):
+        frame = audio_data[i : i + frame_length]
+        energies.append(np.sqrt(np.mean(frame**2)))
+    energies = np.array(energies)
+
+    non_silent_indices = np.where(energies > silence_thresh)[0]
+    if not len(non_silent_indices):
+        return None
+
+    parts = []
+    start = non_silent_indices[0]
+    for i in range(1, len(non_silent_indices)):
+        if non_silent_indices[i] != non_silent_indices[i - 1] + 1:
+            end = non_silent_indices[i - 1]
+            start_time = start * hop_length / sr
+            end_time = (end * hop_length + frame_length) / sr
+            if end_time - start_time >= min_non_silence_sec:
+                parts.append((start_time, end_time))
+            start = non_silent_indices[i]
+    end = non_silent_indices[-1]
+    start_time = start * hop_length / sr
+    end_time = (end * hop_length + frame_length) / sr
+    if end_time - start_time >= min_non_silence_sec:
+        parts.append((start_time, end_time))
+    return parts
+
+
+def synthetic_vocals(seconds=30, sr=16000, channels=2, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sr)) / sr
+    audio = 0.3 * np.sin(2 * np.pi * 220 * t) + 0.01 * rng.standard_normal(len(t))
+    # random silence gaps, some of them shorter than min_non_silence_sec
+    gate = np.ones(len(t))
+    for _ in range(25):
+        start = rng.integers(0, len(t))
+        gate[start : start + rng.integers(sr // 20, 2 * sr)] = 0.0
+    audio *= gate
+    return np.repeat(audio[:, None], channels, axis=1)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_matches_reference_loop_for_arrays(seed):
+    audio = synthetic_vocals(seed=seed)
+    parts, duration, _ = silence.detect_non_silent(audio, 16000)
+
+    expected = reference_non_silent_parts(audio, 16000)
+    assert duration == len(audio) / 16000
+    assert len(parts) == len(expected) > 1
+    np.testing.assert_allclose(parts, expected)
+
+
+def test_matches_reference_loop_for_files(tmp_path, monkeypatch):
+    # small blocks so the file is read in many overlapping pieces
+    monkeypatch.setattr(silence, "BLOCK_HOPS", 37)
+    audio = synthetic_vocals(seconds=20, seed=3)
+    path = tmp_path / "vocals.wav"
+    sf.write(path, audio, 16000, subtype="FLOAT")
+
+    parts, _, sr = silence.detect_non_silent(path)
+
+    data, _ = sf.read(path)
+    assert sr == 16000
+    np.testing.assert_allclose(parts, reference_non_silent_parts(data, sr))
+
+
+def test_silent_audio():
+    parts, duration, _ = silence.detect_non_silent(np.zeros(16000), 16000)
+    assert parts is None
+    assert duration == 1.0
+
+
+def test_silent_gaps_and_write_regions(tmp_path):
+    audio = synthetic_vocals(seconds=10, sr=8000, seed=4)
+    parts, duration, _ = silence.detect_non_silent(audio, 8000)
+    gaps = silence.silent_gaps(parts, duration)
+    assert gaps == sorted(gaps)
+    assert all(start < end <= round(duration, 2) for start, end in gaps)
+
+    out = silence.write_regions(audio, 8000, parts, tmp_path / "no_silence.wav")
+    written, _ = sf.read(out)
+    expected = sum(int(e * 8000) - int(s * 8000) for s, e in parts)
+    assert written.ndim == 1
+    assert len(written) == expected
+
+
+def test_extract_regions_matches_written_file(tmp_path):
+    audio = synthetic_vocals(seconds=10, sr=8000, seed=5)
+    parts, _, _ = silence.detect_non_silent(audio, 8000)
+
+    extracted = silence.extract_regions(audio, 8000, parts)
+    out = silence.write_regions(audio, 8000, parts, tmp_path / "no_silence.wav")
+    written, _ = sf.read(out, dtype="float64")
+    np.testing.assert_allclose(written, extracted, atol=1e-4)
+
+
+def test_merge_regions():
+    parts = [(1.0, 3.0), (4.0, 10.0), (12.0, 40.0), (41.0, 80.0), (81.0, 82.0)]
+    regions = silence.merge_regions(parts, target_length=30.0, total_duration=82.5)
+
+    # parts longer than the target stay on their own
+    assert regions == [(0.8, 10.2), (11.8, 40.2), (40.8, 80.2), (80.8, 82.2)]
+
+    # gaps shorter than twice the padding are split in the middle
+    parts = [(0.5, 1.0), (1.2, 40.0), (40.1, 41.0)]
+    regions = silence.merge_regions(parts, target_length=30.0, total_duration=42.0)
+    flat = [bound for region in regions for bound in region]
+    assert flat == pytest.approx([0.3, 1.1, 1.1, 40.05, 40.05, 41.2])
+    for (_, end), (start, _) in zip(regions, regions[1:]):
+        assert end <= start
+    assert silence.merge_regions([(0.1, 1.0), (2.0, 3.0)], total_duration=3.1) == [
+        (0.0, 3.1)
+    ]
+    assert silence.merge_regions([]) == []
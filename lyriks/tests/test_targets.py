@@ -0,0 +1,32 @@
+import pytest
+
+from lyriks.core.targets import check_names, parse_target
+
+
+def test_profile_with_overrides():
+    target = parse_target("vertical, crf=20, name=shorts")
+    assert target["size"] == "1080x1920"
+    assert target["crf"] == 20
+    assert target["name"] == "shorts"
+    assert target["align"] == "bottom"
+
+
+def test_custom_size():
+    target = parse_target("1280x720@25,align=top,font-scale=1.5")
+    assert target["name"] == "1280x720_25"
+    assert (target["size"], target["fps"], target["align"]) == ("1280x720", 25, "top")
+    assert target["font_scale"] == 1.5
+
+
+@pytest.mark.parametrize(
+    "spec", ["4k", "720p,crf", "720p,speed=2", "720p,align=left", "720p,crf=99"]
+)
+def test_invalid_targets(spec):
+    with pytest.raises(ValueError):
+        parse_target(spec)
+
+
+def test_names_must_be_distinct():
+    check_names([parse_target("720p"), parse_target("720p,name=small")])
+    with pytest.raises(ValueError):
+        check_names([parse_target("720p"), parse_target("1080p,name=720p")])
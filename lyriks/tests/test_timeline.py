@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from lyriks.core.timeline import TimelineMap
+
+hypothesis = pytest.importorskip("hypothesis")
+st = hypothesis.strategies
+
+
+def linear_to_original(parts, t):
+    # the linear scan map_words_to_original used before, except that the end of
+    # the last region is inclusive
+    new_time = 0.0
+    for i, (orig_start, orig_end) in enumerate(parts):
+        duration = orig_end - orig_start
+        last = i == len(parts) - 1
+        if new_time <= t < new_time + duration or (last and t == new_time + duration):
+            return orig_start + (t - new_time)
+        new_time += duration
+    return None
+
+
+@st.composite
+def regions(draw, max_regions=50):
+    # sorted, non-overlapping (start, end) pairs with silence in between
+    count = draw(st.integers(min_value=1, max_value=max_regions))
+    lengths = draw(
+        st.lists(st.floats(0.2, 30.0), min_size=2 * count, max_size=2 * count)
+    )
+    parts, time = [], draw(st.floats(0.0, 5.0))
+    for gap, length in zip(lengths[::2], lengths[1::2]):
+        parts.append((time, time + length))
+        time += length + gap
+    return parts
+
+
+@hypothesis.given(regions(), st.lists(st.floats(0.0, 1.0), min_size=1, max_size=100))
+def test_matches_linear_scan(parts, fractions):
+    timeline = TimelineMap(parts)
+    times = np.array(fractions) * timeline.duration
+
+    mapped = timeline.to_original(times)
+
+    for t, value in zip(times, mapped):
+        expected = linear_to_original(parts, t)
+        assert expected is not None
+        assert value == pytest.approx(expected, abs=1e-6)
+
+
+@hypothesis.given(regions(), st.lists(st.floats(0.0, 1.0), min_size=1, max_size=100))
+def test_round_trip(parts, fractions):
+    timeline = TimelineMap(parts)
+    times = np.sort(np.array(fractions) * timeline.duration)
+
+    original = timeline.to_original(times)
+    assert np.all(np.diff(original) >= -1e-9)  # mapping keeps the order
+    np.testing.assert_allclose(timeline.to_silence_removed(original), times, atol=1e-6)
+
+
+@hypothesis.given(regions())
+def test_out_of_range(parts):
+    timeline = TimelineMap(parts)
+    mapped = timeline.to_original([-1.0, timeline.duration + 1.0])
+    assert np.isnan(mapped).all()
+    assert (timeline.region_index([-1.0, timeline.duration + 1.0]) == -1).all()
+
+
+def test_region_boundaries_are_not_dropped():
+    timeline = TimelineMap([(1.0, 2.0), (5.0, 7.0)])
+    np.testing.assert_allclose(timeline.to_original([0.0, 1.0, 3.0]), [1.0, 5.0, 7.0])
+    np.testing.assert_allclose(timeline.to_silence_removed([3.0, 6.0]), [1.0, 2.0])
+
+
+def test_empty_timeline():
+    timeline = TimelineMap([])
+    assert np.isnan(timeline.to_original([0.0])).all()
+    assert timeline.to_silence_removed([1.0]).tolist() == [0.0]
@@ -1,4 +1,11 @@
-from lyriks.core.video_generator_mp import VideoGenerator
+import numpy as np
+import pytest
+import soundfile as sf
+
+pytest.importorskip("moviepy")
+pytest.importorskip("matplotlib")
+
+from lyriks.core.video_generator_mp import VideoGenerator  # noqa: E402
 
 data = [
     {
@@ -20,10 +27,15 @@ data = [
     },
 ]
 
-generator = VideoGenerator(
-    "/home/simon/Documents/python/testing/song.mp3", duration=5
-)  # change this to the path of your audio
-for segment in data:
-    coords = generator.add_text(segment["text"], segment["start"], segment["end"])
-    generator.place_markers(coords, segment["start"], segment["end"])
-generator.render_video("output")
+
+def test_render_video(tmp_path):
+    audio = tmp_path / "song.wav"
+    sf.write(audio, np.zeros((5 * 44100, 2), np.float32), 44100)
+
+    generator = VideoGenerator(audio, duration=5)
+    for segment in data:
+        coords = generator.add_text(segment["text"], segment["start"], segment["end"])
+        generator.place_markers(coords, segment["start"], segment["end"])
+    generator.render_video(str(tmp_path / "output"), tmp_path)
+
+    assert (tmp_path / "output.mp4").stat().st_size > 0
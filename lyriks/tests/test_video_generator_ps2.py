@@ -0,0 +1,268 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pysubs2
+
+from lyriks.core import ffmpeg, video_generator_ps2
+from lyriks.core.cache import BackgroundCache
+from lyriks.core.targets import parse_target
+from lyriks.core.video_generator_ps2 import VideoGenerator
+
+data = [
+    {
+        "text": "Hello world!",
+        "words": [[1.0, 1.5, "Hello"], [1.6, 2.0, "world!"]],
+        "start": 1.0,
+        "end": 2.0,
+    },
+    {
+        "text": "This is a test.",
+        "words": [(3.0, 3.3, "This"), (3.4, 3.6, "is"), (3.7, 4.5, "test.")],
+        "start": 3.0,
+        "end": 4.5,
+    },
+]
+
+
+def make_generator(tmp_path):
+    generator = VideoGenerator()
+    for segment in data:
+        generator.add_words(segment)
+    generator.save(tmp_path)
+    return generator
+
+
+def fake_probe(codec):
+    def probe(path):
+        return {
+            "format": {"duration": "12.34"},
+            "streams": [{"index": 0, "codec_type": "audio", "codec_name": codec}],
+        }
+
+    return probe
+
+
+def test_add_words_karaoke_timing(tmp_path):
+    generator = make_generator(tmp_path)
+    assert len(generator.subs) == 2
+    assert generator.subs[0].start == 1000
+    assert r"{\K50}Hello " in generator.subs[0].text
+    assert (tmp_path / "lyrics.ass").exists()
+
+
+def test_single_pass_command_copies_aac(tmp_path, monkeypatch):
+    monkeypatch.setattr(ffmpeg, "probe", fake_probe("aac"))
+    generator = make_generator(tmp_path)
+
+    cmd = generator.build_command("out.mp4", audio_file="song.m4a", duration=12.3)
+
+    assert cmd.count("-i") == 2
+    assert cmd[cmd.index("-c:a") + 1] == "copy"
+    assert "-shortest" in cmd
+    assert cmd[-1] == "out.mp4"
+    assert f"ass={generator.filename}" in cmd[cmd.index("-vf") + 1]
+
+
+def test_single_pass_command_reencodes_other_audio(tmp_path, monkeypatch):
+    monkeypatch.setattr(ffmpeg, "probe", fake_probe("pcm_s16le"))
+    assert video_generator_ps2.audio_codec_args("song.wav")[1] == "aac"
+
+
+def test_split_points_avoid_subtitle_events():
+    events = [(1.0, 9.0), (10.0, 19.0), (21.0, 29.0), (30.0, 39.0)]
+    cuts = video_generator_ps2.split_points(40.0, 4, events, fps=10)
+
+    assert cuts == [9.5, 20.0, 29.5]
+    for cut in cuts:
+        assert not any(start <= cut < end for start, end in events)
+
+
+def test_split_points_only_cut_between_events():
+    events = [(0.0, 30.0), (30.0, 60.0)]
+    assert video_generator_ps2.split_points(60.0, 2, events, [(30.0, 30.0)]) == []
+    events = [(0.0, 14.0), (16.0, 60.0)]
+    assert video_generator_ps2.split_points(60.0, 2, events, [(14.0, 16.0)]) == [15.0]
+
+
+def test_chunk_subtitles_are_shifted(tmp_path):
+    generator = make_generator(tmp_path)
+    part = generator.chunk_subtitles(2.5, 5.0, str(tmp_path / "part.ass"))
+
+    import pysubs2
+
+    subs = pysubs2.load(part)
+    assert len(subs) == 1
+    assert subs[0].start == 500
+    assert subs[0].end == 2000
+
+
+def test_still_frame_intervals_cover_fades_and_karaoke(tmp_path):
+    generator = make_generator(tmp_path)
+    generator.add_words(
+        {"text": "Long", "words": [(10.0, 10.5, "Long")], "start": 10.0, "end": 14.0}
+    )
+    intervals = video_generator_ps2.still_frame_intervals(generator.subs, 20.0, fps=10)
+
+    def changing(t):
+        return any(start <= t <= end for start, end in intervals)
+
+    assert changing(0.5)  # video fade in
+    assert changing(1.3)  # "Hello world!" karaoke sweep
+    assert not changing(2.5)  # nothing on screen
+    assert changing(10.3)  # "Long" karaoke sweep
+    assert not changing(12.0)  # sweep done, line static until its fade out
+    assert changing(13.95)  # line fades out
+    assert changing(19.5)  # video fade out
+    assert intervals == sorted(intervals)
+
+
+def test_still_frames_command(tmp_path):
+    generator = make_generator(tmp_path)
+    cmd = generator.build_command("out.mp4", duration=10.0, still_frames=True)
+
+    video_filter = cmd[cmd.index("-vf") + 1]
+    assert ",select='eq(n,0)+between(t," in video_filter
+    assert cmd[cmd.index("-fps_mode") + 1] == "vfr"
+    assert cmd[cmd.index("-tune") + 1] == "stillimage"
+
+
+def test_short_background_loops():
+    args = video_generator_ps2.video_input_args(
+        "bg.mp4", "1920x1080", 60, 10.0, start=25.0, background_duration=20.0
+    )
+    assert args == ["-stream_loop", "-1", "-ss", "5.000000", "-i", "bg.mp4"]
+
+    args = video_generator_ps2.video_input_args(
+        "bg.mp4", "1920x1080", 60, 10.0, start=5.0, background_duration=20.0
+    )
+    assert args == ["-ss", "5.000000", "-i", "bg.mp4"]
+
+
+def test_background_is_scaled_to_the_frame(tmp_path):
+    generator = make_generator(tmp_path)
+    cmd = generator.build_command(
+        "out.mp4", size="1280x720", duration=12.3, background_path="bg.mp4"
+    )
+    video_filter = cmd[cmd.index("-vf") + 1]
+    assert video_filter.startswith("scale=1280:720:force_original_aspect_ratio")
+
+
+def test_background_proxy_is_encoded_once(tmp_path, monkeypatch):
+    source = tmp_path / "bg.mp4"
+    source.write_bytes(b"4k video")
+    commands = []
+
+    def encode(cmd, duration, on_progress=None, show_bar=True):
+        commands.append(cmd)
+        with open(cmd[-1], "wb") as f:
+            f.write(b"proxy")
+
+    monkeypatch.setattr(ffmpeg, "ffmpeg_progress", encode)
+    monkeypatch.setattr(ffmpeg, "probe_duration", lambda path: 30.0)
+    cache = BackgroundCache(tmp_path / "cache")
+
+    proxy = video_generator_ps2.background_proxy(source, "1280x720", 30, cache)
+    again = video_generator_ps2.background_proxy(source, "1280x720", 30, cache)
+    other = video_generator_ps2.background_proxy(source, "1920x1080", 30, cache)
+
+    assert proxy == again != other
+    assert proxy.read_bytes() == b"proxy"
+    assert len(commands) == 2
+    assert "fps=30" in commands[0][commands[0].index("-vf") + 1]
+
+
+def test_background_proxies_encode_in_parallel_but_once(tmp_path, monkeypatch):
+    source = tmp_path / "bg.mp4"
+    source.write_bytes(b"4k video")
+    # the two sizes must be encoding at the same time to get past this
+    both_encoding = threading.Barrier(2, timeout=10)
+    commands = []
+
+    def encode(cmd, duration, on_progress=None, show_bar=True):
+        commands.append(cmd)
+        both_encoding.wait()
+        with open(cmd[-1], "wb") as f:
+            f.write(b"proxy")
+
+    monkeypatch.setattr(ffmpeg, "ffmpeg_progress", encode)
+    monkeypatch.setattr(ffmpeg, "probe_duration", lambda path: 30.0)
+    cache = BackgroundCache(tmp_path / "cache")
+
+    sizes = ["1280x720", "1920x1080"] * 2
+    with ThreadPoolExecutor(len(sizes)) as pool:
+        proxies = list(
+            pool.map(
+                lambda size: video_generator_ps2.background_proxy(
+                    source, size, 30, cache
+                ),
+                sizes,
+            )
+        )
+
+    assert proxies[0] == proxies[2] != proxies[1] == proxies[3]
+    assert len(commands) == 2
+
+
+def test_layout_scales_to_the_target(tmp_path):
+    generator = make_generator(tmp_path)
+    landscape = generator.layout(parse_target("1080p"))
+    vertical = generator.layout(parse_target("vertical"))
+
+    assert landscape.info["PlayResY"] == "1080"
+    assert landscape.styles["Default"].fontsize == 28 * 1080 / 288
+    # the narrow side of the vertical frame sets the font size
+    assert vertical.styles["Default"].fontsize == round(28 * 1080 / 384, 1)
+    assert vertical.styles["Default"].alignment == pysubs2.Alignment.BOTTOM_CENTER
+    assert vertical.styles["Default"].marginv == 480
+    assert len(vertical) == len(generator.subs)
+    # the generator's own subtitles are untouched
+    assert generator.subs.styles["Default"].fontsize == 28
+
+
+def test_targets_command_splits_one_decode(tmp_path, monkeypatch):
+    monkeypatch.setattr(ffmpeg, "probe", fake_probe("aac"))
+    generator = make_generator(tmp_path)
+    output_targets = [parse_target("1080p"), parse_target("vertical,crf=26")]
+
+    cmd, outputs = generator.build_targets_command(
+        "song",
+        output_targets,
+        ["a.ass", "b.ass"],
+        audio_file="song.m4a",
+        duration=12.3,
+        background_path="bg.mp4",
+    )
+
+    assert cmd.count("-i") == 2
+    graph = cmd[cmd.index("-filter_complex") + 1]
+    assert graph.startswith("[0:v]split=2[s0][s1];")
+    assert "scale=1080:1920:" in graph and "ass=b.ass[v1]" in graph
+    assert outputs == ["song_1080p.mp4", "song_vertical.mp4"]
+    assert cmd[cmd.index("song_vertical.mp4") - 1] == "-shortest"
+    assert cmd.count("-map") == 4
+    assert "26" in cmd[cmd.index("[v1]") :]
+
+
+def test_targets_read_one_proxy_each(tmp_path, monkeypatch):
+    monkeypatch.setattr(ffmpeg, "probe", fake_probe("aac"))
+    generator = make_generator(tmp_path)
+    output_targets = [parse_target("1080p"), parse_target("vertical")]
+
+    cmd, _ = generator.build_targets_command(
+        "song",
+        output_targets,
+        ["a.ass", "b.ass"],
+        audio_file="song.m4a",
+        duration=12.3,
+        background_path="bg.mp4",
+        proxies=["bg_1080p.mp4", "bg_vertical.mp4"],
+    )
+
+    inputs = [cmd[i + 1] for i, arg in enumerate(cmd) if arg == "-i"]
+    assert inputs == ["bg_1080p.mp4", "bg_vertical.mp4", "song.m4a"]
+    graph = cmd[cmd.index("-filter_complex") + 1]
+    assert "split" not in graph
+    assert (
+        graph.startswith("[0:v]scale=1920:1080:") and "[1:v]scale=1080:1920:" in graph
+    )
+    assert cmd.count("2:a:0") == 2
@@ -0,0 +1,232 @@
+import pytest
+
+from lyriks.core import pipeline
+from lyriks.core.workdir import WorkDir
+
+
+def test_stages_are_restored_on_resume(tmp_path):
+    work_dir = WorkDir(tmp_path / "job")
+    assert work_dir.restore("stems", "song") is None
+    work_dir.complete("stems", {"vocals": "v.wav"})
+    assert work_dir.restore("vad") is None
+    work_dir.complete("vad", {"non_silent_parts": [[0.0, 1.0]]})
+
+    resumed = WorkDir(tmp_path / "job", resume=True)
+    assert resumed.completed() == ["stems", "vad"]
+    assert resumed.restore("stems", "song") == {"vocals": "v.wav"}
+    assert resumed.restore("vad") == {"non_silent_parts": [[0.0, 1.0]]}
+
+
+def test_changed_parameters_invalidate_later_stages(tmp_path):
+    work_dir = WorkDir(tmp_path / "job")
+    work_dir.restore("stems", "song")
+    work_dir.complete("stems", {})
+    work_dir.restore("vad")
+    work_dir.complete("vad", {})
+    work_dir.restore("transcript", "small")
+    work_dir.complete("transcript", {})
+
+    resumed = WorkDir(tmp_path / "job", resume=True)
+    assert resumed.restore("stems", "song") == {}
+    assert resumed.restore("vad") == {}
+    assert resumed.restore("transcript", "medium") is None
+    assert resumed.completed() == ["stems", "vad"]
+
+    # a different song invalidates everything
+    resumed = WorkDir(tmp_path / "job", resume=True)
+    assert resumed.restore("stems", "other song") is None
+    assert resumed.completed() == []
+
+
+def test_without_resume_the_work_dir_is_wiped(tmp_path):
+    work_dir = WorkDir(tmp_path / "job")
+    work_dir.restore("stems")
+    work_dir.complete("stems", {})
+    work_dir.file("vocals.wav").write_bytes(b"data")
+
+    fresh = WorkDir(tmp_path / "job")
+    assert fresh.completed() == []
+    assert not fresh.file("vocals.wav").exists()
+
+
+def test_foreign_directory_is_left_untouched(tmp_path):
+    (tmp_path / "notes.txt").write_text("keep me")
+    (tmp_path / "project").mkdir()
+
+    with pytest.raises(ValueError):
+        WorkDir(tmp_path)
+    with pytest.raises(ValueError):
+        WorkDir(tmp_path, resume=True)
+
+    assert (tmp_path / "notes.txt").read_text() == "keep me"
+    assert (tmp_path / "project").is_dir()
+
+
+def test_only_folders_lyriks_made_are_removed(tmp_path):
+    created = WorkDir(tmp_path / "job")
+    created.file("vocals.wav").write_bytes(b"data")
+    created.remove()
+    assert not (tmp_path / "job").exists()
+
+    # also when a rerun or --resume finds the folder from an earlier run
+    for resume in (False, True):
+        WorkDir(tmp_path / "job")
+        WorkDir(tmp_path / "job", resume=resume).remove()
+        assert not (tmp_path / "job").exists()
+
+    # an empty folder picked by the user is emptied again but kept
+    (tmp_path / "mine").mkdir()
+    chosen = WorkDir(tmp_path / "mine")
+    chosen.file("vocals.wav").write_bytes(b"data")
+    chosen.remove()
+    assert (tmp_path / "mine").is_dir()
+    assert list((tmp_path / "mine").iterdir()) == []
+
+
+class FakeProcessor:
+    """Records which stages ran; stands in for AudioProcessor."""
+
+    def __init__(
+        self,
+        audio_file,
+        temp_dir,
+        boundary_errors=0,
+        fail_transcribe=0,
+        in_memory=False,
+    ):
+        self.audio_file = str(audio_file)
+        self.in_memory = in_memory
+        self.temp_dir = temp_dir
+        self.model_size = "small"
+        self.lyrics = "hello world"
+        self.separation_model = "htdemucs"
+        self.per_region = False
+        self.region_length = 30.0
+        self.vocals_file = None
+        self.instrumental_file = None
+        self.no_silence_file = None
+        self.calls = []
+        self.boundary_errors = boundary_errors
+        self.fail_transcribe = fail_transcribe
+
+    def isolate_vocals(self):
+        self.calls.append("isolate_vocals")
+        if self.in_memory:
+            return None, None
+        self.vocals_file = str(self.temp_dir / "vocals.wav")
+        self.instrumental_file = str(self.temp_dir / "music_only.wav")
+        for path in (self.vocals_file, self.instrumental_file):
+            open(path, "wb").close()
+        return self.vocals_file, self.instrumental_file
+
+    def save_stems(self, prefix):
+        self.calls.append("save_stems")
+        paths = [f"{prefix}_vocals.wav", f"{prefix}_instrumental.wav"]
+        for path in paths:
+            open(path, "wb").close()
+        return paths
+
+    def restore_stems(self, vocals_file, instrumental_file):
+        self.calls.append("restore_stems")
+        self.vocals_file = str(vocals_file)
+        self.instrumental_file = str(instrumental_file)
+
+    def remove_silence(self):
+        self.calls.append("remove_silence")
+        self.non_silent_parts = [(1.0, 2.0)]
+        self.total_duration = 3.0
+        self.silent_parts = [(0.0, 1.0), (2.0, 3.0)]
+        return self.silent_parts, None
+
+    def restore_regions(self, non_silent_parts, total_duration, build_audio=True):
+        self.calls.append(("restore_regions", build_audio))
+        self.non_silent_parts = non_silent_parts
+
+    def transcribe(self):
+        self.calls.append("transcribe")
+        if self.fail_transcribe:
+            self.fail_transcribe -= 1
+            raise RuntimeError("transcription crashed")
+        if self.boundary_errors:
+            self.boundary_errors -= 1
+            print(pipeline.BOUNDARY_ERROR)
+        self.words = [{"text": "hi", "start": 0.0, "end": 1.0, "words": []}]
+        self.used_silence_removed = True
+        return {}, self.words
+
+    def restore_transcript(self, words, used_silence_removed):
+        self.calls.append("restore_transcript")
+        self.words = words
+
+    def map_words_to_original(self):
+        self.calls.append("map_words_to_original")
+        return self.words
+
+
+@pytest.fixture
+def audio(tmp_path):
+    path = tmp_path / "song.wav"
+    path.write_bytes(b"audio")
+    return path
+
+
+def test_only_transcription_is_retried(tmp_path, audio):
+    work_dir = WorkDir(tmp_path / "job")
+    processor = FakeProcessor(audio, work_dir.path, boundary_errors=2)
+    pipeline.process_audio(processor, work_dir=work_dir)
+
+    assert processor.calls == [
+        "isolate_vocals",
+        "remove_silence",
+        "transcribe",
+        "transcribe",
+        "transcribe",
+    ]
+
+
+def test_resume_skips_completed_stages(tmp_path, audio):
+    work_dir = WorkDir(tmp_path / "job")
+    processor = FakeProcessor(audio, work_dir.path, fail_transcribe=3)
+    with pytest.raises(RuntimeError):
+        pipeline.process_audio(processor, work_dir=work_dir)
+    assert processor.calls.count("transcribe") == 3
+
+    work_dir = WorkDir(tmp_path / "job", resume=True)
+    processor = FakeProcessor(audio, work_dir.path)
+    pipeline.process_audio(processor, work_dir=work_dir)
+    words = pipeline.align(processor, no_gemini=True, work_dir=work_dir)
+    assert processor.calls == [
+        "restore_stems",
+        ("restore_regions", True),
+        "transcribe",
+        "map_words_to_original",
+    ]
+
+    work_dir = WorkDir(tmp_path / "job", resume=True)
+    processor = FakeProcessor(audio, work_dir.path)
+    pipeline.process_audio(processor, work_dir=work_dir)
+    assert pipeline.align(processor, no_gemini=True, work_dir=work_dir) == words
+    assert processor.calls == [
+        "restore_stems",
+        ("restore_regions", False),
+        "restore_transcript",
+    ]
+
+
+def test_in_memory_stems_are_not_written(tmp_path, audio):
+    work_dir = WorkDir(tmp_path / "job")
+    processor = FakeProcessor(audio, work_dir.path, in_memory=True)
+    pipeline.process_audio(processor, work_dir=work_dir)
+
+    assert "save_stems" not in processor.calls
+    assert not list(work_dir.path.glob("*.wav"))
+    assert "stems" not in work_dir.completed()
+
+
+def test_in_memory_stems_are_checkpointed_when_kept(tmp_path, audio):
+    work_dir = WorkDir(tmp_path / "job")
+    processor = FakeProcessor(audio, work_dir.path, in_memory=True)
+    pipeline.process_audio(processor, work_dir=work_dir, keep_stems=True)
+
+    assert work_dir.file("stems_vocals.wav").exists()
+    assert "stems" in work_dir.completed()